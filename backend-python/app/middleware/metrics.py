@@ -0,0 +1,40 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+
+from app.services.metrics import UNMATCHED_ROUTE, Metrics, metrics as default_metrics
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and in-flight requests.
+
+    Requests are labelled with the route template (``/api/github/repos``)
+    that FastAPI stores in ``scope["route"]``, never the raw path, so label
+    cardinality stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp, registry: Metrics = None):
+        self.app = app
+        self.metrics = registry or default_metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        metrics.http_in_flight += 1
+        start_time = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.http_in_flight -= 1
+            route = scope.get("route")
+            template = getattr(route, "path_format", None) or UNMATCHED_ROUTE
+            metrics.observe_request(template, status, time.perf_counter() - start_time)
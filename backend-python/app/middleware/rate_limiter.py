@@ -1,103 +1,126 @@
-from fastapi import Request, Response, HTTPException
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import json
+import math
 import time
-from collections import defaultdict
-import asyncio
 import os
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, requests_per_minute: int = None):
-        super().__init__(app)
-        
+from app.services.metrics import metrics
+from app.services.rate_limit_engine import RateLimitResult, create_rate_limiter
+
+class RateLimitMiddleware:
+    """Pure ASGI rate limiting middleware.
+
+    Allowed requests get the X-RateLimit-* headers appended to
+    ``http.response.start``; rejected requests are answered with a prebuilt
+    429 response without ever reaching the application.
+    """
+
+    # Skip rate limiting for health checks and docs
+    EXEMPT_PATHS = frozenset(["/health", "/docs", "/redoc", "/openapi.json"])
+
+    def __init__(self, app: ASGIApp, requests_per_minute: int = None, algorithm: str = None, backend: str = None):
+        self.app = app
+
         # Default rate limits
         self.requests_per_minute = requests_per_minute or (60 if os.getenv("ENVIRONMENT") == "production" else 300)
         self.window_size = 60  # 1 minute window
-        
-        # Storage for rate limiting
-        self.requests = defaultdict(list)
-        
-        # Cleanup task
-        asyncio.create_task(self.cleanup_old_requests())
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = self.get_client_ip(request)
-        
-        # Skip rate limiting for health checks and WebSocket upgrades
-        if (request.url.path in ["/health", "/docs", "/redoc", "/openapi.json"] or 
-            request.headers.get("upgrade") == "websocket"):
-            return await call_next(request)
-        
-        # Check rate limit
-        if not self.is_allowed(client_ip):
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "Rate limit exceeded",
-                    "message": f"Maximum {self.requests_per_minute} requests per minute allowed",
-                    "retry_after": 60
-                }
-            )
-        
-        # Record the request
-        self.record_request(client_ip)
-        
-        response = await call_next(request)
-        
-        # Add rate limit headers
-        remaining = max(0, self.requests_per_minute - len(self.requests[client_ip]))
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(int(time.time()) + 60)
-        
-        return response
-
-    def get_client_ip(self, request: Request) -> str:
+
+        # O(1) per-key limiter (see RATE_LIMIT_ALGORITHM and RATE_LIMIT_BACKEND)
+        self.limiter = create_rate_limiter(self.requests_per_minute, self.window_size, algorithm, backend)
+
+        # Client tracking statistics
+        metrics.register_callback(
+            "rate_limiter_tracked_clients", "Client keys held by the local rate limiter",
+            lambda: len(self.limiter)
+        )
+        metrics.register_callback(
+            "rate_limiter_memory_bytes", "Approximate memory held by local rate limiter state",
+            lambda: self.limiter.stats()["memory_bytes"]
+        )
+        metrics.register_callback(
+            "rate_limiter_evictions_total", "Client keys evicted because the tracker was full",
+            lambda: self.limiter.stats()["evictions"], kind="counter"
+        )
+        metrics.register_callback(
+            "rate_limiter_expirations_total", "Client keys expired after their quota replenished",
+            lambda: self.limiter.stats()["expirations"], kind="counter"
+        )
+
+        # Prebuilt pieces of every response; only the numbers change per request
+        self.limit_header = (b"x-ratelimit-limit", str(self.requests_per_minute).encode("latin-1"))
+        rejection = json.dumps({
+            "error": "Rate limit exceeded",
+            "message": f"Maximum {self.requests_per_minute} requests per minute allowed",
+            "retry_after": 0
+        }, separators=(",", ":")).encode("utf-8")
+        self.rejection_body_prefix = rejection[:-len(b"0}")]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # WebSocket and lifespan traffic passes straight through
+        if scope["type"] != "http" or scope["path"] in self.EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        # Check and record the request in one step
+        result = await self.limiter.acquire(self.get_client_ip(scope))
+        if not result.allowed:
+            await self.send_rejection(send, result)
+            return
+
+        rate_limit_headers = self.rate_limit_headers(result)
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *rate_limit_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def rate_limit_headers(self, result: RateLimitResult):
+        """Build the X-RateLimit-* headers describing the client's quota"""
+        return [
+            self.limit_header,
+            (b"x-ratelimit-remaining", str(result.remaining).encode("latin-1")),
+            (b"x-ratelimit-reset", str(math.ceil(time.time() + result.reset_after)).encode("latin-1")),
+        ]
+
+    async def send_rejection(self, send: Send, result: RateLimitResult):
+        """Answer with the prebuilt 429 response"""
+        metrics.rate_limit_rejections += 1
+        retry_after = str(math.ceil(result.retry_after)).encode("latin-1")
+        body = self.rejection_body_prefix + retry_after + b"}"
+
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", retry_after),
+                *self.rate_limit_headers(result),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def get_client_ip(self, scope: Scope) -> str:
         """Get the client IP address, considering proxy headers"""
+        forwarded_for = real_ip = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for" and forwarded_for is None:
+                forwarded_for = value
+            elif name == b"x-real-ip" and real_ip is None:
+                real_ip = value
+
         # Check for forwarded headers (from load balancers/proxies)
-        forwarded_for = request.headers.get("X-Forwarded-For")
         if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("X-Real-IP")
+            return forwarded_for.split(b",")[0].strip().decode("latin-1")
+
         if real_ip:
-            return real_ip
-        
-        return request.client.host if request.client else "unknown"
-
-    def is_allowed(self, client_ip: str) -> bool:
-        """Check if the client is allowed to make a request"""
-        now = time.time()
-        window_start = now - self.window_size
-        
-        # Get requests within the current window
-        recent_requests = [
-            req_time for req_time in self.requests[client_ip]
-            if req_time > window_start
-        ]
-        
-        # Update the stored requests
-        self.requests[client_ip] = recent_requests
-        
-        return len(recent_requests) < self.requests_per_minute
-
-    def record_request(self, client_ip: str):
-        """Record a request timestamp"""
-        self.requests[client_ip].append(time.time())
-
-    async def cleanup_old_requests(self):
-        """Periodically clean up old request records"""
-        while True:
-            await asyncio.sleep(300)  # Clean up every 5 minutes
-            
-            now = time.time()
-            cutoff = now - (self.window_size * 2)  # Keep data for 2 windows
-            
-            for client_ip in list(self.requests.keys()):
-                self.requests[client_ip] = [
-                    req_time for req_time in self.requests[client_ip]
-                    if req_time > cutoff
-                ]
-                
-                # Remove empty entries
-                if not self.requests[client_ip]:
-                    del self.requests[client_ip]
\ No newline at end of file
+            return real_ip.decode("latin-1")
+
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def is_allowed(self, client_ip: str) -> bool:
+        """Check if the client is allowed to make a request, recording it if so"""
+        return (await self.limiter.acquire(client_ip)).allowed
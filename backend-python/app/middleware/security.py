@@ -1,31 +1,57 @@
-from fastapi import Request, Response
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
 import os
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Add security headers
-        response = await call_next(request)
-        
+class SecurityMiddleware:
+    """Pure ASGI middleware that adds security headers to every HTTP response.
+
+    The header block is built and encoded once, then appended to the
+    ``http.response.start`` message, so response bodies (including streaming
+    ones) and WebSocket traffic pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
         # Security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
+        headers = {
+            "X-Content-Type-Options": "nosniff",
+            "X-Frame-Options": "DENY",
+            "X-XSS-Protection": "1; mode=block",
+            "Referrer-Policy": "strict-origin-when-cross-origin",
+        }
+
         # Only add HSTS in production with HTTPS
         if os.getenv("ENVIRONMENT") == "production":
-            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        
+            headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+
         # CSP header
-        csp = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'; connect-src 'self' ws: wss:;"
-        response.headers["Content-Security-Policy"] = csp
-        
-        # Add timing header for monitoring
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        return response
\ No newline at end of file
+        headers["Content-Security-Policy"] = (
+            "default-src 'self'; script-src 'self' 'unsafe-inline'; "
+            "style-src 'self' 'unsafe-inline'; connect-src 'self' ws: wss:;"
+        )
+
+        self.raw_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers.items()
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Add timing header for monitoring
+                process_time = str(time.perf_counter() - start_time).encode("latin-1")
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    *self.raw_headers,
+                    (b"x-process-time", process_time),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
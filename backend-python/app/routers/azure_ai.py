@@ -1,25 +1,94 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from typing import Any, Dict, List, Optional, Union
 import os
+import json
+import asyncio
+import logging
 import httpx
 from datetime import datetime
 
+from app.services.admission import PRIORITY_BATCH, AdmissionRejected
+from app.services.azure_openai import (
+    DEFAULT_CHAT_MODEL, DEFAULT_EMBEDDING_MODEL, AzureOpenAIClient, AzureOpenAIError, get_azure_openai,
+    user_messages
+)
+from app.services.completion_cache import CompletionCache, get_completion_cache
+from app.services.vector_index import SharedVectorIndex, get_vector_index
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Largest number of prompts accepted by one batch request
+MAX_BATCH_ITEMS = 1000
+# Largest number of texts accepted by one embeddings or indexing request
+MAX_EMBEDDING_INPUTS = 2048
+
+# Serializes index updates and searches so concurrent saves don't interleave
+# and no search sees a half-applied add
+index_lock = asyncio.Lock()
 
 class ChatRequest(BaseModel):
     message: str
-    model: Optional[str] = "gpt-3.5-turbo"
+    model: str = DEFAULT_CHAT_MODEL
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 150
+    # Deterministic (temperature 0) requests are cached unless this is False
+    use_cache: bool = True
 
 class ChatResponse(BaseModel):
     id: str
     message: str
     model: str
     timestamp: str
+    finish_reason: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+    cached: bool = False
     note: Optional[str] = None
 
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+    concurrency: int = Field(8, ge=1, le=32)
+
+class EmbeddingRequest(BaseModel):
+    input: Union[str, List[str]]
+    model: str = DEFAULT_EMBEDDING_MODEL
+
+class IndexDocument(BaseModel):
+    id: str
+    text: str
+    metadata: Dict[str, Any] = {}
+
+class IndexDocumentsRequest(BaseModel):
+    documents: List[IndexDocument] = Field(..., min_length=1, max_length=MAX_EMBEDDING_INPUTS)
+    model: str = DEFAULT_EMBEDDING_MODEL
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = Field(5, ge=1, le=100)
+    model: str = DEFAULT_EMBEDDING_MODEL
+
+def upstream_error(e: AzureOpenAIError) -> HTTPException:
+    """Map an Azure OpenAI error to the response sent to our client"""
+    if e.status_code == 429:
+        headers = {"Retry-After": e.retry_after} if e.retry_after else None
+        return HTTPException(status_code=429, detail="AI service is rate limited", headers=headers)
+    return HTTPException(status_code=502, detail=f"AI service error: {e.message}")
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """Fast 429 for calls the token budget can't admit in time"""
+    return HTTPException(
+        status_code=429,
+        detail=f"AI capacity for {e.model} is exhausted, retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 @router.get("/config")
 async def get_azure_config():
     """Get Azure AI configuration (without exposing sensitive data)"""
@@ -35,57 +104,206 @@ async def get_azure_config():
         raise HTTPException(status_code=500, detail="Failed to get Azure configuration")
 
 @router.post("/chat", response_model=ChatResponse)
-async def ai_chat(request: ChatRequest):
-    """AI chat endpoint with Azure OpenAI integration placeholder"""
+async def ai_chat(request: ChatRequest, ai: AzureOpenAIClient = Depends(get_azure_openai)):
+    """AI chat endpoint backed by Azure OpenAI (echo fallback when not configured)"""
     try:
-        # Placeholder for Azure OpenAI integration
-        # In production, this would call Azure OpenAI API
-        
-        response = ChatResponse(
-            id=f"chatcmpl-{int(datetime.utcnow().timestamp())}",
-            message=f"Echo from Python FastAPI: {request.message}",
-            model=request.model,
-            timestamp=datetime.utcnow().isoformat(),
-            note="This is a placeholder response. Configure AZURE_OPENAI_API_KEY to enable AI features."
+        completion = await ai.chat(
+            user_messages(request.message), request.model, request.temperature, request.max_tokens,
+            use_cache=request.use_cache
         )
-        
-        return response
+        return ChatResponse(timestamp=datetime.utcnow().isoformat(), **completion)
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except AzureOpenAIError as e:
+        raise upstream_error(e)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="AI service timeout")
     except Exception as e:
+        logger.error(f"AI chat failed: {e}")
         raise HTTPException(status_code=500, detail="AI service error")
 
-@router.get("/models")
-async def get_available_models():
-    """Get available AI models"""
+@router.post("/chat/stream")
+async def ai_chat_stream(request: ChatRequest, ai: AzureOpenAIClient = Depends(get_azure_openai)):
+    """Stream an AI chat completion as Server-Sent Events while tokens arrive"""
     try:
-        # Placeholder for Azure OpenAI models endpoint
-        models = [
-            {
-                "id": "gpt-3.5-turbo",
-                "name": "GPT-3.5 Turbo",
-                "description": "Fast and efficient model for most tasks",
-                "max_tokens": 4096
-            },
-            {
-                "id": "gpt-4",
-                "name": "GPT-4",
-                "description": "Most capable model for complex tasks",
-                "max_tokens": 8192
-            },
-            {
-                "id": "text-embedding-ada-002",
-                "name": "Text Embedding Ada 002",
-                "description": "Embedding model for semantic search",
-                "max_tokens": 8191
-            }
-        ]
-        
-        return {
-            "models": models,
-            "total": len(models),
-            "note": "Configure Azure OpenAI to get actual available models"
-        }
+        stream = await ai.stream_chat(
+            user_messages(request.message), request.model, request.temperature, request.max_tokens
+        )
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except AzureOpenAIError as e:
+        raise upstream_error(e)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="AI service timeout")
+    except Exception as e:
+        logger.error(f"AI chat stream failed to start: {e}")
+        raise HTTPException(status_code=500, detail="AI service error")
+
+    async def events():
+        # A client disconnect cancels this generator, which closes the upstream stream
+        try:
+            async for delta in stream:
+                yield sse_event({"delta": delta})
+            yield sse_event({"id": stream.id, "model": stream.model, "finish_reason": stream.finish_reason}, "done")
+        except httpx.HTTPError as e:
+            logger.warning(f"AI chat stream interrupted: {e}")
+            yield sse_event({"message": "AI service stream interrupted"}, "error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Closes the upstream response even if the body is never iterated
+        background=BackgroundTask(stream.aclose),
+    )
+
+@router.post("/chat/batch")
+async def ai_chat_batch(batch: BatchChatRequest, ai: AzureOpenAIClient = Depends(get_azure_openai)):
+    """Run many chat requests with bounded concurrency, streaming NDJSON results as they complete"""
+    
+    async def run_item(index: int, item: ChatRequest) -> Dict[str, Any]:
+        try:
+            async with ai.slots(item.model):
+                completion = await ai.chat(
+                    user_messages(item.message), item.model, item.temperature, item.max_tokens,
+                    use_cache=item.use_cache, priority=PRIORITY_BATCH
+                )
+            response = ChatResponse(timestamp=datetime.utcnow().isoformat(), **completion)
+            return {"index": index, "status": 200, "result": response.model_dump()}
+        except AdmissionRejected as e:
+            return {"index": index, "status": 429, "error": admission_error(e).detail, "retry_after": e.retry_after}
+        except AzureOpenAIError as e:
+            error = upstream_error(e)
+            return {"index": index, "status": error.status_code, "error": error.detail}
+        except httpx.TimeoutException:
+            return {"index": index, "status": 504, "error": "AI service timeout"}
+        except Exception as e:
+            logger.error(f"AI batch item {index} failed: {e}")
+            return {"index": index, "status": 500, "error": "AI service error"}
+    
+    async def stream_results():
+        # Keep at most `concurrency` items in flight; each also waits for a
+        # slot on its deployment, which is shared with other batches
+        next_index = 0
+        pending = set()
+        try:
+            while next_index < len(batch.items) or pending:
+                while next_index < len(batch.items) and len(pending) < batch.concurrency:
+                    pending.add(asyncio.create_task(run_item(next_index, batch.items[next_index])))
+                    next_index += 1
+                
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                yield "".join(json.dumps(task.result()) + "\n" for task in done)
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.get("/chat/cache")
+async def get_chat_cache_stats(cache: CompletionCache = Depends(get_completion_cache)):
+    """Get chat completion cache statistics"""
+    return cache.stats()
+
+@router.post("/embeddings")
+async def create_embeddings(request: EmbeddingRequest, ai: AzureOpenAIClient = Depends(get_azure_openai)):
+    """Embed one or more texts, batching them into upstream calls"""
+    texts = [request.input] if isinstance(request.input, str) else request.input
+    if not texts or len(texts) > MAX_EMBEDDING_INPUTS:
+        raise HTTPException(status_code=400, detail=f"input must contain 1 to {MAX_EMBEDDING_INPUTS} texts")
+    
+    try:
+        vectors, usage = await ai.embed(texts, request.model)
+    except AzureOpenAIError as e:
+        raise upstream_error(e)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="AI service timeout")
+    except Exception as e:
+        logger.error(f"Embeddings failed: {e}")
+        raise HTTPException(status_code=500, detail="Embedding service error")
+    
+    return {
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors.tolist())],
+        "model": request.model,
+        "usage": usage
+    }
+
+@router.get("/index")
+async def get_index_stats(index: SharedVectorIndex = Depends(get_vector_index)):
+    """Get vector index statistics"""
+    async with index_lock:
+        await asyncio.to_thread(index.refresh)
+    return index.stats()
+
+@router.post("/index/documents")
+async def index_documents(
+    request: IndexDocumentsRequest,
+    ai: AzureOpenAIClient = Depends(get_azure_openai),
+    index: SharedVectorIndex = Depends(get_vector_index)
+):
+    """Embed documents and add them to the vector index (replacing documents with the same id)"""
+    try:
+        vectors, usage = await ai.embed([doc.text for doc in request.documents], request.model)
+        # Appends to the on-disk log under a file lock shared with the other workers
+        async with index_lock:
+            await asyncio.to_thread(
+                index.add,
+                [doc.id for doc in request.documents],
+                vectors,
+                [{**doc.metadata, "text": doc.text} for doc in request.documents]
+            )
+        return {"indexed": len(request.documents), "documents": len(index), "usage": usage}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AzureOpenAIError as e:
+        raise upstream_error(e)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="AI service timeout")
+    except Exception as e:
+        logger.error(f"Indexing failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to index documents")
+
+@router.post("/index/search")
+async def search_index(
+    request: SearchRequest,
+    ai: AzureOpenAIClient = Depends(get_azure_openai),
+    index: SharedVectorIndex = Depends(get_vector_index)
+):
+    """Top-k cosine similarity search over the vector index"""
+    try:
+        vectors, _ = await ai.embed([request.query], request.model)
+        # Pick up documents other workers added since the last request; the lock keeps a
+        # concurrent add from growing or replacing the matrices mid-search
+        async with index_lock:
+            current = await asyncio.to_thread(index.refresh)
+            # The matrix product releases the GIL, so large indexes don't block the loop
+            results = await asyncio.to_thread(current.search, vectors[0], request.k)
+        return {"query": request.query, "results": results, "documents": len(index)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AzureOpenAIError as e:
+        raise upstream_error(e)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="AI service timeout")
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to get models")
+        logger.error(f"Search failed: {e}")
+        raise HTTPException(status_code=500, detail="Search failed")
+
+@router.get("/admission")
+async def get_admission_stats(ai: AzureOpenAIClient = Depends(get_azure_openai)):
+    """Get token budget and queue statistics for AI calls"""
+    return ai.admission.stats() if ai.admission is not None else {"enabled": False}
+
+@router.get("/models")
+async def get_available_models(ai: AzureOpenAIClient = Depends(get_azure_openai)):
+    """Get available AI models"""
+    models = ai.list_models()
+    return {
+        "models": models,
+        "total": len(models),
+        "note": "Built-in models plus those in AZURE_OPENAI_DEPLOYMENTS and AI_MODEL_TOKENS_PER_MINUTE"
+    }
 
 @router.get("/deployment/status")
 async def get_deployment_status():
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import os
-import httpx
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
 import asyncio
+import httpx
+import json
+import re
 from datetime import datetime
 
+from app.services.http_cache import ConditionalCache, get_github_cache
+from app.services.http_clients import UpstreamClients, get_upstream_clients
+from app.services.singleflight import SingleFlight
+
 router = APIRouter()
 
+# Coalesces the rate limit probe made by concurrent /status requests
+status_probe = SingleFlight("github_status")
+
 class GitHubUser(BaseModel):
     login: str
     name: Optional[str]
@@ -30,56 +40,76 @@ class Repository(BaseModel):
     updated_at: str
     created_at: str
 
+LINK_LAST_PATTERN = re.compile(r'<([^>]+)>;\s*rel="last"')
+
+def repository_from_api(repo: Dict[str, Any]) -> Repository:
+    """Build a Repository from a GitHub API repository object"""
+    return Repository(
+        id=repo["id"],
+        name=repo["name"],
+        full_name=repo["full_name"],
+        description=repo.get("description"),
+        private=repo["private"],
+        html_url=repo["html_url"],
+        language=repo.get("language"),
+        stargazers_count=repo["stargazers_count"],
+        forks_count=repo["forks_count"],
+        updated_at=repo["updated_at"],
+        created_at=repo["created_at"]
+    )
+
+def parse_last_page(link_header: Optional[str]) -> int:
+    """Get the last page number from a GitHub Link header (1 when there is a single page)"""
+    match = LINK_LAST_PATTERN.search(link_header or "")
+    if not match:
+        return 1
+    
+    page = parse_qs(urlparse(match.group(1)).query).get("page", ["1"])[0]
+    return int(page)
+
 @router.get("/user", response_model=GitHubUser)
-async def get_github_user():
+async def get_github_user(
+    clients: UpstreamClients = Depends(get_upstream_clients),
+    cache: ConditionalCache = Depends(get_github_cache)
+):
     """Get authenticated GitHub user information"""
     try:
-        github_token = os.getenv("GITHUB_TOKEN")
-        if not github_token:
+        if not clients.github_configured:
             raise HTTPException(status_code=401, detail="GitHub token not configured")
         
-        headers = {
-            "Authorization": f"Bearer {github_token}",
-            "Accept": "application/vnd.github.v3+json",
-            "User-Agent": "ai-foundry-monorepo/1.0.0"
-        }
+        status_code, data = await cache.fetch_json(clients.github, "/user", token=clients.github_token)
+        
+        if status_code != 200:
+            raise HTTPException(status_code=status_code, detail="Failed to fetch GitHub user")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://api.github.com/user", headers=headers)
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch GitHub user")
-            
-            data = response.json()
-            
-            return GitHubUser(
-                login=data["login"],
-                name=data.get("name"),
-                email=data.get("email"),
-                avatar_url=data["avatar_url"],
-                public_repos=data["public_repos"],
-                followers=data["followers"],
-                following=data["following"]
-            )
+        return GitHubUser(
+            login=data["login"],
+            name=data.get("name"),
+            email=data.get("email"),
+            avatar_url=data["avatar_url"],
+            public_repos=data["public_repos"],
+            followers=data["followers"],
+            following=data["following"]
+        )
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"GitHub API request failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get GitHub user")
 
 @router.get("/repos", response_model=List[Repository])
-async def get_github_repos(limit: int = 30, page: int = 1):
+async def get_github_repos(
+    limit: int = 30,
+    page: int = 1,
+    clients: UpstreamClients = Depends(get_upstream_clients),
+    cache: ConditionalCache = Depends(get_github_cache)
+):
     """Get user repositories"""
     try:
-        github_token = os.getenv("GITHUB_TOKEN")
-        if not github_token:
+        if not clients.github_configured:
             raise HTTPException(status_code=401, detail="GitHub token not configured")
         
-        headers = {
-            "Authorization": f"Bearer {github_token}",
-            "Accept": "application/vnd.github.v3+json",
-            "User-Agent": "ai-foundry-monorepo/1.0.0"
-        }
-        
         params = {
             "sort": "updated",
             "direction": "desc",
@@ -87,77 +117,111 @@ async def get_github_repos(limit: int = 30, page: int = 1):
             "page": page
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.github.com/user/repos",
-                headers=headers,
-                params=params
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch repositories")
-            
-            data = response.json()
-            
-            repos = []
-            for repo in data:
-                repos.append(Repository(
-                    id=repo["id"],
-                    name=repo["name"],
-                    full_name=repo["full_name"],
-                    description=repo.get("description"),
-                    private=repo["private"],
-                    html_url=repo["html_url"],
-                    language=repo.get("language"),
-                    stargazers_count=repo["stargazers_count"],
-                    forks_count=repo["forks_count"],
-                    updated_at=repo["updated_at"],
-                    created_at=repo["created_at"]
-                ))
-            
-            return repos
+        status_code, data = await cache.fetch_json(
+            clients.github, "/user/repos", params=params, token=clients.github_token
+        )
+        
+        if status_code != 200:
+            raise HTTPException(status_code=status_code, detail="Failed to fetch repositories")
+        
+        return [repository_from_api(repo) for repo in data]
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"GitHub API request failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get repositories")
 
+@router.get("/repos/all")
+async def get_all_github_repos(
+    concurrency: int = Query(4, ge=1, le=10),
+    clients: UpstreamClients = Depends(get_upstream_clients)
+):
+    """Stream every repository as NDJSON, fetching pages concurrently"""
+    if not clients.github_configured:
+        raise HTTPException(status_code=401, detail="GitHub token not configured")
+    
+    params = {"sort": "updated", "direction": "desc", "per_page": 100}
+    
+    # The first page tells us how many pages there are
+    try:
+        first_page = await clients.github.get("/user/repos", params={**params, "page": 1})
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"GitHub API request failed: {str(e)}")
+    
+    if first_page.status_code != 200:
+        raise HTTPException(status_code=first_page.status_code, detail="Failed to fetch repositories")
+    
+    last_page = parse_last_page(first_page.headers.get("Link"))
+    
+    async def fetch_page(page: int) -> List[Dict[str, Any]]:
+        response = await clients.github.get("/user/repos", params={**params, "page": page})
+        response.raise_for_status()
+        return response.json()
+    
+    def encode_page(data: List[Dict[str, Any]]) -> str:
+        return "".join(repository_from_api(repo).model_dump_json() + "\n" for repo in data)
+    
+    async def stream_repos():
+        yield encode_page(first_page.json())
+        
+        # Keep at most `concurrency` pages in flight or waiting to be sent, so
+        # memory stays flat however many repositories the account has
+        next_page = 2
+        pending = {}
+        try:
+            while next_page <= last_page or pending:
+                while next_page <= last_page and len(pending) < concurrency:
+                    pending[asyncio.create_task(fetch_page(next_page))] = next_page
+                    next_page += 1
+                
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = pending.pop(task)
+                    try:
+                        yield encode_page(task.result())
+                    except Exception as e:
+                        # Headers are already sent, so report the failure in-band
+                        yield json.dumps({"error": f"Failed to fetch page {page}", "details": str(e)}) + "\n"
+                        return
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    return StreamingResponse(stream_repos(), media_type="application/x-ndjson")
+
 @router.get("/status")
-async def get_github_status():
+async def get_github_status(clients: UpstreamClients = Depends(get_upstream_clients)):
     """Get GitHub API status and configuration"""
     try:
-        github_token = os.getenv("GITHUB_TOKEN")
-        configured = bool(github_token)
+        configured = clients.github_configured
         
         status = {
             "configured": configured,
-            "api_url": "https://api.github.com",
+            "api_url": str(clients.github.base_url).rstrip("/"),
             "timestamp": datetime.utcnow().isoformat()
         }
         
         if configured:
             # Test API connectivity
-            headers = {
-                "Authorization": f"Bearer {github_token}",
-                "Accept": "application/vnd.github.v3+json",
-                "User-Agent": "ai-foundry-monorepo/1.0.0"
-            }
-            
             try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    response = await client.get("https://api.github.com/rate_limit", headers=headers)
-                    
-                    if response.status_code == 200:
-                        rate_limit_data = response.json()
-                        status["api_status"] = "connected"
-                        status["rate_limit"] = {
-                            "limit": rate_limit_data["rate"]["limit"],
-                            "remaining": rate_limit_data["rate"]["remaining"],
-                            "reset": rate_limit_data["rate"]["reset"]
-                        }
-                    else:
-                        status["api_status"] = "error"
-                        status["error"] = f"API returned status {response.status_code}"
-            except asyncio.TimeoutError:
+                # Concurrent status checks share one probe
+                response = await status_probe.do(
+                    "rate_limit", lambda: clients.github.get("/rate_limit", timeout=5.0)
+                )
+                
+                if response.status_code == 200:
+                    rate_limit_data = response.json()
+                    status["api_status"] = "connected"
+                    status["rate_limit"] = {
+                        "limit": rate_limit_data["rate"]["limit"],
+                        "remaining": rate_limit_data["rate"]["remaining"],
+                        "reset": rate_limit_data["rate"]["reset"]
+                    }
+                else:
+                    status["api_status"] = "error"
+                    status["error"] = f"API returned status {response.status_code}"
+            except httpx.TimeoutException:
                 status["api_status"] = "timeout"
             except Exception as e:
                 status["api_status"] = "error"
@@ -1,41 +1,49 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import FiniteFloat
+import hmac
 import os
 import sys
-import psutil
+import time
 from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
 import platform
 
+from app.services.metrics import metrics
+from app.services.metrics_history import MetricsHistory, get_metrics_history
+from app.services.loop_monitor import LoopMonitor, get_loop_monitor
+from app.services.profiler import ProfilerBusy, SamplingProfiler, get_profiler
+from app.services.system_sampler import SystemSampler, get_system_sampler
+
 router = APIRouter()
 
+@lru_cache(maxsize=None)
+def platform_info() -> Dict[str, str]:
+    # platform.processor() may run a subprocess, so this is computed once
+    return {
+        "system": platform.system(),
+        "release": platform.release(),
+        "version": platform.version(),
+        "machine": platform.machine(),
+        "processor": platform.processor()
+    }
+
 @router.get("/info")
-async def get_system_info():
-    """Get system information"""
+async def get_system_info(sampler: SystemSampler = Depends(get_system_sampler)):
+    """Get system information (from the latest background sample)"""
     try:
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        snapshot = sampler.snapshot
+        if snapshot is None:
+            raise RuntimeError("system metrics have not been sampled yet")
         
         info = {
             "python_version": sys.version,
-            "platform": {
-                "system": platform.system(),
-                "release": platform.release(),
-                "version": platform.version(),
-                "machine": platform.machine(),
-                "processor": platform.processor()
-            },
-            "memory": {
-                "total": memory.total,
-                "available": memory.available,
-                "percent": memory.percent,
-                "used": memory.used,
-                "free": memory.free
-            },
-            "disk": {
-                "total": disk.total,
-                "used": disk.used,
-                "free": disk.free,
-                "percent": (disk.used / disk.total) * 100
-            },
+            "platform": platform_info(),
+            "memory": snapshot["memory"],
+            "disk": snapshot["disk"],
+            "process": snapshot["process"],
+            "sampled_at": snapshot["timestamp"],
             "environment": os.getenv("ENVIRONMENT", "development"),
             "timestamp": datetime.utcnow().isoformat()
         }
@@ -49,20 +57,26 @@ async def get_system_info():
         }
 
 @router.get("/health")
-async def health_check():
-    """Extended health check with system metrics"""
+async def health_check(sampler: SystemSampler = Depends(get_system_sampler)):
+    """Extended health check with system metrics (from the latest background sample)"""
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
+        snapshot = sampler.snapshot
+        if snapshot is None:
+            raise RuntimeError("system metrics have not been sampled yet")
+        cpu_percent = snapshot["cpu_percent"]
+        memory_percent = snapshot["memory"]["percent"]
         
         health = {
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
-            "uptime": psutil.boot_time(),
+            "uptime": snapshot["boot_time"],
             "metrics": {
                 "cpu_percent": cpu_percent,
-                "memory_percent": memory.percent,
-                "disk_percent": (psutil.disk_usage('/').used / psutil.disk_usage('/').total) * 100
+                "memory_percent": memory_percent,
+                "disk_percent": snapshot["disk"]["percent"],
+                "process_rss": snapshot["process"]["rss"],
+                "process_open_fds": snapshot["process"]["num_fds"],
+                "sample_age_seconds": round(sampler.age(), 3)
             },
             "services": {
                 "fastapi": "running",
@@ -73,13 +87,13 @@ async def health_check():
         }
         
         # Set overall health status based on metrics
-        if cpu_percent > 90 or memory.percent > 90:
+        if cpu_percent > 90 or memory_percent > 90:
             health["status"] = "degraded"
             health["warnings"] = []
             
             if cpu_percent > 90:
                 health["warnings"].append("High CPU usage")
-            if memory.percent > 90:
+            if memory_percent > 90:
                 health["warnings"].append("High memory usage")
         
         return health
@@ -90,6 +104,62 @@ async def health_check():
             "timestamp": datetime.utcnow().isoformat()
         }
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@router.get("/metrics/history")
+async def metrics_history(
+    start: Optional[FiniteFloat] = Query(None, description="Unix time; negative values are seconds before end"),
+    end: Optional[FiniteFloat] = Query(None, description="Unix time, defaults to now"),
+    step: Optional[FiniteFloat] = Query(None, gt=0, description="Bucket width in seconds"),
+    names: Optional[str] = Query(None, alias="metrics", description="Comma-separated metric names, defaults to all"),
+    agg: str = Query("avg", description="avg, min or max within each bucket"),
+    history: MetricsHistory = Depends(get_metrics_history)
+):
+    """Sampled metrics over a time range, downsampled to step"""
+    end = end if end is not None else time.time()
+    if start is None:
+        start = end - 600
+    elif start < 0:
+        start = end + start
+    columns = [name.strip() for name in names.split(",") if name.strip()] if names else None
+    try:
+        return history.query(start, end, step, columns, agg)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def require_profiler_token(x_profiler_token: Optional[str] = Header(None)):
+    """Diagnostics expose code paths; they need PROFILER_TOKEN in X-Profiler-Token"""
+    token = os.getenv("PROFILER_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    if not x_profiler_token or not hmac.compare_digest(x_profiler_token, token):
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+@router.get("/loop", dependencies=[Depends(require_profiler_token)])
+async def get_loop_stats(monitor: LoopMonitor = Depends(get_loop_monitor)):
+    """Event-loop lag and stacks of the most recent slow callbacks"""
+    return monitor.get_stats()
+
+@router.get("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_profiler_token)])
+async def profile(
+    seconds: float = Query(5, gt=0, description="Profile duration, capped by PROFILER_MAX_SECONDS"),
+    hz: int = Query(100, gt=0, description="Samples per second"),
+    loop_only: bool = Query(False, description="Only sample the event-loop thread"),
+    profiler: SamplingProfiler = Depends(get_profiler)
+):
+    """Sample this worker's stacks for a few seconds; collapsed stacks for a flamegraph"""
+    try:
+        collapsed, samples = await profiler.profile(seconds, hz, loop_only)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed, headers={"X-Profile-Samples": str(samples)})
+
 @router.get("/environment")
 async def get_environment_info():
     """Get environment variables (safe subset)"""
@@ -1,13 +1,28 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from fastapi.responses import HTMLResponse
-import json
-import asyncio
+from pydantic import ValidationError
+import itertools
+import logging
 from datetime import datetime
 from typing import Dict, Any
 
-from app.services.websocket_manager import WebSocketManager
+import httpx
+
+from app.routers.azure_ai import ChatRequest
+from app.services.admission import AdmissionRejected
+from app.services.azure_openai import FALLBACK_NOTE, AzureOpenAIError, user_messages
+from app.services.websocket_manager import RequestRejected, WebSocketManager
+from app.services.ws_protocol import receive_message
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+class WebSocketChatRequest(ChatRequest):
+    """ai_chat payload: the REST chat request, streamed unless stream is false"""
+    stream: bool = True
+
+# Request IDs for clients that don't send their own
+server_request_ids = itertools.count(1)
 
 # HTML page for testing WebSocket connections
 websocket_test_html = """
@@ -32,6 +47,10 @@ websocket_test_html = """
         <div>
             <button onclick="connect()">Connect</button>
             <button onclick="disconnect()">Disconnect</button>
+            <select id="protocolSelect">
+                <option value="json">JSON</option>
+                <option value="msgpack">MessagePack</option>
+            </select>
             <span id="status">Disconnected</span>
         </div>
         
@@ -45,6 +64,8 @@ websocket_test_html = """
         <div>
             <input type="text" id="aiInput" placeholder="Ask AI something..." onkeypress="handleAIKeyPress(event)">
             <button onclick="sendAIMessage()">Ask AI</button>
+            <button onclick="cancelAIMessage()">Cancel AI</button>
+            <button onclick="toggleStats()">Subscribe/Unsubscribe Stats</button>
         </div>
     </div>
 
@@ -52,21 +73,41 @@ websocket_test_html = """
         let ws = null;
         const messages = document.getElementById('messages');
         const status = document.getElementById('status');
+        // Streamed replies are assembled per request_id
+        const replies = {};
+        let requestCounter = 0;
+        let lastRequestId = null;
+        let statsSubscribed = false;
 
         function connect() {
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
             const wsUrl = `${protocol}//${window.location.host}/ws/websocket`;
             
-            ws = new WebSocket(wsUrl);
+            // Ask for the selected subprotocol; binary frames arrive as ArrayBuffers
+            ws = new WebSocket(wsUrl, [document.getElementById('protocolSelect').value]);
+            ws.binaryType = 'arraybuffer';
+            statsSubscribed = false;
             
             ws.onopen = function(event) {
-                status.textContent = 'Connected';
+                status.textContent = `Connected (${ws.protocol || 'json'})`;
                 status.style.color = 'green';
-                addMessage('Connected to WebSocket server', 'success');
+                addMessage(`Connected to WebSocket server using ${ws.protocol || 'json'}`, 'success');
             };
             
             ws.onmessage = function(event) {
-                const data = JSON.parse(event.data);
+                const data = typeof event.data === 'string'
+                    ? JSON.parse(event.data)
+                    : msgpackDecode(new Uint8Array(event.data));
+                if (data.type === 'ai_delta') {
+                    if (!replies[data.request_id]) {
+                        replies[data.request_id] = addMessage(`AI (${data.request_id}): `, 'success');
+                    }
+                    replies[data.request_id].textContent += data.delta;
+                    return;
+                }
+                if (data.request_id) {
+                    delete replies[data.request_id];
+                }
                 addMessage(JSON.stringify(data, null, 2), 'system');
             };
             
@@ -81,6 +122,113 @@ websocket_test_html = """
             };
         }
 
+        function send(data) {
+            ws.send(ws.protocol === 'msgpack' ? msgpackEncode(data) : JSON.stringify(data));
+        }
+
+        // Minimal MessagePack codec: maps, arrays, strings, numbers, booleans and nil
+        function msgpackEncode(value) {
+            const bytes = [];
+            const utf8 = new TextEncoder();
+            function writeUint(n, size) {
+                for (let i = size - 1; i >= 0; i--) bytes.push(Math.floor(n / 2 ** (8 * i)) & 0xff);
+            }
+            function header(n, fix, code) {
+                if (n < 16) { bytes.push(fix | n); }
+                else if (n < 65536) { bytes.push(code); writeUint(n, 2); }
+                else { bytes.push(code + 1); writeUint(n, 4); }
+            }
+            function write(v) {
+                if (v === null || v === undefined) { bytes.push(0xc0); }
+                else if (typeof v === 'boolean') { bytes.push(v ? 0xc3 : 0xc2); }
+                else if (typeof v === 'number') {
+                    if (Number.isInteger(v) && v >= 0 && v < 2 ** 32) {
+                        if (v < 128) { bytes.push(v); }
+                        else if (v < 256) { bytes.push(0xcc, v); }
+                        else if (v < 65536) { bytes.push(0xcd); writeUint(v, 2); }
+                        else { bytes.push(0xce); writeUint(v, 4); }
+                    } else if (Number.isInteger(v) && v >= -32 && v < 0) {
+                        bytes.push(v & 0xff);
+                    } else {
+                        const view = new DataView(new ArrayBuffer(8));
+                        view.setFloat64(0, v);
+                        bytes.push(0xcb, ...new Uint8Array(view.buffer));
+                    }
+                } else if (typeof v === 'string') {
+                    const data = utf8.encode(v);
+                    if (data.length < 32) { bytes.push(0xa0 | data.length); }
+                    else if (data.length < 256) { bytes.push(0xd9, data.length); }
+                    else if (data.length < 65536) { bytes.push(0xda); writeUint(data.length, 2); }
+                    else { bytes.push(0xdb); writeUint(data.length, 4); }
+                    data.forEach(b => bytes.push(b));
+                } else if (Array.isArray(v)) {
+                    header(v.length, 0x90, 0xdc);
+                    v.forEach(write);
+                } else {
+                    const keys = Object.keys(v);
+                    header(keys.length, 0x80, 0xde);
+                    keys.forEach(key => { write(key); write(v[key]); });
+                }
+            }
+            write(value);
+            return new Uint8Array(bytes);
+        }
+
+        function msgpackDecode(bytes) {
+            const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+            const utf8 = new TextDecoder();
+            let pos = 0;
+            function uint(size) {
+                let n = 0;
+                for (let i = 0; i < size; i++) n = n * 256 + bytes[pos++];
+                return n;
+            }
+            function number(getter, size) {
+                const n = view[getter](pos);
+                pos += size;
+                return n;
+            }
+            function str(n) { pos += n; return utf8.decode(bytes.subarray(pos - n, pos)); }
+            function bin(n) { pos += n; return bytes.slice(pos - n, pos); }
+            function array(n) { const out = []; for (let i = 0; i < n; i++) out.push(read()); return out; }
+            function map(n) { const out = {}; for (let i = 0; i < n; i++) { const key = read(); out[key] = read(); } return out; }
+            function read() {
+                const type = bytes[pos++];
+                if (type < 0x80) return type;
+                if (type < 0x90) return map(type & 0x0f);
+                if (type < 0xa0) return array(type & 0x0f);
+                if (type < 0xc0) return str(type & 0x1f);
+                if (type >= 0xe0) return type - 0x100;
+                switch (type) {
+                    case 0xc0: return null;
+                    case 0xc2: return false;
+                    case 0xc3: return true;
+                    case 0xc4: return bin(uint(1));
+                    case 0xc5: return bin(uint(2));
+                    case 0xc6: return bin(uint(4));
+                    case 0xca: return number('getFloat32', 4);
+                    case 0xcb: return number('getFloat64', 8);
+                    case 0xcc: return uint(1);
+                    case 0xcd: return uint(2);
+                    case 0xce: return uint(4);
+                    case 0xcf: return uint(8);
+                    case 0xd0: return number('getInt8', 1);
+                    case 0xd1: return number('getInt16', 2);
+                    case 0xd2: return number('getInt32', 4);
+                    case 0xd3: return Number(number('getBigInt64', 8));
+                    case 0xd9: return str(uint(1));
+                    case 0xda: return str(uint(2));
+                    case 0xdb: return str(uint(4));
+                    case 0xdc: return array(uint(2));
+                    case 0xdd: return array(uint(4));
+                    case 0xde: return map(uint(2));
+                    case 0xdf: return map(uint(4));
+                }
+                throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}`);
+            }
+            return read();
+        }
+
         function disconnect() {
             if (ws) {
                 ws.close();
@@ -98,7 +246,7 @@ websocket_test_html = """
                     timestamp: new Date().toISOString()
                 };
                 
-                ws.send(JSON.stringify(data));
+                send(data);
                 addMessage(`Sent: ${message}`, 'message');
                 input.value = '';
             }
@@ -109,25 +257,41 @@ websocket_test_html = """
             const message = input.value.trim();
             
             if (message && ws && ws.readyState === WebSocket.OPEN) {
+                lastRequestId = `req-${++requestCounter}`;
                 const data = {
                     type: 'ai_chat',
+                    request_id: lastRequestId,
                     message: message,
                     model: 'gpt-3.5-turbo',
                     timestamp: new Date().toISOString()
                 };
                 
-                ws.send(JSON.stringify(data));
+                send(data);
                 addMessage(`AI Request: ${message}`, 'message');
                 input.value = '';
             }
         }
 
+        function toggleStats() {
+            if (ws && ws.readyState === WebSocket.OPEN) {
+                statsSubscribed = !statsSubscribed;
+                send({ type: statsSubscribed ? 'subscribe_stats' : 'unsubscribe_stats' });
+            }
+        }
+
+        function cancelAIMessage() {
+            if (lastRequestId && ws && ws.readyState === WebSocket.OPEN) {
+                send({ type: 'cancel', request_id: lastRequestId });
+            }
+        }
+
         function addMessage(message, type = 'message') {
             const div = document.createElement('div');
             div.className = `message ${type}`;
             div.textContent = `[${new Date().toLocaleTimeString()}] ${message}`;
             messages.appendChild(div);
             messages.scrollTop = messages.scrollHeight;
+            return div;
         }
 
         function handleKeyPress(event) {
@@ -160,42 +324,54 @@ async def websocket_test_page():
 async def websocket_endpoint(websocket: WebSocket):
     """Main WebSocket endpoint"""
     manager = websocket.app.state.websocket_manager
-    await manager.connect(websocket)
+    state = await manager.connect(websocket)
     
     try:
         # Send welcome message
-        await websocket.send_json({
+        await manager.send_personal_message({
             "type": "welcome",
             "message": "Connected to AI Foundry Python Backend",
             "timestamp": datetime.utcnow().isoformat(),
-            "client_id": id(websocket)
-        })
+            "client_id": state.id,
+            "protocol": state.protocol
+        }, websocket)
         
         while True:
             # Receive message from client
-            data = await websocket.receive_json()
+            data = await receive_message(websocket, state.protocol)
             
             message_type = data.get("type", "message")
             
             if message_type == "message":
                 await handle_message(websocket, data, manager)
             elif message_type == "ai_chat":
-                await handle_ai_chat(websocket, data, manager)
+                # Runs as its own task so later messages aren't held up by the AI call
+                await start_ai_chat(websocket, data, manager)
+            elif message_type == "cancel":
+                await handle_cancel(websocket, data, manager)
             elif message_type == "join_room":
                 await handle_join_room(websocket, data, manager)
             elif message_type == "leave_room":
                 await handle_leave_room(websocket, data, manager)
+            elif message_type == "subscribe_stats":
+                manager.subscribe_stats(websocket)
+            elif message_type == "unsubscribe_stats":
+                manager.unsubscribe_stats(websocket)
+                await manager.send_personal_message({
+                    "type": "stats_unsubscribed",
+                    "timestamp": datetime.utcnow().isoformat()
+                }, websocket)
             else:
-                await websocket.send_json({
+                await manager.send_personal_message({
                     "type": "error",
                     "message": f"Unknown message type: {message_type}",
                     "timestamp": datetime.utcnow().isoformat()
-                })
+                }, websocket)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
-    except Exception as e:
-        print(f"WebSocket error: {e}")
+    except Exception:
+        logger.exception("WebSocket error")
         manager.disconnect(websocket)
 
 async def handle_message(websocket: WebSocket, data: Dict[Any, Any], manager: WebSocketManager):
@@ -203,37 +379,133 @@ async def handle_message(websocket: WebSocket, data: Dict[Any, Any], manager: We
     message = data.get("message", "")
     
     # Echo message back to sender
-    await websocket.send_json({
+    await manager.send_personal_message({
         "type": "echo",
         "message": message,
         "timestamp": datetime.utcnow().isoformat()
-    })
+    }, websocket)
     
     # Broadcast to all other clients
     await manager.broadcast({
         "type": "broadcast",
         "message": message,
-        "sender_id": id(websocket),
+        "sender_id": manager.get_client_id(websocket),
         "timestamp": datetime.utcnow().isoformat()
     }, exclude=websocket)
 
-async def handle_ai_chat(websocket: WebSocket, data: Dict[Any, Any], manager: WebSocketManager):
-    """Handle AI chat requests"""
-    message = data.get("message", "")
-    model = data.get("model", "gpt-3.5-turbo")
+async def send_ai_error(
+    websocket: WebSocket, manager: WebSocketManager, request_id: str, message: str, **fields: Any
+):
+    """End a request with an ai_error frame"""
+    await manager.send_personal_message({
+        "type": "ai_error",
+        "request_id": request_id,
+        "message": message,
+        **fields,
+        "timestamp": datetime.utcnow().isoformat()
+    }, websocket)
+
+async def start_ai_chat(websocket: WebSocket, data: Dict[Any, Any], manager: WebSocketManager):
+    """Start an AI chat request under the client's request_id, within the connection's request limit"""
+    request_id = str(data.get("request_id") or f"srv-{next(server_request_ids)}")
     
-    # Simulate AI processing delay
-    await asyncio.sleep(1)
+    try:
+        request = WebSocketChatRequest.model_validate(data)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        await send_ai_error(websocket, manager, request_id, f"Invalid ai_chat request: {problems}")
+        return
     
-    # Send AI response (placeholder)
-    await websocket.send_json({
+    try:
+        manager.start_request(websocket, request_id, handle_ai_chat(websocket, request, manager, request_id))
+    except RequestRejected as e:
+        await send_ai_error(websocket, manager, request_id, str(e))
+
+async def handle_ai_chat(
+    websocket: WebSocket, request: WebSocketChatRequest, manager: WebSocketManager, request_id: str
+):
+    """Handle AI chat requests, streaming ai_delta frames unless stream is false"""
+    ai = websocket.app.state.azure_openai
+    
+    try:
+        if request.stream:
+            completion = await stream_ai_chat(websocket, request, manager, request_id)
+        else:
+            completion = await ai.chat(
+                user_messages(request.message), request.model, request.temperature, request.max_tokens,
+                use_cache=request.use_cache
+            )
+    except AdmissionRejected as e:
+        await send_ai_error(
+            websocket, manager, request_id, "AI capacity is exhausted, retry later", retry_after=e.retry_after
+        )
+        return
+    except (AzureOpenAIError, httpx.HTTPError) as e:
+        message = getattr(e, "message", None) or "upstream unavailable"
+        await send_ai_error(websocket, manager, request_id, f"AI service error: {message}")
+        return
+    except Exception as e:
+        # e.g. a malformed chunk in the upstream stream; the client still gets an answer
+        logger.error(f"WebSocket AI chat {request_id} failed: {e}")
+        await send_ai_error(websocket, manager, request_id, "AI service error")
+        return
+    
+    await manager.send_personal_message({
         "type": "ai_response",
-        "id": f"chat-{int(datetime.utcnow().timestamp())}",
-        "message": f"AI Response from Python FastAPI: {message}",
-        "model": model,
+        "request_id": request_id,
         "timestamp": datetime.utcnow().isoformat(),
-        "note": "This is a placeholder response. Configure Azure OpenAI to enable AI features."
-    })
+        **completion
+    }, websocket)
+
+async def stream_ai_chat(
+    websocket: WebSocket, request: WebSocketChatRequest, manager: WebSocketManager, request_id: str
+) -> Dict[str, Any]:
+    """Send each content delta as an ai_delta frame and return the assembled completion"""
+    ai = websocket.app.state.azure_openai
+    stream = await ai.stream_chat(
+        user_messages(request.message), request.model, request.temperature, request.max_tokens
+    )
+    
+    parts = []
+    try:
+        async for delta in stream:
+            parts.append(delta)
+            await manager.send_personal_message({
+                "type": "ai_delta",
+                "request_id": request_id,
+                "delta": delta
+            }, websocket)
+    finally:
+        # Also runs when the request is cancelled or the socket goes away
+        await stream.aclose()
+    
+    return {
+        "id": stream.id,
+        "message": "".join(parts),
+        "model": request.model,
+        "finish_reason": stream.finish_reason,
+        "usage": None,
+        "note": None if ai.configured else FALLBACK_NOTE,
+        "cached": False,
+    }
+
+async def handle_cancel(websocket: WebSocket, data: Dict[Any, Any], manager: WebSocketManager):
+    """Cancel an in-flight request by its request_id"""
+    request_id = str(data.get("request_id", ""))
+    
+    if manager.cancel_request(websocket, request_id):
+        await manager.send_personal_message({
+            "type": "ai_cancelled",
+            "request_id": request_id,
+            "timestamp": datetime.utcnow().isoformat()
+        }, websocket)
+    else:
+        await manager.send_personal_message({
+            "type": "error",
+            "request_id": request_id,
+            "message": f"No request in progress with id {request_id}",
+            "timestamp": datetime.utcnow().isoformat()
+        }, websocket)
 
 async def handle_join_room(websocket: WebSocket, data: Dict[Any, Any], manager: WebSocketManager):
     """Handle room join requests"""
@@ -241,11 +513,11 @@ async def handle_join_room(websocket: WebSocket, data: Dict[Any, Any], manager:
     
     if room:
         manager.join_room(websocket, room)
-        await websocket.send_json({
+        await manager.send_personal_message({
             "type": "room_joined",
             "room": room,
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }, websocket)
 
 async def handle_leave_room(websocket: WebSocket, data: Dict[Any, Any], manager: WebSocketManager):
     """Handle room leave requests"""
@@ -253,8 +525,8 @@ async def handle_leave_room(websocket: WebSocket, data: Dict[Any, Any], manager:
     
     if room:
         manager.leave_room(websocket, room)
-        await websocket.send_json({
+        await manager.send_personal_message({
             "type": "room_left",
             "room": room,
             "timestamp": datetime.utcnow().isoformat()
-        })
\ No newline at end of file
+        }, websocket)
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""Token-budget admission control for upstream AI calls.
+
+Every call is charged an estimated token cost (prompt length / 4 plus the
+completion budget) against a per-model tokens-per-minute bucket. Calls that
+fit are admitted immediately; the rest wait in a per-model priority queue
+where interactive traffic is served before batch traffic. When a queue is
+full, or a call would wait longer than the configured maximum, it is
+rejected at once with a Retry-After estimate instead of timing out later.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Completion budget assumed when a request doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+class AdmissionRejected(Exception):
+    """The model's token budget can't take the call soon enough"""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"Token budget for {model} exhausted; retry after {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def estimate_tokens(prompt: str, max_tokens: Optional[int]) -> int:
+    """Rough cost of a call: about four characters per prompt token plus the completion budget"""
+    return len(prompt) // 4 + 1 + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def parse_budgets(setting: str) -> Dict[str, int]:
+    """Parse ``model=tokens,model=tokens`` into a dict"""
+    budgets = {}
+    for pair in setting.split(","):
+        model, _, tokens = pair.partition("=")
+        if model.strip() and tokens.strip():
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+class TokenBucket:
+    """Tokens-per-minute budget refilled continuously"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until cost tokens are available"""
+        self.refill(now)
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+
+class ModelQueue:
+    """Budget, waiting calls and dispatcher for one model"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.bucket = TokenBucket(tokens_per_minute)
+        # (priority, sequence, cost, future)
+        self.waiters: List[tuple] = []
+        self.queued_tokens = 0
+        self.wakeup = asyncio.Event()
+        self.dispatcher: Optional[asyncio.Task] = None
+
+    def remove(self, entry: tuple):
+        """Drop a waiter that gave up, so it no longer counts toward depth or queued tokens"""
+        try:
+            self.waiters.remove(entry)
+        except ValueError:
+            # Already popped by the dispatcher
+            return
+        heapq.heapify(self.waiters)
+        self.queued_tokens -= entry[2]
+
+
+class AdmissionController:
+    """Per-model token budgets with a priority queue in front of each"""
+
+    def __init__(
+        self,
+        default_tokens_per_minute: int = 120_000,
+        model_tokens_per_minute: Optional[Dict[str, int]] = None,
+        max_queue: int = 100,
+        max_wait: float = 30.0,
+    ):
+        self.default_tokens_per_minute = default_tokens_per_minute
+        self.model_tokens_per_minute = model_tokens_per_minute or {}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.models: Dict[str, ModelQueue] = {}
+        self.sequence = itertools.count()
+        self.counts = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            default_tokens_per_minute=int(os.getenv("AI_TOKENS_PER_MINUTE", 120_000)),
+            model_tokens_per_minute=parse_budgets(os.getenv("AI_MODEL_TOKENS_PER_MINUTE", "")),
+            max_queue=int(os.getenv("AI_ADMISSION_QUEUE_SIZE", 100)),
+            max_wait=float(os.getenv("AI_ADMISSION_MAX_WAIT", 30)),
+        )
+
+    def queue_for(self, model: str) -> ModelQueue:
+        queue = self.models.get(model)
+        if queue is None:
+            budget = self.model_tokens_per_minute.get(model, self.default_tokens_per_minute)
+            queue = self.models[model] = ModelQueue(budget)
+        return queue
+
+    async def admit(self, model: str, cost: int, priority: int = PRIORITY_INTERACTIVE):
+        """Wait until the model's budget covers cost, or raise AdmissionRejected"""
+        queue = self.queue_for(model)
+        bucket = queue.bucket
+        # A call larger than the whole budget would never fit; charge it the full budget
+        cost = min(cost, bucket.capacity)
+        now = time.monotonic()
+
+        # Fast path: nothing waiting and enough budget
+        if not queue.waiters and bucket.wait_time(cost, now) == 0:
+            bucket.tokens -= cost
+            self.counts["admitted"] += 1
+            return
+
+        expected_wait = bucket.wait_time(queue.queued_tokens + cost, now)
+        if len(queue.waiters) >= self.max_queue or expected_wait > self.max_wait:
+            self.counts["rejected"] += 1
+            raise AdmissionRejected(model, max(1, math.ceil(expected_wait)))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self.sequence), cost, future)
+        heapq.heappush(queue.waiters, entry)
+        queue.queued_tokens += cost
+        self.counts["queued"] += 1
+        queue.wakeup.set()
+        if queue.dispatcher is None or queue.dispatcher.done():
+            queue.dispatcher = asyncio.create_task(self.dispatch(queue))
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait ran out
+                self.counts["admitted"] += 1
+                return
+            future.cancel()
+            queue.remove(entry)
+            queue.wakeup.set()
+            self.counts["rejected"] += 1
+            retry_after = bucket.wait_time(queue.queued_tokens, time.monotonic())
+            raise AdmissionRejected(model, max(1, math.ceil(retry_after)))
+        except asyncio.CancelledError:
+            # Refund if we were admitted meanwhile, otherwise leave the queue
+            if future.done() and not future.cancelled():
+                bucket.tokens += cost
+            future.cancel()
+            queue.remove(entry)
+            queue.wakeup.set()
+            raise
+        self.counts["admitted"] += 1
+
+    async def dispatch(self, queue: ModelQueue):
+        """Admit waiters in priority order as the budget refills"""
+        while queue.waiters:
+            _, _, cost, future = queue.waiters[0]
+            if future.done():
+                heapq.heappop(queue.waiters)
+                queue.queued_tokens -= cost
+                continue
+
+            wait = queue.bucket.wait_time(cost, time.monotonic())
+            if wait > 0:
+                # Woken early when a higher-priority call joins the queue
+                queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(queue.waiters)
+            queue.queued_tokens -= cost
+            queue.bucket.tokens -= cost
+            future.set_result(None)
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {model: len(queue.waiters) for model, queue in self.models.items()}
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "results": dict(self.counts),
+            "models": {
+                model: {
+                    "tokens_per_minute": int(queue.bucket.capacity),
+                    "available_tokens": int(queue.bucket.tokens),
+                    "queued": len(queue.waiters),
+                    "queued_tokens": queue.queued_tokens,
+                }
+                for model, queue in self.models.items()
+            },
+        }
+
+    async def aclose(self):
+        for queue in self.models.values():
+            if queue.dispatcher is not None:
+                queue.dispatcher.cancel()
+            for _, _, _, future in queue.waiters:
+                future.cancel()
+            queue.waiters.clear()
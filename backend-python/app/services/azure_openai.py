@@ -0,0 +1,355 @@
+"""Azure OpenAI chat completions over the shared pooled client.
+
+``chat`` returns a whole completion; ``stream_chat`` opens a streamed
+completion and yields content deltas as the upstream Server-Sent Events
+arrive. When Azure OpenAI is not configured both fall back to an echo
+reply so the API and WebSocket chat keep working in development.
+``embed`` batches texts into embeddings calls, falling back to a local
+hashing embedder.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+from fastapi import Request
+
+from app.services.admission import PRIORITY_INTERACTIVE, AdmissionController, estimate_tokens
+from app.services.completion_cache import CompletionCache
+from app.services.http_clients import UpstreamClients
+from app.services.vector_index import HashingEmbedder
+
+DEFAULT_API_VERSION = "2024-02-01"
+DEFAULT_CHAT_MODEL = "gpt-3.5-turbo"
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Models known without configuration, as listed by /api/azure/models
+MODEL_CATALOG = {
+    "gpt-3.5-turbo": {
+        "name": "GPT-3.5 Turbo",
+        "description": "Fast and efficient model for most tasks",
+        "max_tokens": 4096,
+    },
+    "gpt-4": {
+        "name": "GPT-4",
+        "description": "Most capable model for complex tasks",
+        "max_tokens": 8192,
+    },
+    "text-embedding-ada-002": {
+        "name": "Text Embedding Ada 002",
+        "description": "Embedding model for semantic search",
+        "max_tokens": 8191,
+    },
+}
+
+# Queue, slot and metric label shared by every model the client doesn't know
+OTHER_MODELS = "other"
+
+FALLBACK_NOTE = "This is a placeholder response. Configure AZURE_OPENAI_API_KEY to enable AI features."
+
+
+class AzureOpenAIError(Exception):
+    """Azure OpenAI answered with an error status"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+
+def parse_deployments(setting: str) -> Dict[str, str]:
+    """Parse ``model=deployment,model=deployment`` into a dict"""
+    deployments = {}
+    for pair in setting.split(","):
+        model, _, deployment = pair.partition("=")
+        if model.strip() and deployment.strip():
+            deployments[model.strip()] = deployment.strip()
+    return deployments
+
+
+def user_messages(message: str) -> List[Dict[str, str]]:
+    return [{"role": "user", "content": message}]
+
+
+def fallback_reply(messages: List[Dict[str, str]]) -> str:
+    return f"Echo from Python FastAPI: {messages[-1]['content'] if messages else ''}"
+
+
+async def error_from_response(response: httpx.Response) -> AzureOpenAIError:
+    """Build an AzureOpenAIError from an upstream error response"""
+    await response.aread()
+    try:
+        message = response.json()["error"]["message"]
+    except Exception:
+        message = response.text[:200] or f"Azure OpenAI returned status {response.status_code}"
+    return AzureOpenAIError(response.status_code, message, response.headers.get("retry-after"))
+
+
+class ChatStream:
+    """Async iterator of content deltas from one streamed completion"""
+
+    def __init__(self, response: Optional[httpx.Response], model: str, fallback: Optional[str] = None):
+        self.response = response
+        self.model = model
+        self.fallback = fallback
+        self.id = f"chatcmpl-{int(time.time() * 1000)}"
+        self.finish_reason: Optional[str] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if self.response is None:
+            # Echo fallback, streamed word by word like a real completion
+            words = (self.fallback or "").split(" ")
+            for index, word in enumerate(words):
+                yield word if index == 0 else f" {word}"
+            self.finish_reason = "stop"
+            return
+
+        try:
+            async for line in self.response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = json.loads(data)
+                self.id = chunk.get("id") or self.id
+                # Azure sends content filter results as chunks without choices
+                for choice in chunk.get("choices") or ():
+                    if choice.get("finish_reason"):
+                        self.finish_reason = choice["finish_reason"]
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        """Close the upstream stream; safe to call more than once"""
+        if self.response is not None:
+            await self.response.aclose()
+
+
+class AzureOpenAIClient:
+    """Chat completions against Azure OpenAI deployments"""
+
+    def __init__(
+        self,
+        clients: UpstreamClients,
+        cache: Optional[CompletionCache] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        self.client = clients.azure_openai
+        self.configured = clients.azure_openai_configured
+        self.cache = cache
+        self.admission = admission
+        self.api_version = os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION)
+        # Model names map to deployment names; unmapped models use their own name
+        self.deployments = parse_deployments(os.getenv("AZURE_OPENAI_DEPLOYMENTS", ""))
+        # Known models, keyed by lowercase name, valued by the configured spelling. Only these get
+        # their own admission queue, batch slots and metric label; the rest share OTHER_MODELS
+        names = [*MODEL_CATALOG, *self.deployments]
+        if admission is not None:
+            names.extend(admission.model_tokens_per_minute)
+        self.models = {name.lower(): name for name in names}
+        # Batch work is limited per deployment, shared by every batch in the process
+        self.deployment_concurrency = int(os.getenv("AZURE_OPENAI_DEPLOYMENT_CONCURRENCY", 8))
+        self.deployment_slots: Dict[str, asyncio.Semaphore] = {}
+        # Inputs sent per embeddings call (Azure accepts up to 16 for ada-002)
+        self.embedding_batch_size = int(os.getenv("AZURE_OPENAI_EMBEDDING_BATCH_SIZE", 16))
+        self.fallback_embedder = HashingEmbedder()
+
+    def deployment_for(self, model: str) -> str:
+        return self.deployments.get(model, model)
+
+    def resolve_model(self, model: str) -> str:
+        """The configured spelling of a known model (matched case-insensitively), else model as sent.
+
+        The cache key and the upstream call both use this name.
+        """
+        model = model.strip()
+        return self.models.get(model.lower(), model)
+
+    def model_label(self, model: str) -> str:
+        """Admission queue and metric label for a resolved model; one label for all unknown models"""
+        return model if model.lower() in self.models else OTHER_MODELS
+
+    def list_models(self) -> List[Dict[str, Any]]:
+        """The known models, described by MODEL_CATALOG where it has them"""
+        configured = {"description": "Configured model", "max_tokens": None}
+        return [
+            {"id": model, **MODEL_CATALOG.get(model, {"name": model, **configured})}
+            for model in self.models.values()
+        ]
+
+    def slots(self, model: str) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent batch calls to the model's deployment"""
+        model = self.resolve_model(model)
+        label = self.model_label(model)
+        deployment = self.deployment_for(model) if label != OTHER_MODELS else OTHER_MODELS
+        semaphore = self.deployment_slots.get(deployment)
+        if semaphore is None:
+            semaphore = self.deployment_slots[deployment] = asyncio.Semaphore(self.deployment_concurrency)
+        return semaphore
+
+    def build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool,
+    ) -> httpx.Request:
+        body: Dict[str, Any] = {"messages": messages, "stream": stream}
+        if temperature is not None:
+            body["temperature"] = temperature
+        if max_tokens is not None:
+            body["max_tokens"] = max_tokens
+
+        return self.client.build_request(
+            "POST",
+            f"/openai/deployments/{quote(self.deployment_for(model), safe='')}/chat/completions",
+            params={"api-version": self.api_version},
+            json=body,
+        )
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Dict[str, Any]:
+        """Return ``{id, message, model, finish_reason, usage, note, cached}`` for one completion.
+
+        Deterministic requests (``temperature == 0``) go through the completion
+        cache unless ``use_cache`` is False; only upstream calls pass admission.
+        """
+        model = self.resolve_model(model)
+        if not self.configured:
+            return {
+                "id": f"chatcmpl-{int(time.time() * 1000)}",
+                "message": fallback_reply(messages),
+                "model": model,
+                "finish_reason": "stop",
+                "usage": None,
+                "note": FALLBACK_NOTE,
+                "cached": False,
+            }
+
+        if self.cache is None:
+            return {**await self.complete(messages, model, temperature, max_tokens, priority), "cached": False}
+        if not use_cache or not self.cache.cacheable(temperature):
+            self.cache.counts["bypass"] += 1
+            return {**await self.complete(messages, model, temperature, max_tokens, priority), "cached": False}
+
+        key = self.cache.make_key(model, messages, temperature, max_tokens)
+        return await self.cache.get_or_create(
+            key, lambda: self.complete(messages, model, temperature, max_tokens, priority)
+        )
+
+    async def admit(self, messages: List[Dict[str, str]], model: str, max_tokens: Optional[int], priority: int):
+        """Wait for the model's token budget (raises AdmissionRejected)"""
+        if self.admission is not None:
+            prompt = "".join(message.get("content", "") for message in messages)
+            await self.admission.admit(self.model_label(model), estimate_tokens(prompt, max_tokens), priority)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Dict[str, Any]:
+        """Call the deployment for one completion, bypassing the cache"""
+        await self.admit(messages, model, max_tokens, priority)
+        response = await self.client.send(self.build_request(messages, model, temperature, max_tokens, False))
+        if response.status_code != 200:
+            raise await error_from_response(response)
+
+        data = response.json()
+        choice = data["choices"][0]
+        return {
+            "id": data.get("id", ""),
+            "message": choice["message"].get("content") or "",
+            "model": data.get("model", model),
+            "finish_reason": choice.get("finish_reason"),
+            "usage": data.get("usage"),
+            "note": None,
+        }
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> ChatStream:
+        """Start a streamed completion; upstream errors are raised before any delta"""
+        model = self.resolve_model(model)
+        if not self.configured:
+            return ChatStream(None, model, fallback=fallback_reply(messages))
+
+        await self.admit(messages, model, max_tokens, priority)
+        request = self.build_request(messages, model, temperature, max_tokens, True)
+        response = await self.client.send(request, stream=True)
+        if response.status_code != 200:
+            try:
+                raise await error_from_response(response)
+            finally:
+                await response.aclose()
+
+        return ChatStream(response, model)
+
+    async def embed(self, texts: List[str], model: str = DEFAULT_EMBEDDING_MODEL) -> Tuple[np.ndarray, Dict[str, int]]:
+        """Embed texts as a float32 matrix, one row per text, plus token usage.
+
+        Texts are sent in batches of ``embedding_batch_size``; batches run
+        concurrently within the deployment's slots, and the first failure
+        cancels the rest.
+        """
+        model = self.resolve_model(model)
+        if not self.configured:
+            return self.fallback_embedder.embed(texts), {"prompt_tokens": 0, "total_tokens": 0}
+
+        path = f"/openai/deployments/{quote(self.deployment_for(model), safe='')}/embeddings"
+
+        async def embed_batch(batch: List[str]) -> Tuple[List[List[float]], Dict[str, int]]:
+            async with self.slots(model):
+                response = await self.client.post(path, params={"api-version": self.api_version}, json={"input": batch})
+            if response.status_code != 200:
+                raise await error_from_response(response)
+            data = response.json()
+            items = sorted(data["data"], key=lambda item: item["index"])
+            return [item["embedding"] for item in items], data.get("usage") or {}
+
+        size = self.embedding_batch_size
+        tasks = [asyncio.create_task(embed_batch(texts[i:i + size])) for i in range(0, len(texts), size)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # gather leaves the other batches running; don't spend quota on a failed request
+            for task in tasks:
+                task.cancel()
+            raise
+
+        usage = {"prompt_tokens": 0, "total_tokens": 0}
+        for _, batch_usage in results:
+            for field in usage:
+                usage[field] += batch_usage.get(field, 0)
+        vectors = np.array([vector for batch, _ in results for vector in batch], dtype=np.float32)
+        return vectors, usage
+
+
+def get_azure_openai(request: Request) -> AzureOpenAIClient:
+    """FastAPI dependency returning the Azure OpenAI client"""
+    return request.app.state.azure_openai
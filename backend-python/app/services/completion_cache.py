@@ -0,0 +1,147 @@
+"""Cache of deterministic chat completions.
+
+Only requests with ``temperature == 0`` are cached, since only those are
+expected to produce the same answer twice. Entries are keyed by a hash of
+the normalized (model, messages, temperature, max_tokens) tuple and kept in
+a bounded in-process LRU with a TTL, optionally backed by Redis so workers
+share answers. Concurrent misses for the same key make one upstream call.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import Request
+
+from app.services.lru_cache import LRUCache
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different prompts share an entry"""
+    return " ".join(text.split())
+
+
+class CompletionCache:
+    """Bounded LRU + TTL cache of chat completions with an optional Redis tier"""
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_entries: int = 1024,
+        redis_client: Any = None,
+        key_prefix: str = "completion_cache:",
+    ):
+        self.ttl = ttl
+        self.entries = LRUCache(max_entries)
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.flight = SingleFlight(key_prefix.rstrip(":"))
+        self.counts = {"hit": 0, "miss": 0, "bypass": 0}
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "CompletionCache":
+        """Build a cache from ``<prefix>_TTL``, ``_MAX_ENTRIES`` and ``_REDIS``"""
+        redis_client = None
+        if os.getenv(f"{prefix}_REDIS", "false").lower() in ("1", "true", "yes"):
+            import redis.asyncio as redis
+
+            redis_client = redis.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0,
+            )
+
+        return cls(
+            ttl=float(os.getenv(f"{prefix}_TTL", 3600)),
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 1024)),
+            redis_client=redis_client,
+            key_prefix=f"{prefix.lower()}:",
+        )
+
+    @staticmethod
+    def cacheable(temperature: Optional[float]) -> bool:
+        return temperature == 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+    ) -> str:
+        """Hash of the request; model is the name the client resolved and sends upstream"""
+        normalized = {
+            "model": model,
+            "messages": [[m.get("role", "user"), normalize_text(m.get("content", ""))] for m in messages],
+            "temperature": float(temperature or 0),
+            "max_tokens": max_tokens,
+        }
+        encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    async def get_or_create(
+        self,
+        key: str,
+        create: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Return the cached completion for key, creating and storing it on a miss.
+
+        The returned dict carries ``cached`` to tell hits from fresh completions.
+        """
+        completion = await self.lookup(key)
+        if completion is not None:
+            self.counts["hit"] += 1
+            return {**completion, "cached": True}
+
+        self.counts["miss"] += 1
+
+        async def create_and_store() -> Dict[str, Any]:
+            completion = await create()
+            await self.store(key, completion)
+            return completion
+
+        return {**await self.flight.do(key, create_and_store), "cached": False}
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        completion = self.entries.get(key)
+        if completion is not None or self.redis is None:
+            return completion
+
+        try:
+            raw = await self.redis.get(self.key_prefix + key)
+        except Exception as e:
+            logger.debug(f"Redis completion cache lookup failed: {e}")
+            return None
+        if raw is None:
+            return None
+
+        completion = json.loads(raw)
+        self.entries.set(key, completion, time.time() + self.ttl)
+        return completion
+
+    async def store(self, key: str, completion: Dict[str, Any]):
+        self.entries.set(key, completion, time.time() + self.ttl)
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.set(self.key_prefix + key, json.dumps(completion), ex=int(self.ttl))
+        except Exception as e:
+            logger.debug(f"Redis completion cache store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "results": dict(self.counts)}
+
+    async def aclose(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+def get_completion_cache(request: Request) -> CompletionCache:
+    """FastAPI dependency returning the chat completion cache"""
+    return request.app.state.completion_cache
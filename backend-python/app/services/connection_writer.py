@@ -0,0 +1,167 @@
+"""Per-connection outbound queues for WebSockets.
+
+Each connection gets a writer task draining a bounded queue of pre-encoded
+frames (text, or bytes for binary subprotocols), so sending to a connection
+only appends to its queue and a slow client delays nobody but itself. When a
+queue is full the overflow policy decides what happens: ``drop_oldest``
+discards the oldest queued frame, ``drop_newest`` discards the frame being
+sent, and ``disconnect`` closes the slow consumer.
+
+Replies to the client's own requests (``ai_delta`` tokens, ``ai_response``,
+errors) go through a separate queue that is never dropped from: when it is
+full the sender waits for room, and a client that doesn't drain it within
+the reply timeout is disconnected rather than sent a silently truncated
+reply. Replies are written before queued broadcasts. Every dropped frame
+is counted per writer and reported to ``on_drop``, so a sender whose frames
+build on each other (the stats deltas) can resynchronise the client.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Callable, Dict, Optional, Union
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+# Close code sent to clients disconnected for not keeping up (1013: try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def send_queue_settings() -> tuple:
+    """``(queue size, overflow policy)`` from WS_SEND_QUEUE_SIZE and WS_OVERFLOW_POLICY"""
+    size = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    policy = os.getenv("WS_OVERFLOW_POLICY", DROP_OLDEST).lower()
+    if policy not in OVERFLOW_POLICIES:
+        logger.warning(f"Unknown WS_OVERFLOW_POLICY {policy!r}; using {DROP_OLDEST}")
+        policy = DROP_OLDEST
+    return size, policy
+
+
+class ConnectionWriter:
+    """Bounded outbound queue drained by one writer task"""
+
+    __slots__ = (
+        "websocket", "queue", "replies", "max_size", "policy", "drops", "on_failure",
+        "reply_timeout", "ready", "space", "task", "closed", "dropped", "on_drop",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_size: int,
+        policy: str,
+        drops: Dict[str, int],
+        on_failure: Callable[[WebSocket], None],
+        reply_timeout: float = 10.0,
+    ):
+        self.websocket = websocket
+        self.queue: deque = deque()
+        self.replies: deque = deque()
+        self.max_size = max_size
+        self.policy = policy
+        # Shared drop counters, keyed by policy
+        self.drops = drops
+        self.on_failure = on_failure
+        self.reply_timeout = reply_timeout
+        self.ready = asyncio.Event()
+        # Set whenever a reply has been written, waking senders waiting for room
+        self.space = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+        self.closed = False
+        # Frames this writer discarded, and who to tell when it discards one
+        self.dropped = 0
+        self.on_drop: Optional[Callable[[], None]] = None
+
+    def enqueue(self, frame: Union[str, bytes]) -> bool:
+        """Queue a frame without waiting; False means the connection should be dropped"""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_size:
+            self.drops[self.policy] += 1
+            if self.policy == DISCONNECT:
+                self.close(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop()
+            if self.policy == DROP_NEWEST:
+                return True
+            self.queue.popleft()
+
+        self.queue.append(frame)
+        self.ready.set()
+        return True
+
+    async def send(self, frame: Union[str, bytes]) -> bool:
+        """Queue a reply, waiting while the reply queue is full; False if the connection was dropped"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.reply_timeout
+        while not self.closed and len(self.replies) >= self.max_size:
+            self.space.clear()
+            try:
+                await asyncio.wait_for(self.space.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.drops[DISCONNECT] += 1
+                self.close(SLOW_CONSUMER_CLOSE_CODE)
+        if self.closed:
+            return False
+
+        self.replies.append(frame)
+        self.ready.set()
+        return True
+
+    async def run(self):
+        try:
+            while True:
+                while not self.replies and not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                if self.replies:
+                    frame = self.replies.popleft()
+                    self.space.set()
+                else:
+                    frame = self.queue.popleft()
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The socket is gone; let the manager clean up
+            logger.debug(f"WebSocket send failed: {e}")
+            self.closed = True
+            self.queue.clear()
+            self.replies.clear()
+            self.space.set()
+            self.on_failure(self.websocket)
+
+    def close(self, code: int = None):
+        """Stop writing; with a code, also close the socket (used for slow consumers)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.replies.clear()
+        # Wake senders waiting for room so they see the connection is gone
+        self.space.set()
+        self.task.cancel()
+        if code is not None:
+            asyncio.create_task(self.close_socket(code))
+
+    async def close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.queue) + len(self.replies)
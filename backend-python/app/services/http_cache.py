@@ -0,0 +1,215 @@
+"""Conditional-request (ETag) cache for upstream JSON APIs.
+
+Responses are cached by token fingerprint, path and query parameters along
+with their ETag. Fresh entries are served without any upstream call; stale
+entries are served immediately while a background request revalidates them;
+older entries are revalidated with ``If-None-Match``. A ``304 Not Modified``
+refreshes the entry without a body and, on GitHub, without using quota.
+Concurrent revalidations of the same key are coalesced into one request.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+from fastapi import Request
+
+from app.services.lru_cache import LRUCache
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """A cached JSON payload and the validator needed to revalidate it"""
+
+    __slots__ = ("etag", "payload", "fetched_at")
+
+    def __init__(self, etag: Optional[str], payload: Any, fetched_at: float):
+        self.etag = etag
+        self.payload = payload
+        self.fetched_at = fetched_at
+
+    def to_json(self) -> str:
+        return json.dumps({"etag": self.etag, "payload": self.payload, "fetched_at": self.fetched_at})
+
+    @classmethod
+    def from_json(cls, raw) -> "CachedResponse":
+        data = json.loads(raw)
+        return cls(data["etag"], data["payload"], data["fetched_at"])
+
+
+class ConditionalCache:
+    """Bounded in-memory LRU of ETag-validated responses with an optional Redis tier"""
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        stale_ttl: float = 300.0,
+        max_entries: int = 1024,
+        retention: float = 86400.0,
+        redis_client: Any = None,
+        key_prefix: str = "httpcache:",
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # Entries are kept past their stale window so they can still be revalidated
+        self.retention = max(retention, ttl + stale_ttl)
+        self.entries = LRUCache(max_entries)
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.flight = SingleFlight(key_prefix.rstrip(":"))
+
+        self.revalidations: Dict[str, asyncio.Task] = {}
+        self.counts = {"fresh": 0, "stale": 0, "not_modified": 0, "miss": 0}
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "ConditionalCache":
+        """Build a cache from ``<prefix>_TTL``, ``_STALE_TTL``, ``_MAX_ENTRIES`` and ``_REDIS``"""
+        redis_client = None
+        if os.getenv(f"{prefix}_REDIS", "false").lower() in ("1", "true", "yes"):
+            import redis.asyncio as redis
+
+            redis_client = redis.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0,
+            )
+
+        return cls(
+            ttl=float(os.getenv(f"{prefix}_TTL", 60)),
+            stale_ttl=float(os.getenv(f"{prefix}_STALE_TTL", 300)),
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 1024)),
+            redis_client=redis_client,
+            key_prefix=f"{prefix.lower()}:",
+        )
+
+    @staticmethod
+    def make_key(token: Optional[str], path: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Cache key from a token fingerprint (never the token itself), path and sorted params"""
+        fingerprint = hashlib.sha256((token or "").encode()).hexdigest()[:16]
+        query = urlencode(sorted((params or {}).items()))
+        return f"{fingerprint}:{path}?{query}"
+
+    async def fetch_json(
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        token: Optional[str] = None,
+    ) -> Tuple[int, Any]:
+        """GET path through the cache, returning ``(status_code, payload)``.
+
+        Non-200 upstream answers are passed through uncached with a None payload.
+        """
+        key = self.make_key(token, path, params)
+        now = time.time()
+        entry = await self.lookup(key, now)
+
+        if entry is not None:
+            age = now - entry.fetched_at
+            if age < self.ttl:
+                self.counts["fresh"] += 1
+                return 200, entry.payload
+            if age < self.ttl + self.stale_ttl:
+                self.counts["stale"] += 1
+                self.revalidate_in_background(key, client, path, params, entry)
+                return 200, entry.payload
+
+        return await self.flight.do(key, lambda: self.revalidate(key, client, path, params, entry))
+
+    async def lookup(self, key: str, now: float) -> Optional[CachedResponse]:
+        entry = self.entries.get(key, None, now)
+        if entry is not None or self.redis is None:
+            return entry
+
+        try:
+            raw = await self.redis.get(self.key_prefix + key)
+        except Exception as e:
+            logger.debug(f"Redis cache lookup failed: {e}")
+            return None
+        if raw is None:
+            return None
+
+        entry = CachedResponse.from_json(raw)
+        self.entries.set(key, entry, entry.fetched_at + self.retention)
+        return entry
+
+    async def store(self, key: str, entry: CachedResponse):
+        self.entries.set(key, entry, entry.fetched_at + self.retention)
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.set(self.key_prefix + key, entry.to_json(), ex=int(self.retention))
+        except Exception as e:
+            logger.debug(f"Redis cache store failed: {e}")
+
+    async def revalidate(
+        self,
+        key: str,
+        client: httpx.AsyncClient,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        entry: Optional[CachedResponse],
+    ) -> Tuple[int, Any]:
+        """Fetch from upstream, conditionally when an ETag is known"""
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        response = await client.get(path, params=params, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            self.counts["not_modified"] += 1
+            entry = CachedResponse(entry.etag, entry.payload, time.time())
+            await self.store(key, entry)
+            return 200, entry.payload
+
+        if response.status_code != 200:
+            return response.status_code, None
+
+        self.counts["miss"] += 1
+        entry = CachedResponse(response.headers.get("ETag"), response.json(), time.time())
+        await self.store(key, entry)
+        return 200, entry.payload
+
+    def revalidate_in_background(
+        self,
+        key: str,
+        client: httpx.AsyncClient,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        entry: CachedResponse,
+    ):
+        """Start at most one background revalidation per key"""
+        if key in self.revalidations:
+            return
+
+        async def run():
+            try:
+                await self.flight.do(key, lambda: self.revalidate(key, client, path, params, entry))
+            except Exception as e:
+                logger.warning(f"Background revalidation of {path} failed: {e}")
+            finally:
+                self.revalidations.pop(key, None)
+
+        self.revalidations[key] = asyncio.create_task(run())
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "results": dict(self.counts)}
+
+    async def aclose(self):
+        """Cancel pending revalidations and close the Redis tier"""
+        for task in list(self.revalidations.values()):
+            task.cancel()
+        self.revalidations.clear()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+def get_github_cache(request: Request) -> ConditionalCache:
+    """FastAPI dependency returning the GitHub response cache"""
+    return request.app.state.github_cache
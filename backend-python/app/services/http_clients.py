@@ -0,0 +1,110 @@
+"""Application-scoped pooled HTTP clients for outbound integrations.
+
+One ``httpx.AsyncClient`` per upstream is created in the FastAPI lifespan and
+shared by every request, so DNS, TCP and TLS setup are paid once per pooled
+connection instead of once per call. Auth headers are built at startup.
+"""
+import importlib.util
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "ai-foundry-monorepo/1.0.0"
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 is used unless disabled, provided the h2 package is installed"""
+    setting = os.getenv("HTTP2_ENABLED")
+    if setting is not None and setting.lower() not in ("1", "true", "yes"):
+        return False
+    if importlib.util.find_spec("h2") is None:
+        if setting is not None:
+            logger.warning("HTTP2_ENABLED is set but the h2 package is missing; using HTTP/1.1")
+        return False
+    return True
+
+
+class UpstreamClients:
+    """Registry of pooled upstream clients, created once per application"""
+
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20),
+            keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+        )
+        self.timeout = httpx.Timeout(
+            _env_float("HTTP_TIMEOUT", 10.0),
+            connect=_env_float("HTTP_CONNECT_TIMEOUT", 5.0),
+        )
+        self.http2 = http2_enabled()
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+        # GitHub
+        self.github_token = os.getenv("GITHUB_TOKEN")
+        github_headers = {
+            "Accept": "application/vnd.github.v3+json",
+            "User-Agent": USER_AGENT,
+        }
+        if self.github_token:
+            github_headers["Authorization"] = f"Bearer {self.github_token}"
+        self.github = self.register(
+            "github", os.getenv("GITHUB_API_URL", "https://api.github.com"), github_headers
+        )
+
+        # Azure OpenAI
+        self.azure_openai_key = os.getenv("AZURE_OPENAI_API_KEY")
+        self.azure_openai_endpoint = os.getenv("AZURE_AI_FOUNDRY_ENDPOINT")
+        azure_headers = {"User-Agent": USER_AGENT}
+        if self.azure_openai_key:
+            azure_headers["api-key"] = self.azure_openai_key
+        self.azure_openai = self.register(
+            "azure_openai", self.azure_openai_endpoint or "https://localhost", azure_headers
+        )
+
+    @property
+    def github_configured(self) -> bool:
+        return bool(self.github_token)
+
+    @property
+    def azure_openai_configured(self) -> bool:
+        return bool(self.azure_openai_key and self.azure_openai_endpoint)
+
+    def register(self, name: str, base_url: str, headers: Dict[str, str]) -> httpx.AsyncClient:
+        """Create a pooled client for an upstream and keep it for shutdown"""
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=self.http2,
+        )
+        self.clients[name] = client
+        return client
+
+    def get(self, name: str) -> Optional[httpx.AsyncClient]:
+        return self.clients.get(name)
+
+    async def aclose(self):
+        """Close every pooled connection (called on application shutdown)"""
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+
+def get_upstream_clients(request: Request) -> UpstreamClients:
+    """FastAPI dependency returning the application's upstream clients"""
+    return request.app.state.http_clients
@@ -0,0 +1,36 @@
+"""Fast JSON encoding shared by HTTP responses and WebSocket frames.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both produce compact JSON; values orjson can't serialize
+natively are converted with ``str`` as the stdlib fallback does.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encode obj as compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def dumps(obj: Any) -> str:
+    """Encode obj as a compact JSON string (for WebSocket text frames)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def loads(data) -> Any:
+    """Decode JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,144 @@
+"""Event-loop lag monitor and slow-callback detector.
+
+A task on the loop sleeps ``LOOP_MONITOR_INTERVAL_MS`` and records how late
+it wakes up; that overshoot is the time other callbacks held the loop. A
+watchdog thread checks the task's heartbeat, and when the loop has not
+come back for ``LOOP_SLOW_CALLBACK_MS`` it grabs the loop thread's Python
+stack and the running task, so a blocking call (a synchronous psutil or
+file read, a long ``print``) shows up with the code that made it. Unlike
+asyncio debug mode this costs one short wake-up per interval on each side.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+
+def describe_task(task: Optional[asyncio.Task]) -> Optional[Dict[str, str]]:
+    if task is None:
+        return None
+    coro = task.get_coro()
+    return {
+        "name": task.get_name(),
+        "coroutine": getattr(coro, "__qualname__", repr(coro)),
+    }
+
+
+def format_stack(frame, limit: int = 30) -> List[str]:
+    """Innermost-last ``file:line in function`` entries"""
+    return [
+        f"{entry.filename}:{entry.lineno} in {entry.name}"
+        for entry in traceback.extract_stack(frame, limit=limit)
+    ]
+
+
+class LoopMonitor:
+    """Loop lag measurements plus stacks of callbacks that blocked the loop"""
+
+    def __init__(self, interval: float = 0.1, slow_threshold: float = 0.1, keep: int = 50):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.peak = 0.0
+        self.slow_callbacks: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self.slow_count = 0
+
+        self.heartbeat = time.perf_counter()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        return cls(
+            interval=int(os.getenv("LOOP_MONITOR_INTERVAL_MS", 100)) / 1000,
+            slow_threshold=int(os.getenv("LOOP_SLOW_CALLBACK_MS", 100)) / 1000,
+        )
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.perf_counter()
+        self.task = asyncio.create_task(self.run())
+        if self.slow_threshold > 0:
+            self.watchdog = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+            self.watchdog.start()
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.heartbeat = now
+            lag = max(0.0, now - start - self.interval)
+            self.lag = lag
+            if lag > self.peak:
+                self.peak = lag
+                if lag > self.max_lag:
+                    self.max_lag = lag
+
+    def take_peak(self) -> float:
+        """Largest lag since the previous call, in seconds"""
+        peak, self.peak = self.peak, 0.0
+        return peak
+
+    def watch(self):
+        """Watchdog thread: capture the loop's stack while it is blocked"""
+        current: Optional[Dict[str, Any]] = None
+        captured_for = None
+        while not self.stopping.wait(self.slow_threshold / 2):
+            heartbeat = self.heartbeat
+            blocked = time.perf_counter() - heartbeat - self.interval
+            if blocked < self.slow_threshold:
+                current = None
+                continue
+            if current is not None and captured_for == heartbeat:
+                # Still the same stall; just extend it
+                current["blocked_ms"] = round(blocked * 1000, 1)
+                continue
+
+            frame = sys._current_frames().get(self.loop_thread)
+            current = {
+                "blocked_ms": round(blocked * 1000, 1),
+                "task": describe_task(asyncio.current_task(self.loop)),
+                "stack": format_stack(frame) if frame is not None else [],
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+            captured_for = heartbeat
+            self.slow_callbacks.append(current)
+            self.slow_count += 1
+            where = current["stack"][-1] if current["stack"] else "unknown"
+            logger.warning(f"Event loop blocked for over {self.slow_threshold * 1000:.0f} ms at {where}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "interval_ms": self.interval * 1000,
+            "slow_threshold_ms": self.slow_threshold * 1000,
+            "lag_ms": round(self.lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "slow_callbacks_total": self.slow_count,
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+    async def aclose(self):
+        self.stopping.set()
+        if self.task is not None:
+            self.task.cancel()
+
+
+def get_loop_monitor(request: Request) -> LoopMonitor:
+    """FastAPI dependency returning the event-loop monitor"""
+    return request.app.state.loop_monitor
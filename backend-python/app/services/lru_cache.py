@@ -0,0 +1,164 @@
+"""Capacity-bounded LRU map with per-entry expiry.
+
+Lookups are O(1) and writes O(log n). Expired entries are removed lazily on
+access and incrementally in expiry order via ``expire(now, limit)``, using a
+heap of expiry times next to the LRU order, so keys that expired behind a
+long-lived one are still reclaimed and there is never a stop-the-world
+sweep over all keys.
+"""
+import heapq
+import itertools
+import math
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# Expired entries removed per incremental expiry step
+EXPIRE_BATCH = 4
+
+# Stale heap records (from updated, evicted or deleted keys) tolerated per live entry
+HEAP_SLACK = 2
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Least-recently-used map bounded by ``capacity`` with optional expiry times"""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        # key -> [value, expires_at]; order is least to most recently used
+        self.entries: "OrderedDict[Hashable, List[Any]]" = OrderedDict()
+        # (expires_at, sequence, key) for finite expiries; records whose
+        # expiry no longer matches the entry are stale and skipped
+        self.expiry_heap: List[Tuple[float, int, Hashable]] = []
+        self.sequence = itertools.count()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None, now: Optional[float] = None) -> Any:
+        """Return the value for key and mark it as recently used"""
+        entry = self.entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        if now is None:
+            now = time.time()
+        if entry[1] <= now:
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, expires_at: float = math.inf):
+        """Insert or update key, evicting the least recently used entry if full"""
+        entry = self.entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            entry[0] = value
+            self.entries.move_to_end(key)
+            if entry[1] == expires_at:
+                return
+            entry[1] = expires_at
+        else:
+            self.entries[key] = [value, expires_at]
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        if expires_at != math.inf:
+            heapq.heappush(self.expiry_heap, (expires_at, next(self.sequence), key))
+            if len(self.expiry_heap) > HEAP_SLACK * len(self.entries) + 64:
+                self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        """Drop stale heap records; amortized O(1) per write"""
+        self.expiry_heap = [
+            (entry[1], next(self.sequence), key)
+            for key, entry in self.entries.items()
+            if entry[1] != math.inf
+        ]
+        heapq.heapify(self.expiry_heap)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def expire(self, now: Optional[float] = None, limit: Optional[int] = EXPIRE_BATCH) -> int:
+        """Drop expired entries, soonest expiry first.
+
+        Stops once nothing left has expired or after ``limit`` removals (no
+        limit when None). Called a few entries at a time on every write,
+        this keeps up with expiry without ever scanning the whole map.
+        """
+        if now is None:
+            now = time.time()
+
+        entries = self.entries
+        heap = self.expiry_heap
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expires_at, _, key = heapq.heappop(heap)
+            entry = entries.get(key)
+            if entry is None or entry[1] != expires_at:
+                # Stale record: the key was updated, evicted or deleted
+                continue
+            del entries[key]
+            removed += 1
+            if removed == limit:
+                break
+
+        if removed:
+            self.expirations += removed
+        return removed
+
+    def clear(self):
+        self.entries.clear()
+        self.expiry_heap.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def memory_bytes(self, sample_size: int = 64) -> int:
+        """Approximate memory held by the map, extrapolated from a sample of entries"""
+        size = sys.getsizeof(self.entries) + sys.getsizeof(self.expiry_heap)
+        if self.expiry_heap:
+            size += sys.getsizeof(self.expiry_heap[0]) * len(self.expiry_heap)
+        if not self.entries:
+            return size
+
+        sample = 0
+        for count, (key, entry) in enumerate(self.entries.items(), 1):
+            sample += sys.getsizeof(key) + sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            if count == sample_size:
+                break
+
+        return size + sample * len(self.entries) // count
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, hit/miss and eviction statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "memory_bytes": self.memory_bytes(),
+        }
@@ -0,0 +1,135 @@
+"""In-process metrics with Prometheus text exposition.
+
+Recording happens on the event loop thread only, so plain integer and float
+updates are safe without locks. Histograms have fixed buckets whose storage
+is allocated once per (route, status class) pair; recording a request is a
+couple of dict lookups, a bisect and two additions.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STATUS_CLASSES = ("1xx", "1xx", "2xx", "3xx", "4xx", "5xx")
+
+# Label used for requests that never matched a route (404s, rate limited)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts are per bucket and made cumulative on render"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        # The extra slot is the +Inf bucket
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Metrics:
+    """Application metrics registry"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+
+        # route template -> status class -> latency histogram
+        self.http_latency: Dict[str, Dict[str, Histogram]] = {}
+        self.http_in_flight = 0
+        self.rate_limit_rejections = 0
+
+        # name -> (help, kind, label, callback); evaluated at scrape time
+        self.callbacks: Dict[str, Tuple[str, str, Optional[str], Callable]] = {}
+
+    def observe_request(self, route: str, status: int, duration: float):
+        """Record the latency of a finished HTTP request"""
+        by_status = self.http_latency.get(route)
+        if by_status is None:
+            by_status = self.http_latency[route] = {}
+
+        status_class = STATUS_CLASSES[status // 100] if 100 <= status < 600 else "5xx"
+        histogram = by_status.get(status_class)
+        if histogram is None:
+            histogram = by_status[status_class] = Histogram(self.buckets)
+
+        histogram.observe(duration)
+
+    def register_callback(
+        self,
+        name: str,
+        help_text: str,
+        callback: Callable,
+        kind: str = "gauge",
+        label: Optional[str] = None,
+    ):
+        """Expose a value computed at scrape time.
+
+        The callback returns a number, or a ``{label_value: number}`` dict when
+        ``label`` is given.
+        """
+        self.callbacks[name] = (help_text, kind, label, callback)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+
+        name = "http_request_duration_seconds"
+        lines.append(f"# HELP {name} HTTP request latency by route template and status class")
+        lines.append(f"# TYPE {name} histogram")
+        for route, by_status in list(self.http_latency.items()):
+            for status_class, histogram in list(by_status.items()):
+                labels = f'route="{escape_label(route)}",status="{status_class}"'
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        lines.append("# HELP http_requests_in_flight HTTP requests currently being served")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {self.http_in_flight}")
+
+        lines.append("# HELP rate_limit_rejections_total Requests rejected by the rate limiter")
+        lines.append("# TYPE rate_limit_rejections_total counter")
+        lines.append(f"rate_limit_rejections_total {self.rate_limit_rejections}")
+
+        for name, (help_text, kind, label, callback) in list(self.callbacks.items()):
+            try:
+                value = callback()
+            except Exception:
+                # A broken collector must not take the whole scrape down
+                continue
+
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if label is None:
+                lines.append(f"{name} {format_value(value)}")
+            else:
+                for label_value, sample in value.items():
+                    lines.append(f'{name}{{{label}="{escape_label(label_value)}"}} {format_value(sample)}')
+
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by the middleware and routers
+metrics = Metrics()
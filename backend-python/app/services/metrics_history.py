@@ -0,0 +1,293 @@
+"""Rolling, fixed-memory history of sampled metrics at several resolutions.
+
+Every second the recorder samples a handful of gauges (CPU, memory,
+event-loop lag, request rate, p99 latency, WebSocket connections) into one
+ring buffer per tier, e.g. 1 s slots for 10 minutes, 10 s for 6 hours and
+1 min for 7 days (``METRICS_HISTORY_TIERS``). Each slot keeps the sum,
+count, min and max of the samples that fell into it, as numpy arrays
+allocated once, so memory never grows. Queries pick the finest tier that
+still covers the requested range and downsample it to the requested step
+with ``reduceat``.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import Request
+
+from app.services.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS = "1s:10m,10s:6h,1m:7d"
+
+AGGREGATES = ("avg", "min", "max")
+
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value: str) -> float:
+    """``"10s"``, ``"6h"`` or a plain number of seconds"""
+    value = value.strip()
+    if value and value[-1] in UNITS:
+        return float(value[:-1]) * UNITS[value[-1]]
+    return float(value)
+
+
+def parse_tiers(spec: str) -> List[Tuple[float, int]]:
+    """``"1s:10m,10s:6h"`` -> [(step, slots)], finest first"""
+    tiers = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        step, retention = part.split(":")
+        step, retention = parse_duration(step), parse_duration(retention)
+        tiers.append((step, max(1, int(retention // step))))
+    return sorted(tiers)
+
+
+class Tier:
+    """Ring buffer of per-slot aggregates for one resolution"""
+
+    def __init__(self, step: float, slots: int, columns: int):
+        self.step = step
+        self.slots = slots
+        # Absolute slot number (time // step) held at each position; -1 is empty
+        self.slot_ids = np.full(slots, -1, dtype=np.int64)
+        self.sum = np.zeros((slots, columns))
+        self.count = np.zeros((slots, columns), dtype=np.int64)
+        self.min = np.full((slots, columns), np.inf)
+        self.max = np.full((slots, columns), -np.inf)
+        self.latest = -1
+
+    def oldest(self) -> float:
+        """Start time of the oldest slot this tier can still hold"""
+        return (self.latest - self.slots + 1) * self.step
+
+    def add(self, timestamp: float, values: np.ndarray, summable: np.ndarray, present: np.ndarray):
+        slot = int(timestamp // self.step)
+        position = slot % self.slots
+        if self.slot_ids[position] != slot:
+            self.slot_ids[position] = slot
+            self.sum[position] = 0.0
+            self.count[position] = 0
+            self.min[position] = np.inf
+            self.max[position] = -np.inf
+        self.sum[position] += summable
+        self.count[position] += present
+        # fmin/fmax ignore NaN (missing samples)
+        np.fmin(self.min[position], values, out=self.min[position])
+        np.fmax(self.max[position], values, out=self.max[position])
+        self.latest = max(self.latest, slot)
+
+    def downsample(self, start: float, end: float, step: float, agg: str) -> np.ndarray:
+        """(buckets, columns) array of ``agg`` over [start, end) in ``step`` buckets, NaN where empty"""
+        buckets = int(math.ceil((end - start) / step))
+        result = np.full((buckets, self.sum.shape[1]), np.nan)
+
+        slot_start = self.slot_ids * self.step
+        positions = np.nonzero((self.slot_ids >= 0) & (slot_start >= start) & (slot_start < end))[0]
+        if not len(positions):
+            return result
+        positions = positions[np.argsort(self.slot_ids[positions], kind="stable")]
+        bucket_of = ((slot_start[positions] - start) // step).astype(np.int64)
+        # Positions are in time order, so each bucket is one contiguous run
+        present, first = np.unique(bucket_of, return_index=True)
+
+        count = np.add.reduceat(self.count[positions], first, axis=0)
+        if agg == "avg":
+            values = np.add.reduceat(self.sum[positions], first, axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = values / count
+        elif agg == "min":
+            values = np.fmin.reduceat(self.min[positions], first, axis=0)
+        else:
+            values = np.fmax.reduceat(self.max[positions], first, axis=0)
+        values[count == 0] = np.nan
+        result[present] = values
+        return result
+
+
+class MetricsHistory:
+    """Multi-resolution history of a fixed set of columns"""
+
+    def __init__(self, columns: Sequence[str], tiers: Sequence[Tuple[float, int]], max_points: int = 2000):
+        self.columns = list(columns)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+        self.tiers = [Tier(step, slots, len(self.columns)) for step, slots in sorted(tiers)]
+        self.max_points = max_points
+
+    def record(self, timestamp: float, values: Dict[str, float]):
+        """Add one sample; columns missing from ``values``, None or non-finite are recorded as absent"""
+        row = np.full(len(self.columns), np.nan)
+        for name, value in values.items():
+            if value is not None:
+                row[self.index[name]] = value
+        # Non-finite readings count as absent; an inf would poison every aggregate over its slot
+        present = np.isfinite(row)
+        row[~present] = np.nan
+        # Absent values add 0 to the sum and NaN to min/max, where fmin/fmax skip them
+        summable = np.where(present, row, 0.0)
+        for tier in self.tiers:
+            tier.add(timestamp, row, summable, present)
+
+    def memory_usage(self) -> int:
+        return sum(
+            tier.slot_ids.nbytes + tier.sum.nbytes + tier.count.nbytes + tier.min.nbytes + tier.max.nbytes
+            for tier in self.tiers
+        )
+
+    def pick_tier(self, start: float, step: float) -> Tier:
+        """Finest tier no coarser than ``step`` that reaches back to ``start``"""
+        covering = [tier for tier in self.tiers if tier.oldest() <= start] or [self.tiers[-1]]
+        for tier in covering:
+            if tier.step <= step:
+                return tier
+        return covering[0]
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        step: Optional[float] = None,
+        columns: Optional[Sequence[str]] = None,
+        agg: str = "avg",
+    ) -> Dict:
+        if not all(math.isfinite(value) for value in (start, end, step or 0.0)):
+            raise ValueError("start, end and step must be finite")
+        if end <= start:
+            raise ValueError("end must be after start")
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+        columns = list(columns) if columns else self.columns
+        unknown = [name for name in columns if name not in self.index]
+        if unknown:
+            raise ValueError(f"unknown metrics: {', '.join(unknown)}")
+
+        if not step:
+            # As fine as the range allows within max_points
+            step = (end - start) / (self.max_points - 1)
+            if not math.isfinite(step):
+                raise ValueError("range is too large")
+        tier = self.pick_tier(start, step)
+        # Steps are whole multiples of the tier's resolution, buckets aligned to the step
+        step = math.ceil(step / tier.step) * tier.step
+        start = math.floor(start / step) * step
+        if (end - start) / step > self.max_points:
+            raise ValueError(f"range/step gives more than {self.max_points} points; use a larger step")
+
+        values = tier.downsample(start, end, step, agg)
+        timestamps = start + step * np.arange(values.shape[0])
+        series = {}
+        for name in columns:
+            column = values[:, self.index[name]]
+            series[name] = [None if math.isnan(v) else round(v, 4) for v in column.tolist()]
+        return {
+            "start": start,
+            "end": end,
+            "step": step,
+            "resolution": tier.step,
+            "agg": agg,
+            "timestamps": timestamps.tolist(),
+            "series": series,
+        }
+
+    @classmethod
+    def from_env(cls, columns: Sequence[str]) -> "MetricsHistory":
+        return cls(
+            columns,
+            parse_tiers(os.getenv("METRICS_HISTORY_TIERS", DEFAULT_TIERS)),
+            max_points=int(os.getenv("METRICS_HISTORY_MAX_POINTS", 2000)),
+        )
+
+
+def histogram_quantile(quantile: float, bounds: Sequence[float], counts: np.ndarray) -> float:
+    """Quantile of per-bucket counts, interpolated within the bucket like PromQL"""
+    total = counts.sum()
+    if total <= 0:
+        return math.nan
+    cumulative = np.cumsum(counts)
+    bucket = int(np.searchsorted(cumulative, quantile * total))
+    if bucket >= len(bounds):
+        # In the +Inf bucket: the largest finite bound is all we know
+        return bounds[-1]
+    lower = bounds[bucket - 1] if bucket else 0.0
+    below = cumulative[bucket - 1] if bucket else 0
+    return lower + (bounds[bucket] - lower) * (quantile * total - below) / counts[bucket]
+
+
+class HistoryRecorder:
+    """Samples the built-in and registered gauges into a MetricsHistory every interval.
+
+    A source named like a built-in column replaces the built-in measurement.
+    """
+
+    BUILTIN = ("loop_lag_ms", "request_rate", "latency_p99_ms")
+
+    def __init__(self, registry: Metrics, sources: Dict[str, Callable[[], Optional[float]]], interval: float = 1.0):
+        self.registry = registry
+        self.sources = sources
+        self.interval = interval
+        self.history = MetricsHistory.from_env(list(self.BUILTIN) + [name for name in sources if name not in self.BUILTIN])
+        self.task: Optional[asyncio.Task] = None
+        self.last_counts: Optional[np.ndarray] = None
+        self.errors = 0
+
+    def latency_counts(self) -> np.ndarray:
+        """Latency bucket counts summed over every route and status"""
+        histograms = [
+            histogram.counts
+            for by_status in list(self.registry.http_latency.values())
+            for histogram in list(by_status.values())
+        ]
+        if not histograms:
+            return np.zeros(len(self.registry.buckets) + 1, dtype=np.int64)
+        return np.sum(histograms, axis=0)
+
+    def sample(self, lag: float, elapsed: float) -> Dict[str, Optional[float]]:
+        counts = self.latency_counts()
+        interval_counts = counts - self.last_counts if self.last_counts is not None else None
+        self.last_counts = counts
+
+        values: Dict[str, Optional[float]] = {"loop_lag_ms": lag * 1000}
+        if interval_counts is not None:
+            values["request_rate"] = interval_counts.sum() / elapsed
+            p99 = histogram_quantile(0.99, self.registry.buckets, interval_counts)
+            values["latency_p99_ms"] = None if math.isnan(p99) else p99 * 1000
+        for name, source in self.sources.items():
+            try:
+                values[name] = source()
+            except Exception as e:
+                self.errors += 1
+                logger.debug(f"Metrics history source {name} failed: {e}")
+        return values
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            elapsed = now - last
+            last = now
+            try:
+                # How much later than asked the loop woke us up
+                self.history.record(time.time(), self.sample(max(0.0, elapsed - self.interval), elapsed))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Metrics history sample failed: {e}")
+
+    async def aclose(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+def get_metrics_history(request: Request) -> MetricsHistory:
+    """FastAPI dependency returning the metrics history"""
+    return request.app.state.metrics_history.history
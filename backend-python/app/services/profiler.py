@@ -0,0 +1,110 @@
+"""On-demand in-process sampling profiler.
+
+A worker thread snapshots every thread's Python stack with
+``sys._current_frames()`` at ``hz`` samples per second and counts identical
+stacks. The result is in the collapsed format (``root;caller;callee count``
+per line) that flamegraph.pl, speedscope and inferno read directly.
+Nothing runs, and nothing is hooked into the interpreter, between profiles.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+class SamplingProfiler:
+    """Samples thread stacks for a fixed duration, one profile at a time"""
+
+    def __init__(self, max_seconds: float = 60, max_hz: int = 1000):
+        self.max_seconds = max_seconds
+        self.max_hz = max_hz
+        self.running = False
+        self.profiles = 0
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        return cls(max_seconds=float(os.getenv("PROFILER_MAX_SECONDS", 60)))
+
+    def collect(
+        self, seconds: float, hz: int, loop_thread: Optional[int] = None, stop: Optional[threading.Event] = None
+    ) -> Tuple[Counter, int]:
+        """Blocking: sample stacks until the deadline or stop; returns (stack counts, samples)"""
+        own = threading.get_ident()
+        interval = 1 / hz
+        labels: Dict[object, str] = {}
+        stacks: Counter = Counter()
+        samples = 0
+
+        next_sample = time.perf_counter()
+        deadline = next_sample + seconds
+        while next_sample < deadline and not (stop is not None and stop.is_set()):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (loop_thread is not None and thread_id != loop_thread):
+                    continue
+                path = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        module = frame.f_globals.get("__name__", "?")
+                        name = getattr(code, "co_qualname", code.co_name)
+                        label = labels[code] = f"{module}:{name}".replace(";", ",").replace(" ", "_")
+                    path.append(label)
+                    frame = frame.f_back
+                path.append(names.get(thread_id, str(thread_id)).replace(";", ",").replace(" ", "_"))
+                stacks[";".join(reversed(path))] += 1
+            samples += 1
+
+            next_sample += interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                if stop is not None:
+                    stop.wait(delay)
+                else:
+                    time.sleep(delay)
+            else:
+                # Fell behind (GIL contention); skip missed samples instead of bursting
+                next_sample = time.perf_counter()
+        return stacks, samples
+
+    def run(self, seconds: float, hz: int, loop_thread: Optional[int], stop: threading.Event) -> Tuple[Counter, int]:
+        """collect in the sampling thread, marking the profiler idle only once it returns"""
+        try:
+            return self.collect(seconds, hz, loop_thread, stop)
+        finally:
+            self.running = False
+
+    async def profile(self, seconds: float, hz: int = 100, loop_only: bool = False) -> Tuple[str, int]:
+        """Collapsed stacks of a ``seconds`` long profile, and the sample count"""
+        if self.running:
+            raise ProfilerBusy("a profile is already running")
+        seconds = min(seconds, self.max_seconds)
+        hz = max(1, min(hz, self.max_hz))
+        loop_thread = threading.get_ident() if loop_only else None
+
+        self.running = True
+        stop = threading.Event()
+        try:
+            stacks, samples = await asyncio.to_thread(self.run, seconds, hz, loop_thread, stop)
+        except asyncio.CancelledError:
+            # The sampling thread outlives the request; it clears running when it exits
+            stop.set()
+            raise
+        self.profiles += 1
+        collapsed = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return collapsed, samples
+
+
+def get_profiler(request: Request) -> SamplingProfiler:
+    """FastAPI dependency returning the sampling profiler"""
+    return request.app.state.profiler
@@ -0,0 +1,289 @@
+"""Pub/sub backplane carrying WebSocket broadcasts between workers.
+
+A broadcast is delivered to the local worker's connections directly and
+published on a channel (``broadcast`` for everyone, ``room:<name>`` for a
+room) so every other worker delivers it to its own connections. Each worker
+subscribes only to the rooms it has members in. Frames published within
+``batch_interval`` are sent as one message per channel, tagged with the
+publishing worker's id so it can skip its own messages.
+
+``RedisBackplane`` works across workers and replicas; ``InMemoryBackplane``
+connects backplanes in one process for tests and benchmarks. Failed
+subscription changes are retried with exponential backoff, and when the
+Redis connection drops every wanted channel is subscribed again.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from app.services import json_codec
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHANNEL = "broadcast"
+
+# Backoff between failed subscription attempts, doubling up to the maximum
+RETRY_MIN_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+
+def room_channel(room: str) -> str:
+    return f"room:{room}"
+
+
+class Backplane:
+    """Batching, subscription bookkeeping and self-filtering shared by all backplanes"""
+
+    def __init__(self, worker_id: Optional[str] = None, batch_interval: float = 0.005, channel_prefix: str = "ws:"):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.batch_interval = batch_interval
+        self.channel_prefix = channel_prefix
+        self.handler: Optional[Callable[[str, str], None]] = None
+
+        # channel -> encoded frames waiting for the next flush
+        self.pending: Dict[str, List[str]] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+
+        # Channels we should be subscribed to, and the ones we are
+        self.wanted: Set[str] = set()
+        self.subscribed: Set[str] = set()
+        self.sync_task: Optional[asyncio.Task] = None
+        self.retry_min_delay = RETRY_MIN_DELAY
+        self.retry_max_delay = RETRY_MAX_DELAY
+
+        # Frames by direction, batches sent on the wire, and received messages or frames that failed
+        self.counts = {"published": 0, "received": 0}
+        self.batches = 0
+        self.errors = {"malformed": 0, "handler": 0}
+
+    async def start(self, handler: Callable[[str, str], None]):
+        """Deliver frames published by other workers to handler(channel, frame)"""
+        self.handler = handler
+        self.wanted.add(BROADCAST_CHANNEL)
+        try:
+            await self.apply_subscriptions()
+        except Exception as e:
+            # Don't hold up startup; keep trying in the background
+            logger.warning(f"Backplane subscribe failed, retrying: {e}")
+            self.schedule_sync()
+
+    def publish(self, channel: str, frame: str):
+        """Queue an encoded frame for the next batch on channel"""
+        self.pending.setdefault(channel, []).append(frame)
+        self.counts["published"] += 1
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.batch_interval)
+        pending, self.pending = self.pending, {}
+        self.flush_task = None
+
+        batches = {
+            self.channel_prefix + channel: json_codec.dumps_bytes({"w": self.worker_id, "f": frames})
+            for channel, frames in pending.items()
+        }
+        try:
+            await self.send_batches(batches)
+            self.batches += len(batches)
+        except Exception as e:
+            logger.warning(f"Backplane publish failed, {sum(map(len, pending.values()))} frames dropped: {e}")
+
+    def subscribe(self, channel: str):
+        self.wanted.add(channel)
+        self.schedule_sync()
+
+    def unsubscribe(self, channel: str):
+        self.wanted.discard(channel)
+        self.schedule_sync()
+
+    def schedule_sync(self):
+        if self.handler is not None and (self.sync_task is None or self.sync_task.done()):
+            self.sync_task = asyncio.create_task(self.sync_subscriptions())
+
+    async def apply_subscriptions(self):
+        """Apply subscription changes until the wanted and subscribed sets agree"""
+        while self.wanted != self.subscribed:
+            add = self.wanted - self.subscribed
+            remove = self.subscribed - self.wanted
+            if add:
+                await self.backend_subscribe(self.channel_prefix + channel for channel in add)
+                self.subscribed |= add
+            if remove:
+                await self.backend_unsubscribe(self.channel_prefix + channel for channel in remove)
+                self.subscribed -= remove
+
+    async def sync_subscriptions(self):
+        """apply_subscriptions, retried with exponential backoff until it succeeds"""
+        delay = self.retry_min_delay
+        while True:
+            try:
+                await self.apply_subscriptions()
+                return
+            except Exception as e:
+                logger.warning(f"Backplane subscription update failed, retrying in {delay:g}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max_delay)
+
+    def receive(self, channel: str, payload: bytes):
+        """Hand the frames of a batch published by another worker to the handler.
+
+        A malformed batch or a failing handler is logged and counted, never raised,
+        so it can't be mistaken for a broken connection.
+        """
+        if not channel.startswith(self.channel_prefix):
+            return
+        channel = channel[len(self.channel_prefix):]
+        try:
+            batch = json_codec.loads(payload)
+            worker_id, frames = batch["w"], batch["f"]
+        except Exception as e:
+            self.errors["malformed"] += 1
+            logger.warning(f"Backplane dropped a malformed message on {channel}: {e!r}")
+            return
+        if worker_id == self.worker_id or self.handler is None:
+            return
+
+        for frame in frames:
+            self.counts["received"] += 1
+            try:
+                self.handler(channel, frame)
+            except Exception:
+                self.errors["handler"] += 1
+                logger.exception(f"Backplane delivery failed on {channel}")
+
+    async def send_batches(self, batches: Dict[str, bytes]):
+        raise NotImplementedError
+
+    async def backend_subscribe(self, channels: Iterable[str]):
+        raise NotImplementedError
+
+    async def backend_unsubscribe(self, channels: Iterable[str]):
+        raise NotImplementedError
+
+    async def aclose(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        if self.sync_task is not None:
+            self.sync_task.cancel()
+
+
+class InMemoryHub:
+    """Connects in-process backplanes as if they were separate workers"""
+
+    def __init__(self):
+        self.backplanes: Set["InMemoryBackplane"] = set()
+
+    def deliver(self, channel: str, payload: bytes):
+        for backplane in list(self.backplanes):
+            if channel in backplane.wire_channels:
+                backplane.receive(channel, payload)
+
+
+class InMemoryBackplane(Backplane):
+    """Backplane over an InMemoryHub (tests, benchmarks, single-process runs)"""
+
+    def __init__(self, hub: InMemoryHub, **kwargs):
+        super().__init__(**kwargs)
+        self.hub = hub
+        self.wire_channels: Set[str] = set()
+
+    async def start(self, handler: Callable[[str, str], None]):
+        self.hub.backplanes.add(self)
+        await super().start(handler)
+
+    async def send_batches(self, batches: Dict[str, bytes]):
+        for channel, payload in batches.items():
+            self.hub.deliver(channel, payload)
+
+    async def backend_subscribe(self, channels: Iterable[str]):
+        self.wire_channels.update(channels)
+
+    async def backend_unsubscribe(self, channels: Iterable[str]):
+        self.wire_channels.difference_update(channels)
+
+    async def aclose(self):
+        await super().aclose()
+        self.hub.backplanes.discard(self)
+
+
+class RedisBackplane(Backplane):
+    """Backplane over Redis PUBLISH/SUBSCRIBE, shared by every worker and replica"""
+
+    def __init__(self, redis_client, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis_client
+        self.pubsub = redis_client.pubsub()
+        self.reader: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Callable[[str, str], None]):
+        await super().start(handler)
+        self.reader = asyncio.create_task(self.read())
+
+    async def send_batches(self, batches: Dict[str, bytes]):
+        # One round trip for every channel in the batch
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for channel, payload in batches.items():
+                pipe.publish(channel, payload)
+            await pipe.execute()
+
+    async def backend_subscribe(self, channels: Iterable[str]):
+        await self.pubsub.subscribe(*channels)
+
+    async def backend_unsubscribe(self, channels: Iterable[str]):
+        await self.pubsub.unsubscribe(*channels)
+
+    async def read(self):
+        while True:
+            try:
+                if self.sync_task is not None and not self.sync_task.done():
+                    # Not subscribed yet: Redis was down at startup or we are reconnecting
+                    await asyncio.shield(self.sync_task)
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None and message["type"] == "message":
+                    channel = message["channel"]
+                    self.receive(channel.decode() if isinstance(channel, bytes) else channel, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # receive() handles bad messages itself, so this is the connection
+                logger.warning(f"Backplane read failed, resubscribing: {e}")
+                await self.resubscribe()
+
+    async def resubscribe(self):
+        """Drop the broken connection and subscribe every wanted channel on a new one"""
+        await asyncio.sleep(self.retry_min_delay)
+        try:
+            await self.pubsub.aclose()
+        except Exception as e:
+            logger.debug(f"Backplane pubsub close failed: {e}")
+        # The server forgot our subscriptions with the connection
+        self.subscribed.clear()
+        self.schedule_sync()
+
+    async def aclose(self):
+        await super().aclose()
+        if self.reader is not None:
+            self.reader.cancel()
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+
+def create_backplane() -> Optional[Backplane]:
+    """Backplane selected by WS_BACKPLANE (none, memory or redis)"""
+    kind = os.getenv("WS_BACKPLANE", "none").lower()
+    batch_interval = float(os.getenv("WS_BACKPLANE_BATCH_MS", 5)) / 1000
+
+    if kind == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisBackplane(client, batch_interval=batch_interval)
+    if kind == "memory":
+        return InMemoryBackplane(InMemoryHub(), batch_interval=batch_interval)
+    if kind not in ("", "none"):
+        logger.warning(f"Unknown WS_BACKPLANE {kind!r}; broadcasts stay on this worker")
+    return None
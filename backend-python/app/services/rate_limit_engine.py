@@ -0,0 +1,369 @@
+"""Rate limiting engines used by RateLimitMiddleware.
+
+Each engine keeps a fixed amount of state per client key, so a check costs
+O(1) time and memory no matter how high the configured limit is. Client
+state lives in a capacity-bounded LRU map, so spoofed or botnet keys can't
+grow it without limit, and idle keys expire a few at a time on each check.
+"""
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.services.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Default number of client keys tracked per process
+DEFAULT_MAX_CLIENTS = 100_000
+
+
+class RateLimitResult(NamedTuple):
+    """Outcome of a single rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the client's quota is fully replenished
+    reset_after: float
+    # Seconds until the next request would be accepted (0 when allowed)
+    retry_after: float
+
+
+class RateLimiter:
+    """Base class for rate limiting engines"""
+
+    algorithm = "base"
+
+    def __init__(self, limit: int, window: float = 60.0, max_clients: Optional[int] = DEFAULT_MAX_CLIENTS):
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        if window <= 0:
+            raise ValueError("window must be positive")
+
+        self.limit = limit
+        self.window = float(window)
+        # key -> engine state, expiring once the key's quota is fully replenished;
+        # None for engines that keep client state elsewhere
+        self.clients = LRUCache(max_clients) if max_clients is not None else None
+
+    def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        """Record a request for key and return whether it is allowed"""
+        raise NotImplementedError
+
+    async def acquire(self, key: str) -> RateLimitResult:
+        """Async form of hit, overridden by engines that need I/O"""
+        return self.hit(key)
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Drop every expired key"""
+        return self.clients.expire(now, limit=None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Tracked clients, memory and eviction statistics"""
+        return self.clients.stats()
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+
+class GCRARateLimiter(RateLimiter):
+    """Generic Cell Rate Algorithm (a token bucket stored as one float per key).
+
+    Requests are spaced by an emission interval of ``window / limit`` seconds
+    and up to ``limit`` requests may arrive back to back. The only state kept
+    per key is the theoretical arrival time (TAT) of the next request.
+    """
+
+    algorithm = "gcra"
+
+    def __init__(self, limit: int, window: float = 60.0, max_clients: int = DEFAULT_MAX_CLIENTS):
+        super().__init__(limit, window, max_clients)
+        self.emission_interval = self.window / self.limit
+
+    def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        if now is None:
+            now = time.time()
+
+        clients = self.clients
+        clients.expire(now)
+
+        tat = clients.get(key, now, now)
+        if tat < now:
+            tat = now
+
+        new_tat = tat + self.emission_interval
+        allow_at = new_tat - self.window
+
+        if now < allow_at:
+            return RateLimitResult(False, self.limit, 0, tat - now, allow_at - now)
+
+        # The TAT doubles as the expiry: once it passes the key is back to a full quota
+        clients.set(key, new_tat, new_tat)
+        # Slots still in use before this request; the epsilon absorbs float
+        # error in epoch timestamps so a full slot isn't rounded away
+        used = math.ceil((tat - now) / self.emission_interval - 1e-6)
+        remaining = max(0, self.limit - 1 - used)
+        return RateLimitResult(True, self.limit, remaining, new_tat - now, 0.0)
+
+
+class SlidingWindowRateLimiter(RateLimiter):
+    """Sliding window counter.
+
+    Keeps the request count of the current and previous fixed windows and
+    weights the previous one by how much of it still overlaps the sliding
+    window. State per key is ``[window_index, previous_count, current_count]``.
+    """
+
+    algorithm = "sliding_window"
+
+    def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        if now is None:
+            now = time.time()
+
+        clients = self.clients
+        clients.expire(now)
+
+        index = int(now // self.window)
+        state = clients.get(key, None, now)
+        if state is None:
+            state = [index, 0, 0]
+        elif state[0] != index:
+            # Roll the windows forward; anything older than one window is gone
+            state[1] = state[2] if state[0] == index - 1 else 0
+            state[2] = 0
+            state[0] = index
+
+        previous, current = state[1], state[2]
+        elapsed = now - index * self.window
+        weight = (self.window - elapsed) / self.window
+        estimated = previous * weight + current
+
+        if estimated + 1 > self.limit:
+            return RateLimitResult(
+                False, self.limit, 0, self._reset_after(state, elapsed),
+                self._retry_after(previous, current, elapsed)
+            )
+
+        state[2] = current + 1
+        # Both tracked windows have slid out two windows after this one started
+        clients.set(key, state, (index + 2) * self.window)
+        remaining = max(0, math.floor(self.limit - estimated - 1))
+        return RateLimitResult(True, self.limit, remaining, self._reset_after(state, elapsed), 0.0)
+
+    def _retry_after(self, previous: int, current: int, elapsed: float) -> float:
+        """Seconds until the weighted count leaves room for one more request"""
+        free_slots = self.limit - current - 1
+        if free_slots >= 0 and previous:
+            # Within this window: wait until enough of the previous one has slid out
+            return max(0.0, self.window * (1 - free_slots / previous) - elapsed)
+        # This window alone is full; in the next one it becomes the previous
+        # window, and its weight has to fall to (limit - 1) / current
+        next_window = self.window * max(0.0, 1 - (self.limit - 1) / current)
+        return self.window - elapsed + next_window
+
+    def _reset_after(self, state: List[int], elapsed: float) -> float:
+        """Seconds until both tracked windows have fully slid out"""
+        if state[2]:
+            return 2 * self.window - elapsed
+        if state[1]:
+            return self.window - elapsed
+        return 0.0
+
+
+class RedisRateLimiter(RateLimiter):
+    """GCRA or sliding window evaluated atomically in Redis so every worker and replica shares one limit.
+
+    The check and the header data (remaining, reset, retry) come back from a
+    single Lua script call, i.e. one round trip per request. When Redis is
+    unreachable the local fallback engine, running the same algorithm,
+    answers until ``retry_interval`` has passed, so an outage degrades to
+    per-process limits instead of errors or different limiting semantics.
+    """
+
+    # KEYS[1] = client key, ARGV[1] = emission interval (ms), ARGV[2] = window (ms)
+    GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval
+local allow_at = new_tat - window
+if now < allow_at then
+    return {0, 0, math.ceil(tat - now), math.ceil(allow_at - now)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+local limit = math.floor(window / interval + 0.5)
+local remaining = math.max(0, limit - 1 - math.ceil((tat - now) / interval - 1e-6))
+return {1, remaining, math.ceil(new_tat - now), 0}
+"""
+
+    # Same arithmetic as SlidingWindowRateLimiter, state in a hash of
+    # i (window index), p (previous count) and c (current count)
+    # KEYS[1] = client key, ARGV[1] = limit, ARGV[2] = window (ms)
+    SLIDING_WINDOW_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+
+local index = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'i', 'p', 'c')
+local previous = 0
+local current = 0
+local stored = tonumber(state[1])
+if stored == index then
+    previous = tonumber(state[2])
+    current = tonumber(state[3])
+elseif stored == index - 1 then
+    previous = tonumber(state[3])
+end
+
+local elapsed = now - index * window
+local estimated = previous * (window - elapsed) / window + current
+
+if estimated + 1 > limit then
+    local retry
+    local free = limit - current - 1
+    if free >= 0 and previous > 0 then
+        retry = math.max(0, window * (1 - free / previous) - elapsed)
+    else
+        retry = window - elapsed + window * math.max(0, 1 - (limit - 1) / current)
+    end
+    local reset = 0
+    if current > 0 then
+        reset = 2 * window - elapsed
+    elseif previous > 0 then
+        reset = window - elapsed
+    end
+    return {0, 0, math.ceil(reset), math.ceil(retry)}
+end
+
+current = current + 1
+redis.call('HSET', KEYS[1], 'i', index, 'p', previous, 'c', current)
+redis.call('PEXPIRE', KEYS[1], math.ceil((index + 2) * window - now))
+local remaining = math.max(0, math.floor(limit - estimated - 1))
+return {1, remaining, math.ceil(2 * window - elapsed), 0}
+"""
+
+    def __init__(
+        self,
+        redis_client: Any,
+        limit: int,
+        window: float = 60.0,
+        algorithm: str = GCRARateLimiter.algorithm,
+        fallback: Optional[RateLimiter] = None,
+        key_prefix: str = "ratelimit:",
+        retry_interval: float = 5.0,
+    ):
+        # Client state lives in Redis; only the fallback keeps a local map
+        super().__init__(limit, window, max_clients=None)
+        if algorithm == GCRARateLimiter.algorithm:
+            script, self.script_args = self.GCRA_SCRIPT, [self.window * 1000 / self.limit, self.window * 1000]
+        elif algorithm == SlidingWindowRateLimiter.algorithm:
+            script, self.script_args = self.SLIDING_WINDOW_SCRIPT, [self.limit, self.window * 1000]
+        else:
+            raise ValueError(f"Redis rate limiting does not support algorithm '{algorithm}'")
+        if fallback is not None and fallback.algorithm != algorithm:
+            raise ValueError(f"Fallback runs '{fallback.algorithm}', expected '{algorithm}'")
+
+        self.algorithm = algorithm
+        self.redis = redis_client
+        self.fallback = fallback or RATE_LIMIT_ALGORITHMS[algorithm](limit, window)
+        # The algorithms store different types; keep their keys apart
+        self.key_prefix = f"{key_prefix}{algorithm}:"
+        self.retry_interval = retry_interval
+
+        self.script = redis_client.register_script(script)
+        self.unavailable_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        """Whether Redis is currently being used for checks"""
+        return time.monotonic() >= self.unavailable_until
+
+    def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        # Synchronous callers can't wait on Redis, so they get the local view
+        return self.fallback.hit(key, now)
+
+    async def acquire(self, key: str) -> RateLimitResult:
+        if not self.available:
+            return self.fallback.hit(key)
+
+        # Imported here so the in-memory engines work without the redis package
+        from redis.exceptions import RedisError
+
+        try:
+            allowed, remaining, reset_ms, retry_ms = await self.script(
+                keys=[self.key_prefix + key], args=self.script_args
+            )
+        except (RedisError, OSError) as e:
+            if self.unavailable_until == 0.0:
+                logger.warning(f"Redis rate limiter unavailable, using local fallback: {e}")
+            self.unavailable_until = time.monotonic() + self.retry_interval
+            return self.fallback.hit(key)
+
+        if self.unavailable_until:
+            logger.info("Redis rate limiter recovered")
+            self.unavailable_until = 0.0
+
+        return RateLimitResult(bool(allowed), self.limit, int(remaining), reset_ms / 1000, retry_ms / 1000)
+
+    def purge(self, now: Optional[float] = None) -> int:
+        # Redis keys expire on their own; only the fallback holds local state
+        return self.fallback.purge(now)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.fallback.stats()
+
+    def __len__(self) -> int:
+        return len(self.fallback)
+
+
+RATE_LIMIT_ALGORITHMS = {
+    GCRARateLimiter.algorithm: GCRARateLimiter,
+    SlidingWindowRateLimiter.algorithm: SlidingWindowRateLimiter,
+}
+
+
+def create_rate_limiter(
+    limit: int,
+    window: float = 60.0,
+    algorithm: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> RateLimiter:
+    """Create a rate limiting engine, defaulting to RATE_LIMIT_ALGORITHM and RATE_LIMIT_BACKEND"""
+    algorithm = algorithm or os.getenv("RATE_LIMIT_ALGORITHM", GCRARateLimiter.algorithm)
+    backend = backend or os.getenv("RATE_LIMIT_BACKEND", "memory")
+
+    try:
+        limiter_class = RATE_LIMIT_ALGORITHMS[algorithm]
+    except KeyError:
+        raise ValueError(
+            f"Unknown rate limit algorithm '{algorithm}' "
+            f"(expected one of: {', '.join(RATE_LIMIT_ALGORITHMS)})"
+        )
+
+    max_clients = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", DEFAULT_MAX_CLIENTS))
+    local_limiter = limiter_class(limit, window, max_clients)
+
+    if backend == "memory":
+        return local_limiter
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            socket_connect_timeout=1.0,
+            socket_timeout=1.0,
+        )
+        return RedisRateLimiter(client, limit, window, algorithm, fallback=local_limiter)
+
+    raise ValueError(f"Unknown rate limit backend '{backend}' (expected 'memory' or 'redis')")
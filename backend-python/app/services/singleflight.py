@@ -0,0 +1,85 @@
+"""Request coalescing ("singleflight") for upstream calls.
+
+Concurrent callers asking for the same key share one in-flight upstream
+call instead of each starting their own, so a reconnect storm of N
+identical requests turns into a single upstream request.
+
+The upstream call runs in its own task and callers wait on it through
+``asyncio.shield``: a cancelled caller leaves the call running for the
+others, and the call is only cancelled once no caller is waiting on it.
+"""
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Every live SingleFlight instance, for metrics export
+flight_groups: "weakref.WeakSet[SingleFlight]" = weakref.WeakSet()
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "abandoned")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls: Dict[Hashable, _Call] = {}
+        # Counted per group only: keys carry token fingerprints and unbounded paths
+        self.counts = {"calls": 0, "shared": 0, "errors": 0}
+        flight_groups.add(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing it with concurrent callers of the same key"""
+        self.counts["calls"] += 1
+
+        call = self.calls.get(key)
+        if call is None or call.abandoned or call.task.done():
+            call = _Call(asyncio.create_task(fn()))
+            self.calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+        else:
+            self.counts["shared"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # The last interested caller went away; stop the upstream call
+                call.abandoned = True
+                call.task.cancel()
+
+    def _finished(self, key: Hashable, call: _Call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
+        if not call.task.cancelled() and call.task.exception() is not None:
+            self.counts["errors"] += 1
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.calls)
+
+    def stats(self) -> Dict[str, int]:
+        """Call, shared and error counts for this group"""
+        return dict(self.counts)
+
+
+def total_in_flight() -> int:
+    return sum(group.in_flight for group in list(flight_groups))
+
+
+def collect_flight_stats(field: str) -> Dict[str, int]:
+    """``{group: count}`` for one statistic across all flight groups"""
+    totals: Dict[str, int] = {}
+    for group in list(flight_groups):
+        # Groups may share a name (one per cache instance); add them up
+        totals[group.name] = totals.get(group.name, 0) + group.counts[field]
+    return totals
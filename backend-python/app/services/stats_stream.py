@@ -0,0 +1,121 @@
+"""Throttled, delta-encoded connection stats for subscribed WebSocket clients.
+
+A client that sends ``subscribe_stats`` gets a full ``stats`` snapshot
+right away, then ``stats_delta`` messages listing only the rooms whose
+member counts changed (0 means the room is gone) with their new counts.
+Changes are coalesced so subscribers get at most one delta per
+``WS_STATS_INTERVAL_MS``, and nothing is tracked while nobody is
+subscribed.
+
+Stats frames share the droppable broadcast queue, and a lost delta would
+leave the client's counts wrong for good, so when a subscriber's writer
+drops any frame the next flush sends that subscriber a full snapshot
+instead of the delta.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from app.services.ws_protocol import EncodedMessage
+
+
+class StatsStream:
+    """Stats snapshot on subscribe, then coalesced per-room deltas"""
+
+    def __init__(self, manager, interval: Optional[float] = None):
+        self.manager = manager
+        self.interval = interval if interval is not None else int(os.getenv("WS_STATS_INTERVAL_MS", 500)) / 1000
+        self.subscribers: Set = set()
+        # Subscribers that lost a frame and get a snapshot on the next flush
+        self.stale: Set = set()
+
+        # Rooms changed since the last delta, and whether anything changed at all
+        self.dirty_rooms: Set[str] = set()
+        self.dirty = False
+        self.flush_task: Optional[asyncio.Task] = None
+        self.last_flush = 0.0
+        self.counts = {"snapshot": 0, "delta": 0, "resync": 0}
+
+    def snapshot(self) -> Dict[str, Any]:
+        rooms = self.manager.rooms
+        return {
+            "type": "stats",
+            "snapshot": True,
+            "total_connections": len(self.manager.connections),
+            "active_rooms": len(rooms),
+            "rooms": {room: len(members) for room, members in rooms.items()},
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+
+    def subscribe(self, state) -> bool:
+        """Add a subscriber and queue its snapshot; False if its queue rejected it"""
+        self.subscribers.add(state)
+        self.stale.discard(state)
+        state.writer.on_drop = lambda: self.resync(state)
+        self.counts["snapshot"] += 1
+        return state.writer.enqueue(EncodedMessage(self.snapshot()).frame(state.protocol))
+
+    def unsubscribe(self, state):
+        self.subscribers.discard(state)
+        self.stale.discard(state)
+        state.writer.on_drop = None
+        if not self.subscribers:
+            self.dirty_rooms.clear()
+            self.dirty = False
+
+    def resync(self, state):
+        """The subscriber's writer dropped a frame; send it a snapshot on the next flush"""
+        if state in self.subscribers:
+            self.stale.add(state)
+            self.changed()
+
+    def room_changed(self, room: str):
+        if self.subscribers:
+            self.dirty_rooms.add(room)
+            self.changed()
+
+    def changed(self):
+        """Schedule a delta, no sooner than interval after the previous one"""
+        if not self.subscribers:
+            return
+        self.dirty = True
+        if self.flush_task is None:
+            delay = max(0.0, self.last_flush + self.interval - asyncio.get_running_loop().time())
+            self.flush_task = asyncio.create_task(self.flush_later(delay))
+
+    async def flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self.flush_task = None
+        self.flush()
+
+    def flush(self):
+        """Send the pending delta to every subscriber"""
+        if not self.dirty or not self.subscribers:
+            return
+        self.last_flush = asyncio.get_running_loop().time()
+
+        rooms = self.manager.rooms
+        changed = {room: len(rooms.get(room, ())) for room in self.dirty_rooms}
+        self.dirty_rooms = set()
+        self.dirty = False
+
+        # Snapshots go out first: a drop they cause marks the subscriber stale again
+        stale, self.stale = self.stale, set()
+        if stale:
+            self.counts["resync"] += len(stale)
+            self.manager.fan_out(stale, EncodedMessage(self.snapshot()))
+
+        self.counts["delta"] += 1
+        self.manager.fan_out(self.subscribers - stale, EncodedMessage({
+            "type": "stats_delta",
+            "total_connections": len(self.manager.connections),
+            "active_rooms": len(rooms),
+            "rooms": changed,
+            "timestamp": datetime.utcnow().isoformat(),
+        }))
+
+    def close(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
@@ -0,0 +1,105 @@
+"""Background sampler for host and process metrics.
+
+psutil calls block (``cpu_percent(interval=1)`` sleeps for a second, disk and
+/proc reads hit the filesystem), so they run in a worker thread every
+``SYSTEM_SAMPLE_INTERVAL`` seconds and handlers read the latest snapshot
+instead of sampling on the event loop.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import psutil
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+
+class SystemSampler:
+    """Latest CPU, memory, disk and process snapshot, refreshed off the event loop"""
+
+    def __init__(self, interval: float = 5.0, disk_path: str = "/"):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.process = psutil.Process()
+        self.boot_time = psutil.boot_time()
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "SystemSampler":
+        return cls(
+            interval=float(os.getenv("SYSTEM_SAMPLE_INTERVAL", 5)),
+            disk_path=os.getenv("SYSTEM_DISK_PATH", "/"),
+        )
+
+    def sample(self, cpu_interval: Optional[float] = None) -> Dict[str, Any]:
+        """Collect one snapshot; blocking, so it runs in a worker thread"""
+        # With interval None, CPU usage is measured since the previous sample
+        cpu_percent = psutil.cpu_percent(interval=cpu_interval)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+
+        with self.process.oneshot():
+            process = {
+                "rss": self.process.memory_info().rss,
+                "cpu_percent": self.process.cpu_percent(interval=None),
+                "num_threads": self.process.num_threads(),
+                "num_fds": self.process.num_fds() if hasattr(self.process, "num_fds") else self.process.num_handles(),
+            }
+
+        return {
+            "cpu_percent": cpu_percent,
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "percent": memory.percent,
+                "used": memory.used,
+                "free": memory.free,
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": (disk.used / disk.total) * 100,
+            },
+            "process": process,
+            "boot_time": self.boot_time,
+            "sampled_at": time.time(),
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+
+    async def start(self):
+        """Take the first snapshot (over a short CPU window), then sample in the background"""
+        try:
+            self.snapshot = await asyncio.to_thread(self.sample, 0.1)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"System metrics sample failed: {e}")
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.snapshot = await asyncio.to_thread(self.sample)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"System metrics sample failed: {e}")
+
+    def age(self) -> Optional[float]:
+        """Seconds since the current snapshot was taken"""
+        return time.time() - self.snapshot["sampled_at"] if self.snapshot else None
+
+    async def aclose(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+def get_system_sampler(request: Request) -> SystemSampler:
+    """FastAPI dependency returning the system metrics sampler"""
+    return request.app.state.system_sampler
@@ -0,0 +1,351 @@
+"""In-process vector index for embedding search.
+
+Embeddings are stored L2-normalized in one contiguous float32 matrix, so a
+cosine top-k search is a single matrix-vector product followed by
+``argpartition``. The index persists to a ``.npy`` file that is opened
+memory-mapped and read-only, so workers on the same host share its pages
+and start without parsing anything; ids and metadata live in a JSON
+sidecar. Rows added after loading go to a small in-memory matrix that is
+searched alongside the snapshot, which is never copied.
+
+Workers share one index through those files: ``SharedVectorIndex`` appends
+each add to a log under a file lock and replays what other workers logged
+before every write and search, folding the log into a new snapshot once it
+outgrows it.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import struct
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import Request
+
+# Rows allocated up front; capacity doubles as documents are added
+INITIAL_CAPACITY = 1024
+
+# The add log is folded into the snapshot once it is larger than this and the matrix
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+RECORD_HEADER = struct.Struct("<I")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class HashingEmbedder:
+    """Deterministic local embedder (feature hashing of word unigrams and bigrams).
+
+    Used when Azure OpenAI is not configured and for tests and benchmarks:
+    texts sharing words get similar vectors, with no network calls.
+    """
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return normalize_rows(vectors)
+
+
+class VectorIndex:
+    """Float32 matrices of unit vectors with vectorized cosine search.
+
+    Rows below ``base_size`` are in ``base``, a loaded snapshot kept
+    memory-mapped read-only; later rows go to the in-memory ``matrix``.
+    Replacing a snapshot row appends the new vector and masks the old row.
+    """
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions
+        self.base: Optional[np.ndarray] = None
+        self.base_size = 0
+        self.matrix: Optional[np.ndarray] = None
+        # Rows in base and matrix together, superseded ones included
+        self.size = 0
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        # Snapshot rows replaced by a later row, left out of searches and saves
+        self.superseded: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def ensure_capacity(self, extra_rows: int):
+        """Make room for extra_rows in the in-memory matrix"""
+        used = self.size - self.base_size
+        if self.matrix is not None and self.matrix.shape[0] >= used + extra_rows:
+            return
+
+        capacity = max(INITIAL_CAPACITY, self.matrix.shape[0] if self.matrix is not None else 0)
+        while capacity < used + extra_rows:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        if used:
+            matrix[:used] = self.matrix[:used]
+        self.matrix = matrix
+
+    def add(self, ids: Sequence[str], vectors: Any, metadata: Optional[Sequence[Dict[str, Any]]] = None):
+        """Insert or replace vectors by id"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("vectors must be a 2-D array with one row per id")
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+
+        vectors = normalize_rows(vectors)
+        metadata = metadata or [{}] * len(ids)
+        self.ensure_capacity(len(ids))
+
+        for doc_id, vector, meta in zip(ids, vectors, metadata):
+            row = self.rows.get(doc_id)
+            if row is not None and row < self.base_size:
+                # The snapshot is read-only, so the document moves to a new row
+                self.superseded.append(row)
+                row = None
+            if row is None:
+                row = self.rows[doc_id] = self.size
+                self.ids.append(doc_id)
+                self.metadata.append(meta)
+                self.size += 1
+            else:
+                self.metadata[row] = meta
+            self.matrix[row - self.base_size] = vector
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row to a unit query; superseded rows score -inf"""
+        parts = []
+        if self.base_size:
+            base = self.base[:self.base_size] @ query
+            if self.superseded:
+                base[self.superseded] = -np.inf
+            parts.append(base)
+        if self.size > self.base_size:
+            parts.append(self.matrix[:self.size - self.base_size] @ query)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def search(self, query: Any, k: int = 10) -> List[Dict[str, Any]]:
+        """Top-k documents by cosine similarity to query"""
+        if not self.rows:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dimensions:
+            raise ValueError(f"expected a {self.dimensions}-dimensional query, got {query.shape[0]}")
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = self.scores(query / norm)
+        # Superseded rows score -inf, so capping k at the live documents never returns one
+        k = min(k, len(self.rows))
+        # argpartition finds the top k in O(n); only those k are sorted
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [
+            {"id": self.ids[row], "score": float(scores[row]), "metadata": self.metadata[row]}
+            for row in top
+        ]
+
+    def save(self, path: str):
+        """Write the matrix (``<path>.npy``) and ids/metadata (``<path>.json``) atomically"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        live = np.array(sorted(self.rows.values()), dtype=np.int64)
+        matrix = np.zeros((len(live), self.dimensions or 0), np.float32)
+        in_base = live < self.base_size
+        if in_base.any():
+            matrix[in_base] = self.base[live[in_base]]
+        if not in_base.all():
+            matrix[~in_base] = self.matrix[live[~in_base] - self.base_size]
+        with open(f"{path}.npy.tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(f"{path}.json.tmp", "w") as f:
+            json.dump({
+                "dimensions": self.dimensions,
+                "ids": [self.ids[row] for row in live],
+                "metadata": [self.metadata[row] for row in live],
+            }, f)
+
+        # The matrix is replaced first; a reader seeing the old sidecar only misses new rows
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """Open a saved index with the matrix memory-mapped read-only"""
+        with open(f"{path}.json") as f:
+            sidecar = json.load(f)
+
+        index = cls(sidecar["dimensions"])
+        matrix = np.load(f"{path}.npy", mmap_mode="r")
+        index.size = index.base_size = min(len(sidecar["ids"]), matrix.shape[0])
+        index.base = matrix
+        index.ids = sidecar["ids"][:index.size]
+        index.metadata = sidecar["metadata"][:index.size]
+        index.rows = {doc_id: row for row, doc_id in enumerate(index.ids)}
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self),
+            "dimensions": self.dimensions,
+            "capacity": self.base_size + (self.matrix.shape[0] if self.matrix is not None else 0),
+            "memory_mapped": isinstance(self.base, np.memmap),
+            "memory_rows": self.size - self.base_size,
+            "matrix_bytes": self.size * (self.dimensions or 0) * 4,
+        }
+
+
+def encode_record(ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[Dict[str, Any]]) -> bytes:
+    """One add as a log record: header length, JSON header, float32 rows"""
+    header = json.dumps({"ids": list(ids), "metadata": list(metadata), "dimensions": vectors.shape[1]}).encode()
+    return RECORD_HEADER.pack(len(header)) + header + np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+
+
+def replay_log(path: str, offset: int, index: VectorIndex) -> int:
+    """Apply the records after ``offset`` to index; returns the new offset"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    position = 0
+    # Writers append whole records under the exclusive lock, so there are no partial ones
+    while position < len(data):
+        (length,) = RECORD_HEADER.unpack_from(data, position)
+        position += RECORD_HEADER.size
+        header = json.loads(data[position:position + length])
+        position += length
+        rows, dimensions = len(header["ids"]), header["dimensions"]
+        vectors = np.frombuffer(data, np.float32, rows * dimensions, position).reshape(rows, dimensions)
+        position += vectors.nbytes
+        index.add(header["ids"], vectors, header["metadata"])
+    return offset + position
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class SharedVectorIndex:
+    """A VectorIndex kept in step with the other workers through the files at ``path``.
+
+    The snapshot is ``<path>.npy``/``<path>.json`` as written by
+    ``VectorIndex.save``; adds since then are appended to ``<path>.log``. A
+    writer takes an exclusive ``flock`` on ``<path>.lock``, replays what other
+    workers appended, then appends only its own rows, so no add is lost and
+    none rewrites the index. When the log outgrows the matrix it is folded
+    into a new snapshot (atomic renames) and truncated, and readers reload.
+    Without a path the index lives in memory only.
+
+    Not thread-safe; callers in one process serialize ``refresh``, ``add`` and
+    searches of the returned index, which both may modify or replace.
+    """
+
+    def __init__(self, path: Optional[str] = None, compact_min_bytes: int = COMPACT_MIN_BYTES):
+        self.path = path
+        self.compact_min_bytes = compact_min_bytes
+        self.index = VectorIndex()
+        # What self.index was built from: sidecar stamp, log inode and bytes replayed
+        self.snapshot: Optional[Tuple[int, int, int]] = None
+        self.log_id: Optional[int] = None
+        self.offset = 0
+        self.compactions = 0
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @contextmanager
+    def locked(self, operation: int) -> Iterator[None]:
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, operation)
+            yield
+
+    def stamps(self) -> Tuple[Optional[Tuple[int, int, int]], Optional[int], int]:
+        snapshot = file_stamp(f"{self.path}.json")
+        log = file_stamp(f"{self.path}.log")
+        return snapshot, log[0] if log else None, log[2] if log else 0
+
+    def catch_up(self):
+        """Apply what other workers wrote; the caller holds the lock"""
+        snapshot, log_id, _ = self.stamps()
+        if snapshot != self.snapshot or log_id != self.log_id:
+            # Compacted (or first open): start over from the new snapshot
+            self.index = VectorIndex.load(self.path) if snapshot is not None else VectorIndex()
+            self.snapshot, self.log_id, self.offset = snapshot, log_id, 0
+        if log_id is not None:
+            self.offset = replay_log(f"{self.path}.log", self.offset, self.index)
+
+    def refresh(self) -> VectorIndex:
+        """The index with every worker's adds applied"""
+        if self.path and self.stamps() != (self.snapshot, self.log_id, self.offset):
+            with self.locked(fcntl.LOCK_SH):
+                self.catch_up()
+        return self.index
+
+    def add(self, ids: Sequence[str], vectors: Any, metadata: Optional[Sequence[Dict[str, Any]]] = None):
+        """Insert or replace vectors by id, in this worker and on disk"""
+        if not self.path:
+            self.index.add(ids, vectors, metadata)
+            return
+
+        with self.locked(fcntl.LOCK_EX):
+            self.catch_up()
+            vectors = np.asarray(vectors, dtype=np.float32)
+            metadata = metadata or [{}] * len(ids)
+            self.index.add(ids, vectors, metadata)
+
+            log_path = f"{self.path}.log"
+            with open(log_path, "ab") as f:
+                f.write(encode_record(ids, vectors, metadata))
+                self.offset = f.tell()
+                self.log_id = os.fstat(f.fileno()).st_ino
+            if self.offset > max(self.compact_min_bytes, self.index.size * self.index.dimensions * 4):
+                self.compact()
+
+    def compact(self):
+        """Fold the log into a new snapshot and reopen it; the caller holds the exclusive lock"""
+        self.index.save(self.path)
+        with open(f"{self.path}.log.tmp", "wb"):
+            pass
+        os.replace(f"{self.path}.log.tmp", f"{self.path}.log")
+        # Map the new snapshot so the in-memory rows it now holds are released
+        self.index = VectorIndex.load(self.path)
+        self.snapshot, self.log_id, self.offset = self.stamps()
+        self.compactions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.index.stats(), "log_bytes": self.offset, "compactions": self.compactions}
+
+
+def get_vector_index(request: Request) -> SharedVectorIndex:
+    """FastAPI dependency returning the application's vector index"""
+    return request.app.state.vector_index
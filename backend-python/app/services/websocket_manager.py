@@ -1,139 +1,310 @@
 from fastapi import WebSocket
-from typing import Dict, Set, List, Any
+from typing import Dict, Set, List, Any, Optional, Iterable, Coroutine
+import itertools
 import json
+import os
+import sys
 import asyncio
+import logging
+
+from app.services import ws_protocol
+from app.services.connection_writer import OVERFLOW_POLICIES, ConnectionWriter, send_queue_settings
+from app.services.pubsub import BROADCAST_CHANNEL, Backplane, room_channel
+from app.services.stats_stream import StatsStream
+from app.services.ws_protocol import EncodedMessage, Frame
+
+logger = logging.getLogger(__name__)
+
+# Connection IDs are never reused within a process, unlike id(websocket)
+connection_ids = itertools.count(1)
+
+class RequestRejected(Exception):
+    """A client request could not be started on its connection"""
+
+class ConnectionState:
+    """Registry record for one WebSocket connection"""
+
+    __slots__ = ("id", "websocket", "protocol", "connected_at", "rooms", "writer", "requests")
+
+    def __init__(self, websocket: WebSocket, protocol: str, writer: ConnectionWriter):
+        self.id = next(connection_ids)
+        self.websocket = websocket
+        # Negotiated subprotocol: frames are JSON text or MessagePack binary
+        self.protocol = protocol
+        self.connected_at = asyncio.get_event_loop().time()
+        # Reverse room index: the rooms this connection is in
+        self.rooms: Set[str] = set()
+        self.writer = writer
+        # In-flight client requests (AI calls) by client request ID
+        self.requests: Dict[str, asyncio.Task] = {}
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held for this connection, queued frames included"""
+        queue, replies = self.writer.queue, self.writer.replies
+        return (
+            sys.getsizeof(self) + sys.getsizeof(self.rooms) + sys.getsizeof(self.writer)
+            + sys.getsizeof(queue) + sum(sys.getsizeof(frame) for frame in queue)
+            + sys.getsizeof(replies) + sum(sys.getsizeof(frame) for frame in replies)
+            + sys.getsizeof(self.requests)
+        )
 
 class WebSocketManager:
-    def __init__(self):
-        # Active connections
-        self.active_connections: List[WebSocket] = []
-        
+    def __init__(
+        self,
+        send_queue_size: Optional[int] = None,
+        overflow_policy: Optional[str] = None,
+        max_requests: Optional[int] = None,
+        stats_interval: Optional[float] = None,
+    ):
+        # Active connections, with O(1) add, lookup and remove
+        self.connections: Dict[WebSocket, ConnectionState] = {}
+
         # Room-based connections
-        self.rooms: Dict[str, Set[WebSocket]] = {}
-        
-        # Connection metadata
-        self.connection_info: Dict[WebSocket, Dict[str, Any]] = {}
-
-    async def connect(self, websocket: WebSocket):
-        """Accept a new WebSocket connection"""
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        
-        # Store connection metadata
-        self.connection_info[websocket] = {
-            "connected_at": asyncio.get_event_loop().time(),
-            "rooms": set()
-        }
-        
-        print(f"🔌 WebSocket connected: {id(websocket)} (Total: {len(self.active_connections)})")
+        self.rooms: Dict[str, Set[ConnectionState]] = {}
+
+        # Outbound queue and writer task per connection, so sends never block the caller
+        default_size, default_policy = send_queue_settings()
+        self.send_queue_size = send_queue_size or default_size
+        self.overflow_policy = overflow_policy or default_policy
+        self.dropped_messages = {policy: 0 for policy in OVERFLOW_POLICIES}
+        # How long replies wait for room in a full reply queue before the client is dropped
+        self.reply_timeout = float(os.getenv("WS_REPLY_TIMEOUT", 10))
+
+        # Concurrent client requests allowed per connection
+        self.max_requests = max_requests or int(os.getenv("WS_MAX_CONCURRENT_REQUESTS", 4))
+
+        # Optional pub/sub backplane carrying broadcasts to the other workers
+        self.backplane: Optional[Backplane] = None
+
+        # Coalesced stats deltas for clients that subscribed to them
+        self.stats = StatsStream(self, stats_interval)
+
+    async def attach_backplane(self, backplane: Backplane):
+        """Publish broadcasts through a backplane and deliver the ones from other workers"""
+        self.backplane = backplane
+        for room in self.rooms:
+            backplane.subscribe(room_channel(room))
+        await backplane.start(self.deliver_remote)
+
+    async def detach_backplane(self):
+        """Stop relaying broadcasts between workers"""
+        backplane, self.backplane = self.backplane, None
+        if backplane is not None:
+            await backplane.aclose()
+
+    async def connect(self, websocket: WebSocket) -> ConnectionState:
+        """Accept a new WebSocket connection with the subprotocol the client asked for"""
+        subprotocol = ws_protocol.negotiate(websocket.scope.get("subprotocols", ()))
+        await websocket.accept(subprotocol=subprotocol)
+        writer = ConnectionWriter(
+            websocket, self.send_queue_size, self.overflow_policy, self.dropped_messages, self.disconnect,
+            self.reply_timeout,
+        )
+        state = ConnectionState(websocket, subprotocol or ws_protocol.JSON, writer)
+        self.connections[websocket] = state
+
+        self.stats.changed()
+
+        logger.debug(f"WebSocket connected: {state.id} ({state.protocol}, Total: {len(self.connections)})")
+        return state
 
     def disconnect(self, websocket: WebSocket):
         """Disconnect a WebSocket and clean up"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        
+        state = self.connections.pop(websocket, None)
+        if state is None:
+            return
+
+        state.writer.close()
+
+        # Nobody is left to answer in-flight requests
+        for task in state.requests.values():
+            task.cancel()
+
         # Remove from all rooms
-        if websocket in self.connection_info:
-            rooms_to_leave = self.connection_info[websocket]["rooms"].copy()
-            for room in rooms_to_leave:
-                self.leave_room(websocket, room)
-            
-            del self.connection_info[websocket]
-        
-        print(f"🔌 WebSocket disconnected: {id(websocket)} (Total: {len(self.active_connections)})")
+        for room in state.rooms:
+            self.remove_member(room, state)
+        state.rooms.clear()
+
+        self.stats.unsubscribe(state)
+        self.stats.changed()
+
+        logger.debug(f"WebSocket disconnected: {state.id} (Total: {len(self.connections)})")
+
+    def get_client_id(self, websocket: WebSocket) -> Optional[int]:
+        """Stable ID of a connection, unique for the life of the process"""
+        state = self.connections.get(websocket)
+        return state.id if state is not None else None
+
+    def start_request(self, websocket: WebSocket, request_id: str, coro: Coroutine) -> asyncio.Task:
+        """Run a client request concurrently with the receive loop (raises RequestRejected)"""
+        state = self.connections.get(websocket)
+        reason = None
+        if state is None:
+            reason = "Connection is closed"
+        elif request_id in state.requests:
+            reason = f"Request {request_id} is already in progress"
+        elif len(state.requests) >= self.max_requests:
+            reason = f"Too many concurrent requests (limit {self.max_requests})"
+        if reason is not None:
+            coro.close()
+            raise RequestRejected(reason)
+
+        task = asyncio.create_task(coro)
+        state.requests[request_id] = task
+        task.add_done_callback(lambda done: self.finish_request(state, request_id, done))
+        return task
+
+    def finish_request(self, state: ConnectionState, request_id: str, task: asyncio.Task):
+        if state.requests.get(request_id) is task:
+            del state.requests[request_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"WebSocket request {request_id} on connection {state.id} failed: {task.exception()}")
+
+    def cancel_request(self, websocket: WebSocket, request_id: str) -> bool:
+        """Cancel an in-flight request; False if there is none with that ID"""
+        state = self.connections.get(websocket)
+        task = state.requests.pop(request_id, None) if state is not None else None
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def get_request_count(self) -> int:
+        """In-flight client requests across all connections"""
+        return sum(len(state.requests) for state in self.connections.values())
+
+    def enqueue(self, websocket: WebSocket, frame: Frame) -> bool:
+        """Queue an encoded frame on a connection's writer; False if the connection must be dropped"""
+        state = self.connections.get(websocket)
+        return state is not None and state.writer.enqueue(frame)
 
     async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
-        """Send a message to a specific WebSocket connection"""
-        try:
-            await websocket.send_json(message)
-        except Exception as e:
-            print(f"Error sending personal message: {e}")
+        """Send a reply to a specific WebSocket connection in its protocol, never dropping it"""
+        state = self.connections.get(websocket)
+        if state is None or not await state.writer.send(ws_protocol.encode(message, state.protocol)):
             self.disconnect(websocket)
 
-    async def broadcast(self, message: Dict[str, Any], exclude: WebSocket = None):
-        """Broadcast a message to all connected clients"""
-        disconnected = []
-        
-        for connection in self.active_connections:
-            if connection != exclude:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error broadcasting to {id(connection)}: {e}")
-                    disconnected.append(connection)
-        
+    def fan_out(self, states: Iterable[ConnectionState], encoded: EncodedMessage, exclude: WebSocket = None):
+        """Queue a message on every connection except exclude, encoded once per protocol"""
+        frame_for = encoded.frame
+        disconnected = [
+            state for state in states
+            if state.websocket is not exclude and not state.writer.enqueue(frame_for(state.protocol))
+        ]
+
         # Clean up disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+        for state in disconnected:
+            self.disconnect(state.websocket)
+
+    async def broadcast(self, message: Dict[str, Any], exclude: WebSocket = None):
+        """Broadcast a message to all connected clients (encoded once, enqueued per client)"""
+        encoded = EncodedMessage(message)
+        self.fan_out(self.connections.values(), encoded, exclude)
+        if self.backplane is not None:
+            self.backplane.publish(BROADCAST_CHANNEL, encoded.frame(ws_protocol.JSON))
 
     async def broadcast_to_room(self, room: str, message: Dict[str, Any], exclude: WebSocket = None):
-        """Broadcast a message to all clients in a specific room"""
-        if room not in self.rooms:
+        """Broadcast a message to all clients in a specific room (encoded once, enqueued per client)"""
+        if room not in self.rooms and self.backplane is None:
             return
-        
-        disconnected = []
-        
-        for connection in self.rooms[room]:
-            if connection != exclude:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error broadcasting to room {room}, connection {id(connection)}: {e}")
-                    disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+
+        encoded = EncodedMessage(message)
+        self.fan_out(self.rooms.get(room, ()), encoded, exclude)
+        if self.backplane is not None:
+            # Members on other workers get it through the room's channel
+            self.backplane.publish(room_channel(room), encoded.frame(ws_protocol.JSON))
+
+    def deliver_remote(self, channel: str, frame: str):
+        """Deliver a JSON frame another worker published to our local connections"""
+        encoded = EncodedMessage(json_frame=frame)
+        if channel == BROADCAST_CHANNEL:
+            self.fan_out(self.connections.values(), encoded)
+        elif channel.startswith("room:"):
+            self.fan_out(self.rooms.get(channel[len("room:"):], ()), encoded)
 
     def join_room(self, websocket: WebSocket, room: str):
         """Add a WebSocket connection to a room"""
+        state = self.connections.get(websocket)
+        if state is None:
+            return
+
         if room not in self.rooms:
             self.rooms[room] = set()
-        
-        self.rooms[room].add(websocket)
-        
-        if websocket in self.connection_info:
-            self.connection_info[websocket]["rooms"].add(room)
-        
-        print(f"🏠 {id(websocket)} joined room '{room}' (Room size: {len(self.rooms[room])})")
+            # First local member: start receiving the room's broadcasts from other workers
+            if self.backplane is not None:
+                self.backplane.subscribe(room_channel(room))
+
+        self.rooms[room].add(state)
+        state.rooms.add(room)
+        self.stats.room_changed(room)
+
+        logger.debug(f"{state.id} joined room '{room}' (Room size: {len(self.rooms[room])})")
 
     def leave_room(self, websocket: WebSocket, room: str):
         """Remove a WebSocket connection from a room"""
-        if room in self.rooms and websocket in self.rooms[room]:
-            self.rooms[room].remove(websocket)
-            
-            # Clean up empty rooms
-            if not self.rooms[room]:
-                del self.rooms[room]
-        
-        if websocket in self.connection_info:
-            self.connection_info[websocket]["rooms"].discard(room)
-        
-        print(f"🏠 {id(websocket)} left room '{room}'")
+        state = self.connections.get(websocket)
+        if state is None or room not in state.rooms:
+            return
+
+        state.rooms.discard(room)
+        self.remove_member(room, state)
+
+        logger.debug(f"{state.id} left room '{room}'")
+
+    def remove_member(self, room: str, state: ConnectionState):
+        """Drop a connection from a room's member set, cleaning up empty rooms"""
+        members = self.rooms.get(room)
+        if members is None:
+            return
+
+        members.discard(state)
+        self.stats.room_changed(room)
+        if not members:
+            del self.rooms[room]
+            if self.backplane is not None:
+                self.backplane.unsubscribe(room_channel(room))
 
     def get_connection_count(self) -> int:
         """Get the total number of active connections"""
-        return len(self.active_connections)
+        return len(self.connections)
 
     def get_room_count(self, room: str) -> int:
         """Get the number of connections in a specific room"""
         return len(self.rooms.get(room, set()))
 
+    def get_send_queue_depths(self) -> Dict[str, int]:
+        """Total and largest number of frames waiting in connection send queues"""
+        depths = [len(state.writer) for state in self.connections.values()]
+        return {"total": sum(depths), "max": max(depths, default=0)}
+
+    def get_memory_usage(self) -> int:
+        """Approximate bytes held by connection records, room sets and send queues"""
+        return (
+            sum(state.memory_usage() for state in self.connections.values())
+            + sum(sys.getsizeof(members) for members in self.rooms.values())
+        )
+
     def get_rooms(self) -> List[str]:
         """Get a list of all active rooms"""
         return list(self.rooms.keys())
 
     def get_connection_rooms(self, websocket: WebSocket) -> Set[str]:
         """Get the rooms a specific connection is in"""
-        return self.connection_info.get(websocket, {}).get("rooms", set())
+        state = self.connections.get(websocket)
+        return state.rooms if state is not None else set()
+
+    def subscribe_stats(self, websocket: WebSocket):
+        """Send a connection stats snapshot now and deltas as rooms change"""
+        state = self.connections.get(websocket)
+        if state is not None and not self.stats.subscribe(state):
+            self.disconnect(websocket)
+
+    def unsubscribe_stats(self, websocket: WebSocket):
+        """Stop sending connection stats to a client"""
+        state = self.connections.get(websocket)
+        if state is not None:
+            self.stats.unsubscribe(state)
 
     async def send_connection_stats(self):
-        """Send connection statistics to all clients"""
-        stats = {
-            "type": "stats",
-            "total_connections": self.get_connection_count(),
-            "active_rooms": len(self.rooms),
-            "rooms": {room: len(connections) for room, connections in self.rooms.items()}
-        }
-        
-        await self.broadcast(stats)
\ No newline at end of file
+        """Send connection statistics to stats subscribers (coalesced with pending changes)"""
+        self.stats.changed()
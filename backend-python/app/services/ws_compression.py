@@ -0,0 +1,80 @@
+"""permessage-deflate for WebSockets with a size threshold.
+
+uvicorn's websockets protocol compresses every frame, including tiny echo
+and delta frames where zlib's header and the CPU spent outweigh the bytes
+saved. ``WebSocketProtocol`` here negotiates permessage-deflate with the
+level and window from the environment and sends messages below
+``WS_COMPRESSION_THRESHOLD`` bytes uncompressed (RFC 7692 lets each message
+choose via the RSV1 bit). Pass it to ``uvicorn.run(ws=...)``.
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol as UvicornWebSocketProtocol
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+
+
+def compression_settings() -> Dict[str, Any]:
+    """permessage-deflate settings from WS_PER_MESSAGE_DEFLATE and WS_COMPRESSION_*"""
+    return {
+        "enabled": os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true",
+        "threshold": int(os.getenv("WS_COMPRESSION_THRESHOLD", 512)),
+        "level": int(os.getenv("WS_COMPRESSION_LEVEL", 6)),
+        "max_window_bits": int(os.getenv("WS_COMPRESSION_MAX_WINDOW_BITS", 15)),
+    }
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """PerMessageDeflate that leaves messages smaller than threshold uncompressed"""
+
+    def __init__(self, threshold: int, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        # Set while sending the continuation frames of an uncompressed message
+        self.passthrough = False
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        if frame.opcode is not frames.OP_CONT:
+            self.passthrough = len(frame.data) < self.threshold
+        if self.passthrough:
+            return frame
+        return super().encode(frame)
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate like websockets, with the size threshold applied"""
+
+    def __init__(self, threshold: int, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def process_request_params(
+        self, params, accepted_extensions
+    ) -> Tuple[List[Tuple[str, Optional[str]]], PerMessageDeflate]:
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            self.threshold,
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+        )
+
+
+class WebSocketProtocol(UvicornWebSocketProtocol):
+    """uvicorn's websockets protocol with permessage-deflate tuned by compression_settings()"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        settings = compression_settings()
+        self.available_extensions = []
+        if settings["enabled"] and self.config.ws_per_message_deflate:
+            self.available_extensions.append(ThresholdDeflateFactory(
+                settings["threshold"],
+                server_max_window_bits=settings["max_window_bits"],
+                compress_settings={"level": settings["level"], "memLevel": 5},
+            ))
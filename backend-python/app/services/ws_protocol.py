@@ -0,0 +1,77 @@
+"""WebSocket subprotocols: JSON text frames or MessagePack binary frames.
+
+Clients pick a protocol with the ``Sec-WebSocket-Protocol`` header
+(``new WebSocket(url, ["msgpack", "json"])``); the first one offered that
+the server speaks is accepted, and connections that offer none use JSON.
+MessagePack frames are smaller and cheaper to encode than JSON for the
+numeric stats and broadcast payloads.
+"""
+from typing import Any, Dict, Optional, Sequence, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.services import json_codec
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is in requirements.txt
+    msgpack = None
+
+MSGPACK_AVAILABLE = msgpack is not None
+
+JSON = "json"
+MSGPACK = "msgpack"
+SUBPROTOCOLS = (JSON, MSGPACK) if MSGPACK_AVAILABLE else (JSON,)
+
+Frame = Union[str, bytes]
+
+
+def negotiate(offered: Sequence[str]) -> Optional[str]:
+    """First subprotocol offered by the client that we speak, or None"""
+    for subprotocol in offered:
+        if subprotocol in SUBPROTOCOLS:
+            return subprotocol
+    return None
+
+
+def encode(message: Any, protocol: str) -> Frame:
+    """Encode a message as a text frame (JSON) or a binary frame (MessagePack)"""
+    if protocol == MSGPACK:
+        return msgpack.packb(message, default=str)
+    return json_codec.dumps(message)
+
+
+def decode(data: Frame, protocol: str) -> Any:
+    if protocol == MSGPACK and isinstance(data, bytes):
+        return msgpack.unpackb(data, strict_map_key=False)
+    return json_codec.loads(data)
+
+
+async def receive_message(websocket: WebSocket, protocol: str) -> Dict[str, Any]:
+    """Receive and decode one client message (raises WebSocketDisconnect)"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("bytes")
+    return decode(data if data is not None else message["text"], protocol)
+
+
+class EncodedMessage:
+    """A message encoded at most once per protocol, however many recipients it has"""
+
+    __slots__ = ("message", "frames")
+
+    def __init__(self, message: Any = None, json_frame: Optional[str] = None):
+        self.message = message
+        self.frames: Dict[str, Frame] = {}
+        if json_frame is not None:
+            self.frames[JSON] = json_frame
+
+    def frame(self, protocol: str) -> Frame:
+        frame = self.frames.get(protocol)
+        if frame is None:
+            if self.message is None:
+                # Relayed from another worker as JSON
+                self.message = json_codec.loads(self.frames[JSON])
+            frame = self.frames[protocol] = encode(self.message, protocol)
+        return frame
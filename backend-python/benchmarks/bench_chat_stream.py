@@ -0,0 +1,70 @@
+"""Time-to-first-token benchmark for the Azure OpenAI chat endpoints.
+
+Serves the app with uvicorn against a local Azure OpenAI stub that streams
+one chunk per word, and compares when the first content reaches the caller
+through ``POST /api/azure/chat`` (whole completion) and
+``/api/azure/chat/stream`` (Server-Sent Events).
+
+Usage:
+    python -m benchmarks.bench_chat_stream --requests 20 --chunk-delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.stub_servers import StubServer, azure_openai_stub_app
+
+MESSAGE = "explain connection pooling in one short paragraph please"
+
+
+async def first_token_blocking(client: httpx.AsyncClient) -> float:
+    start = time.perf_counter()
+    response = await client.post("/api/azure/chat", json={"message": MESSAGE})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def first_token_streamed(client: httpx.AsyncClient) -> float:
+    start = time.perf_counter()
+    async with client.stream("POST", "/api/azure/chat/stream", json={"message": MESSAGE}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                return time.perf_counter() - start
+    raise RuntimeError("stream ended without data")
+
+
+async def run(base_url: str, requests: int):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        results = []
+        for name, measure in (("POST /chat", first_token_blocking), ("POST /chat/stream", first_token_streamed)):
+            samples = [await measure(client) for _ in range(requests)]
+            results.append((name, statistics.median(samples)))
+
+    print(f"time to first content, {requests} requests each")
+    for name, median in results:
+        print(f"{name:<20}{median * 1000:>10.1f} ms median")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    with StubServer(azure_openai_stub_app(chunk_delay=args.chunk_delay)) as azure:
+        os.environ["AZURE_AI_FOUNDRY_ENDPOINT"] = azure.url
+        os.environ.setdefault("AZURE_OPENAI_API_KEY", "stub")
+        from main import app
+
+        with StubServer(app, lifespan="on") as server:
+            asyncio.run(run(server.url, args.requests))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
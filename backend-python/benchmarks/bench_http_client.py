@@ -0,0 +1,78 @@
+"""Connection reuse benchmark for the pooled upstream clients.
+
+Calls a local GitHub stub server the old way (a fresh httpx.AsyncClient per
+call) and through the shared UpstreamClients pool, and reports throughput
+and mean latency for both.
+
+Usage:
+    python -m benchmarks.bench_http_client --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from app.services.http_clients import UpstreamClients
+from benchmarks.stub_servers import StubServer, github_stub_app
+
+
+async def fresh_client_call(base_url: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{base_url}/user", headers={"Authorization": "Bearer stub"})
+        response.raise_for_status()
+
+
+async def pooled_call(clients: UpstreamClients):
+    response = await clients.github.get("/user")
+    response.raise_for_status()
+
+
+async def drive(call, requests: int, concurrency: int):
+    latencies = []
+
+    async def worker(count: int):
+        for _ in range(count):
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, sum(latencies) / len(latencies)
+
+
+async def run(base_url: str, requests: int, concurrency: int):
+    os.environ["GITHUB_API_URL"] = base_url
+    os.environ.setdefault("GITHUB_TOKEN", "stub")
+    clients = UpstreamClients()
+
+    try:
+        results = [
+            ("fresh client per call", await drive(lambda: fresh_client_call(base_url), requests, concurrency)),
+            ("pooled UpstreamClients", await drive(lambda: pooled_call(clients), requests, concurrency)),
+        ]
+    finally:
+        await clients.aclose()
+
+    print(f"GET /user, {requests} requests, concurrency {concurrency}")
+    for name, (rps, mean) in results:
+        print(f"{name:<26}{rps:>10,.0f} req/s{mean * 1000:>10.2f} ms mean")
+    print(f"{'speedup':<26}{results[1][1][0] / results[0][1][0]:>10.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with StubServer(github_stub_app()) as server:
+        asyncio.run(run(server.url, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
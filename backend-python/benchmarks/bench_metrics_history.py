@@ -0,0 +1,88 @@
+"""Metrics history cost: recording a sample and downsampling a full tier.
+
+Fills a MetricsHistory with the default tiers (1 s for 10 min, 10 s for
+6 h, 1 min for 7 days) and ``--columns`` metrics, then times a query over
+the whole 7-day tier with the vectorized ``reduceat`` downsampling against
+the same averaging done slot by slot in Python.
+
+Usage:
+    python -m benchmarks.bench_metrics_history --columns 6 --points 500 --repeat 20
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from app.services.metrics_history import DEFAULT_TIERS, MetricsHistory, parse_tiers
+
+
+def python_downsample(tier, start: float, end: float, step: float) -> list:
+    """Per-slot loop equivalent of Tier.downsample(..., "avg")"""
+    buckets = int(math.ceil((end - start) / step))
+    columns = tier.sum.shape[1]
+    sums = [[0.0] * columns for _ in range(buckets)]
+    counts = [[0] * columns for _ in range(buckets)]
+    for position, slot in enumerate(tier.slot_ids.tolist()):
+        slot_start = slot * tier.step
+        if slot < 0 or not start <= slot_start < end:
+            continue
+        bucket = int((slot_start - start) // step)
+        row_sum = tier.sum[position].tolist()
+        row_count = tier.count[position].tolist()
+        for column in range(columns):
+            sums[bucket][column] += row_sum[column]
+            counts[bucket][column] += row_count[column]
+    return [
+        [s / c if c else math.nan for s, c in zip(row_sums, row_counts)]
+        for row_sums, row_counts in zip(sums, counts)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--columns", type=int, default=6)
+    parser.add_argument("--points", type=int, default=500, help="buckets returned by the query")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    names = [f"metric_{i}" for i in range(args.columns)]
+    history = MetricsHistory(names, parse_tiers(DEFAULT_TIERS))
+    coarsest = history.tiers[-1]
+    rng = np.random.default_rng(7)
+    now = time.time()
+
+    # One sample per coarse slot is enough to fill every tier's ring
+    samples = coarsest.slots
+    rows = rng.random((samples, args.columns)) * 100
+    start = time.perf_counter()
+    for i in range(samples):
+        history.record(now - (samples - i) * coarsest.step, dict(zip(names, rows[i].tolist())))
+    record = (time.perf_counter() - start) / samples
+    print(f"{len(history.tiers)} tiers, {args.columns} columns, {history.memory_usage() / 1e6:.1f} MB")
+    print(f"record: {record * 1e6:.1f} µs/sample")
+
+    query_start = coarsest.oldest()
+    query_end = now
+    step = math.ceil((query_end - query_start) / args.points / coarsest.step) * coarsest.step
+    query_start = math.floor(query_start / step) * step
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        vectorized = coarsest.downsample(query_start, query_end, step, "avg")
+    vectorized_time = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        looped = python_downsample(coarsest, query_start, query_end, step)
+    looped_time = (time.perf_counter() - start) / args.repeat
+
+    assert np.allclose(vectorized, np.array(looped), equal_nan=True)
+    print(f"downsample {coarsest.slots:,} slots to {vectorized.shape[0]} points:")
+    print(f"  python loop  {looped_time * 1000:8.2f} ms")
+    print(f"  reduceat     {vectorized_time * 1000:8.2f} ms  ({looped_time / vectorized_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Requests-per-second benchmark for the security and rate limit middleware.
+
+Drives a FastAPI app directly through its ASGI interface (no sockets, no
+HTTP parsing) so the numbers isolate framework and middleware overhead.
+Compares the pure ASGI middleware against the previous BaseHTTPMiddleware
+implementations.
+
+Usage:
+    python -m benchmarks.bench_middleware --requests 20000 --path /health
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.rate_limiter import RateLimitMiddleware
+from app.middleware.security import SecurityMiddleware
+from app.services.rate_limit_engine import create_rate_limiter
+
+
+class LegacySecurityMiddleware(BaseHTTPMiddleware):
+    """The previous SecurityMiddleware: headers rebuilt on every call"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        if os.getenv("ENVIRONMENT") == "production":
+            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        csp = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'; connect-src 'self' ws: wss:;"
+        response.headers["Content-Security-Policy"] = csp
+        response.headers["X-Process-Time"] = str(time.time() - start_time)
+        return response
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """The previous RateLimitMiddleware wrapper around the same engine"""
+
+    def __init__(self, app, requests_per_minute: int = 300):
+        super().__init__(app)
+        self.limiter = create_rate_limiter(requests_per_minute, 60, backend="memory")
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in ["/health", "/docs", "/redoc", "/openapi.json"]:
+            return await call_next(request)
+        result = await self.limiter.acquire(request.client.host)
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+        response.headers["X-RateLimit-Reset"] = str(int(time.time() + result.reset_after))
+        return response
+
+
+def build_app(security_class, rate_limit_class) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health_check():
+        return {
+            "status": "ok",
+            "timestamp": datetime.utcnow().isoformat(),
+            "version": "1.0.0",
+        }
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"pong": True}
+
+    app.add_middleware(security_class)
+    # A huge limit keeps every request on the allowed path
+    app.add_middleware(rate_limit_class, requests_per_minute=10**9)
+    return app
+
+
+async def drive(app, path: str, requests: int, concurrency: int) -> float:
+    """Issue requests through the ASGI interface and return requests/second"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"x-forwarded-for", b"10.0.0.1")],
+        "client": ("10.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def worker(count: int):
+        for _ in range(count):
+            body_sent = False
+            response_complete = asyncio.Event()
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                # Like uvicorn: report a disconnect once the response is done
+                await response_complete.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start" and message["status"] != 200:
+                    raise RuntimeError(f"unexpected status {message['status']}")
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    response_complete.set()
+
+            await app(dict(scope), receive, send)
+
+    # Warm up (builds the middleware stack)
+    await worker(200)
+
+    per_worker = requests // concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    return per_worker * concurrency / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--path", default="/health", help="/health (exempt) or /api/ping (rate limited)")
+    args = parser.parse_args(argv)
+
+    variants = [
+        ("BaseHTTPMiddleware (before)", LegacySecurityMiddleware, LegacyRateLimitMiddleware),
+        ("pure ASGI (after)", SecurityMiddleware, RateLimitMiddleware),
+    ]
+
+    print(f"GET {args.path}, {args.requests} requests, concurrency {args.concurrency}")
+    results = []
+    for name, security_class, rate_limit_class in variants:
+        app = build_app(security_class, rate_limit_class)
+        rps = asyncio.run(drive(app, args.path, args.requests, args.concurrency))
+        results.append(rps)
+        print(f"{name:<30}{rps:>12,.0f} req/s")
+
+    print(f"{'speedup':<30}{results[1] / results[0]:>12.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
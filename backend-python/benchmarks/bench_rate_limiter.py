@@ -0,0 +1,92 @@
+"""Microbenchmark for the rate limiting engines.
+
+Compares the O(1) engines in app.services.rate_limit_engine against the
+original per-IP timestamp list implementation of RateLimitMiddleware.
+
+Usage:
+    python -m benchmarks.bench_rate_limiter --clients 20000 --requests 300000
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from app.services.rate_limit_engine import RATE_LIMIT_ALGORITHMS
+
+
+class LegacyListLimiter:
+    """The original implementation: one float per request per client"""
+
+    algorithm = "legacy_list"
+
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.requests = defaultdict(list)
+
+    def hit(self, key: str, now: float):
+        window_start = now - self.window
+        recent_requests = [t for t in self.requests[key] if t > window_start]
+        self.requests[key] = recent_requests
+        allowed = len(recent_requests) < self.limit
+        if allowed:
+            recent_requests.append(now)
+        return allowed
+
+
+def replay(limiter, keys, duration: float):
+    """Replay the key sequence spread evenly over duration seconds"""
+    step = duration / len(keys)
+    now = 1_700_000_000.0
+    for key in keys:
+        limiter.hit(key, now)
+        now += step
+
+
+def run(limiter_class, limit: int, keys, duration: float):
+    """Return (seconds, peak traced bytes) for replaying keys"""
+    start = time.perf_counter()
+    replay(limiter_class(limit, 60.0), keys, duration)
+    elapsed = time.perf_counter() - start
+
+    # Measure memory in a separate pass so tracing doesn't skew the timing
+    tracemalloc.start()
+    replay(limiter_class(limit, 60.0), keys, duration)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20_000, help="distinct client keys")
+    parser.add_argument("--requests", type=int, default=300_000, help="total requests replayed")
+    parser.add_argument("--limit", type=int, default=300, help="requests per minute per client")
+    parser.add_argument("--hot", type=float, default=0.2, help="share of traffic from one NAT'd IP")
+    parser.add_argument("--duration", type=float, default=60.0, help="simulated seconds")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    clients = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.clients)]
+    keys = [
+        clients[0] if rng.random() < args.hot else rng.choice(clients)
+        for _ in range(args.requests)
+    ]
+
+    limiters = [LegacyListLimiter, *RATE_LIMIT_ALGORITHMS.values()]
+    print(f"{'engine':<16}{'ns/check':>12}{'checks/s':>14}{'peak MiB':>12}")
+    for limiter_class in limiters:
+        elapsed, peak = run(limiter_class, args.limit, keys, args.duration)
+        print(
+            f"{limiter_class.algorithm:<16}"
+            f"{elapsed / len(keys) * 1e9:>12.0f}"
+            f"{len(keys) / elapsed:>14,.0f}"
+            f"{peak / 2**20:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Vector index benchmark.
+
+Compares a per-document Python cosine loop with the vectorized NumPy top-k
+search, and the startup cost of loading a saved index from JSON lists
+against opening the memory-mapped ``.npy`` file. Vectors come from the
+deterministic HashingEmbedder, so runs are reproducible.
+
+Usage:
+    python -m benchmarks.bench_vector_index --documents 20000 --queries 50
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_index import HashingEmbedder, VectorIndex
+
+WORDS = "rate limit cache redis stream token socket room broadcast vector search index embedding model chat".split()
+
+
+def corpus(count: int):
+    rng = np.random.default_rng(7)
+    return [" ".join(rng.choice(WORDS, size=8)) for _ in range(count)]
+
+
+def python_search(vectors, query, k):
+    query_norm = math.sqrt(sum(q * q for q in query))
+    scores = []
+    for row, vector in enumerate(vectors):
+        dot = sum(a * b for a, b in zip(vector, query))
+        norm = math.sqrt(sum(a * a for a in vector))
+        scores.append((dot / (norm * query_norm), row))
+    return sorted(scores, reverse=True)[:k]
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--python-documents", type=int, default=2000,
+                        help="documents used for the (slow) pure Python baseline")
+    args = parser.parse_args(argv)
+
+    embedder = HashingEmbedder(args.dimensions)
+    texts = corpus(args.documents)
+    vectors = embedder.embed(texts)
+    query = embedder.embed(["redis rate limit cache"])[0]
+
+    index = VectorIndex()
+    index.add([str(i) for i in range(len(texts))], vectors, [{"text": t} for t in texts])
+
+    python_vectors = vectors[:args.python_documents].tolist()
+    python_query = query.tolist()
+    python_time = timed(lambda: python_search(python_vectors, python_query, 10), 1)
+    numpy_time = timed(lambda: index.search(query, 10), args.queries)
+
+    print(f"top-10 cosine search, {args.dimensions} dimensions")
+    print(f"{'python loop':<28}{python_time * 1000:>10.2f} ms/query ({args.python_documents:,} documents)")
+    print(f"{'numpy + argpartition':<28}{numpy_time * 1000:>10.2f} ms/query ({args.documents:,} documents)")
+    per_doc_speedup = (python_time / args.python_documents) / (numpy_time / args.documents)
+    print(f"{'per-document speedup':<28}{per_doc_speedup:>10.0f}x")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index")
+        index.save(path)
+        json_path = os.path.join(directory, "index_lists.json")
+        with open(json_path, "w") as f:
+            json.dump(vectors.tolist(), f)
+
+        def load_json():
+            with open(json_path) as f:
+                np.array(json.load(f), dtype=np.float32)
+
+        json_time = timed(load_json, 1)
+        mmap_time = timed(lambda: VectorIndex.load(path), 3)
+
+    print(f"\nloading {args.documents:,} vectors")
+    print(f"{'JSON lists':<28}{json_time * 1000:>10.1f} ms")
+    print(f"{'memory-mapped .npy':<28}{mmap_time * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
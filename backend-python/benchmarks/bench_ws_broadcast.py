@@ -0,0 +1,128 @@
+"""Room broadcast latency benchmark with slow WebSocket clients.
+
+Fills a room with in-memory fake sockets, a fraction of which take
+``--slow-delay`` seconds per send (a congested mobile client), and measures
+how long ``broadcast_to_room`` blocks the caller and how long it takes for
+every fast client to receive the frame: the old serial ``await send_json``
+loop against the per-connection send queues in WebSocketManager.
+
+Usage:
+    python -m benchmarks.bench_ws_broadcast --sizes 100 1000 10000 --slow-fraction 0.01
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import time
+
+from app.services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """Just enough of starlette's WebSocket for the manager"""
+
+    def __init__(self, delay: float, tracker: "DeliveryTracker"):
+        self.delay = delay
+        self.tracker = tracker
+
+    scope = {"subprotocols": []}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_json(self, message):
+        await self.send_text(message)
+
+    async def send_text(self, frame):
+        # A real send always yields to the event loop at least once
+        await asyncio.sleep(self.delay)
+        if not self.delay:
+            self.tracker.delivered()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class DeliveryTracker:
+    """Signals when every fast client has received the current frame"""
+
+    def __init__(self):
+        self.expected = 0
+        self.count = 0
+        self.done = asyncio.Event()
+
+    def reset(self, expected: int):
+        self.expected = expected
+        self.count = 0
+        self.done.clear()
+
+    def delivered(self):
+        self.count += 1
+        if self.count >= self.expected:
+            self.done.set()
+
+
+class LegacyManager:
+    """The previous broadcast_to_room: one awaited send per member, in turn"""
+
+    def __init__(self):
+        self.rooms = {}
+
+    async def broadcast_to_room(self, room, message, exclude=None):
+        for connection in self.rooms[room]:
+            if connection != exclude:
+                await connection.send_json(message)
+
+
+async def measure(manager, room_size: int, slow_count: int, slow_delay: float, tracker: DeliveryTracker):
+    fast_count = room_size - slow_count
+    tracker.reset(fast_count)
+    start = time.perf_counter()
+    await manager.broadcast_to_room("bench", {"type": "broadcast", "message": "hello"})
+    blocked = time.perf_counter() - start
+    await tracker.done.wait()
+    fast_delivery = time.perf_counter() - start
+    return blocked, fast_delivery
+
+
+async def run(sizes, slow_fraction: float, slow_delay: float):
+    print(f"room broadcast, {slow_fraction:.1%} slow clients at {slow_delay * 1000:.0f} ms/send")
+    print(f"{'members':>8}  {'manager':<14}{'caller blocked':>16}{'all fast clients':>18}")
+
+    for size in sizes:
+        slow_count = max(1, int(size * slow_fraction))
+        for name in ("serial await", "send queues"):
+            tracker = DeliveryTracker()
+            sockets = [FakeWebSocket(slow_delay if i < slow_count else 0.0, tracker) for i in range(size)]
+
+            if name == "serial await":
+                manager = LegacyManager()
+                manager.rooms["bench"] = sockets
+            else:
+                manager = WebSocketManager(send_queue_size=256)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for websocket in sockets:
+                        await manager.connect(websocket)
+                        manager.join_room(websocket, "bench")
+
+            blocked, fast_delivery = await measure(manager, size, slow_count, slow_delay, tracker)
+            print(f"{size:>8}  {name:<14}{blocked * 1000:>13.1f} ms{fast_delivery * 1000:>15.1f} ms")
+
+            if isinstance(manager, WebSocketManager):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for websocket in sockets:
+                        manager.disconnect(websocket)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--slow-fraction", type=float, default=0.01)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.sizes, args.slow_fraction, args.slow_delay))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""WebSocket connect/disconnect churn: list registry vs. ConnectionState registry.
+
+Opens ``--connections`` fake sockets (each in a couple of rooms), then
+disconnects and reconnects ``--churn`` random ones, as in a reconnect
+storm. The old WebSocketManager kept connections in a list, so every
+disconnect paid an O(n) membership test and ``remove``, with metadata in a
+dict of dicts keyed by socket. The current registry is a dict of slotted
+ConnectionState records. Also reports traced memory per connection.
+
+Usage:
+    python -m benchmarks.bench_ws_churn --connections 1000 10000 50000 --churn 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from app.services.connection_writer import OVERFLOW_POLICIES, ConnectionWriter
+from app.services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    scope = {"subprotocols": []}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class LegacyManager:
+    """The previous connect/join/disconnect bookkeeping"""
+
+    def __init__(self):
+        self.active_connections = []
+        self.rooms = {}
+        self.connection_info = {}
+        self.writers = {}
+        self.dropped_messages = {policy: 0 for policy in OVERFLOW_POLICIES}
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+        self.writers[websocket] = ConnectionWriter(websocket, 256, "drop_oldest", self.dropped_messages, self.disconnect)
+        self.connection_info[websocket] = {"connected_at": asyncio.get_event_loop().time(), "rooms": set()}
+
+    def disconnect(self, websocket):
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        writer = self.writers.pop(websocket, None)
+        if writer is not None:
+            writer.close()
+        if websocket in self.connection_info:
+            for room in self.connection_info[websocket]["rooms"].copy():
+                self.leave_room(websocket, room)
+            del self.connection_info[websocket]
+
+    def join_room(self, websocket, room):
+        self.rooms.setdefault(room, set()).add(websocket)
+        self.connection_info[websocket]["rooms"].add(room)
+
+    def leave_room(self, websocket, room):
+        if room in self.rooms and websocket in self.rooms[room]:
+            self.rooms[room].remove(websocket)
+            if not self.rooms[room]:
+                del self.rooms[room]
+        self.connection_info[websocket]["rooms"].discard(room)
+
+
+async def open_connection(manager, websocket, index: int, rooms: int):
+    await manager.connect(websocket)
+    manager.join_room(websocket, "lobby")
+    manager.join_room(websocket, f"room-{index % rooms}")
+
+
+async def run_one(manager, size: int, churn: int, rooms: int):
+    sockets = [FakeWebSocket() for _ in range(size)]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for index, websocket in enumerate(sockets):
+        await open_connection(manager, websocket, index, rooms)
+    per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / size
+    tracemalloc.stop()
+
+    rng = random.Random(42)
+    victims = [rng.randrange(size) for _ in range(churn)]
+    start = time.perf_counter()
+    for index in victims:
+        manager.disconnect(sockets[index])
+        sockets[index] = FakeWebSocket()
+        await open_connection(manager, sockets[index], index, rooms)
+    elapsed = time.perf_counter() - start
+
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    # Let the cancelled writer tasks finish
+    await asyncio.sleep(0)
+    return elapsed / churn, per_connection
+
+
+async def run(sizes, churn: int, rooms: int):
+    print(f"{churn:,} disconnect+reconnect cycles, each connection in 'lobby' and one of {rooms} rooms")
+    print(f"{'connections':>11}  {'registry':<18}{'per cycle':>12}{'memory/conn':>14}")
+
+    for size in sizes:
+        for name, factory in (("list (previous)", LegacyManager), ("ConnectionState", WebSocketManager)):
+            # The manager prints per connection; discard it without buffering
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                per_cycle, per_connection = await run_one(factory(), size, churn, rooms)
+            print(f"{size:>11,}  {name:<18}{per_cycle * 1e6:>9.1f} µs{per_connection:>11,.0f} B")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--churn", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=100)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.connections, args.churn, args.rooms))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
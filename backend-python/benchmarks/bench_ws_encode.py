@@ -0,0 +1,104 @@
+"""CPU cost per WebSocket broadcast: encode per recipient vs. encode once.
+
+The old broadcast called ``send_json`` for every recipient, serializing the
+same dict with the stdlib ``json`` module each time. WebSocketManager now
+encodes the frame once (orjson when installed) and queues the same string
+for every connection. This measures process CPU time per broadcast of a
+stats-sized payload until every fake socket has been handed its frame.
+
+Usage:
+    python -m benchmarks.bench_ws_encode --recipients 1000 10000 50000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+
+from app.services.json_codec import ORJSON_AVAILABLE
+from app.services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """Counts delivered bytes; send_json encodes like starlette's WebSocket"""
+
+    def __init__(self, counter: list):
+        self.counter = counter
+
+    scope = {"subprotocols": []}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def send_text(self, frame: str):
+        self.counter[0] += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def payload(rooms: int = 200) -> dict:
+    return {
+        "type": "stats",
+        "total_connections": 50000,
+        "active_rooms": rooms,
+        "rooms": {f"room-{i}": i * 7 for i in range(rooms)},
+        "timestamp": "2024-01-01T00:00:00",
+    }
+
+
+async def legacy_broadcast(sockets, message):
+    for websocket in sockets:
+        await websocket.send_json(message)
+
+
+async def cpu_per_broadcast(broadcast, counter: list, expected: int, repeat: int) -> float:
+    total = 0.0
+    for _ in range(repeat):
+        counter[0] = 0
+        start = time.process_time()
+        await broadcast()
+        while counter[0] < expected:
+            await asyncio.sleep(0)
+        total += time.process_time() - start
+    return total / repeat
+
+
+async def run(sizes, repeat: int):
+    message = payload()
+    encoder = "orjson" if ORJSON_AVAILABLE else "json (orjson not installed)"
+    print(f"broadcast of a {len(json.dumps(message)):,}-byte stats frame; encode-once uses {encoder}")
+    print(f"{'recipients':>10}{'send_json each':>18}{'encode once':>16}{'speedup':>10}")
+
+    for size in sizes:
+        counter = [0]
+        sockets = [FakeWebSocket(counter) for _ in range(size)]
+        legacy = await cpu_per_broadcast(lambda: legacy_broadcast(sockets, message), counter, size, repeat)
+
+        manager = WebSocketManager(send_queue_size=256)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for websocket in sockets:
+                await manager.connect(websocket)
+        encoded = await cpu_per_broadcast(lambda: manager.broadcast(message), counter, size, repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for websocket in sockets:
+                manager.disconnect(websocket)
+
+        print(f"{size:>10,}{legacy * 1000:>15.1f} ms{encoded * 1000:>13.1f} ms{legacy / encoded:>9.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.recipients, args.repeat))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Bytes on the wire and server CPU per WebSocket frame, by protocol and compression.
+
+Encodes a stream of typical frames (connection stats, chat broadcasts and
+``ai_delta`` tokens) the way the server sends them: JSON text or MessagePack
+binary, optionally through permessage-deflate with context takeover, and
+with ``ThresholdPerMessageDeflate`` leaving frames under the threshold
+uncompressed. Wire bytes include the WebSocket frame header.
+
+Usage:
+    python -m benchmarks.bench_ws_protocol --frames 20000 --threshold 512 --level 6
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from websockets import frames
+
+from app.services import ws_protocol
+from app.services.ws_compression import ThresholdPerMessageDeflate
+
+
+def stats_frame(index: int, rooms: int = 50) -> dict:
+    return {
+        "type": "stats",
+        "total_connections": 12000 + index % 97,
+        "active_rooms": rooms,
+        "rooms": {f"room-{i}": (index * 7 + i) % 500 for i in range(rooms)},
+        "timestamp": datetime(2024, 1, 1).isoformat(),
+    }
+
+
+def broadcast_frame(index: int) -> dict:
+    return {
+        "type": "broadcast",
+        "message": f"message number {index} from the load test",
+        "sender_id": 1000 + index % 50,
+        "timestamp": datetime(2024, 1, 1).isoformat(),
+    }
+
+
+def delta_frame(index: int) -> dict:
+    return {"type": "ai_delta", "request_id": f"req-{index % 8}", "delta": " token"}
+
+
+WORKLOADS = {"stats": stats_frame, "broadcast": broadcast_frame, "ai_delta": delta_frame}
+
+
+def header_size(length: int) -> int:
+    # Server frames are unmasked: 2 bytes, plus 2 or 8 for extended lengths
+    return 2 if length < 126 else 4 if length < 65536 else 10
+
+
+def run_mode(messages, protocol: str, threshold, level: int):
+    deflate = None
+    if threshold is not None:
+        deflate = ThresholdPerMessageDeflate(threshold, False, False, 15, 15, {"level": level, "memLevel": 5})
+    opcode = frames.OP_BINARY if protocol == ws_protocol.MSGPACK else frames.OP_TEXT
+
+    wire = 0
+    start = time.process_time()
+    for message in messages:
+        data = ws_protocol.encode(message, protocol)
+        if isinstance(data, str):
+            data = data.encode()
+        if deflate is not None:
+            data = deflate.encode(frames.Frame(opcode, data)).data
+        wire += header_size(len(data)) + len(data)
+    cpu = time.process_time() - start
+    return wire / len(messages), cpu / len(messages)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--threshold", type=int, default=512)
+    parser.add_argument("--level", type=int, default=6)
+    args = parser.parse_args(argv)
+
+    modes = [
+        ("json", ws_protocol.JSON, None),
+        ("json+deflate", ws_protocol.JSON, 0),
+        (f"json+deflate>={args.threshold}", ws_protocol.JSON, args.threshold),
+        ("msgpack", ws_protocol.MSGPACK, None),
+        ("msgpack+deflate", ws_protocol.MSGPACK, 0),
+        (f"msgpack+deflate>={args.threshold}", ws_protocol.MSGPACK, args.threshold),
+    ]
+    print(f"{args.frames:,} frames per workload, deflate level {args.level}")
+    print(f"{'workload':<10}{'mode':<24}{'bytes/frame':>12}{'CPU/frame':>12}")
+    for name, factory in WORKLOADS.items():
+        messages = [factory(index) for index in range(args.frames)]
+        for label, protocol, threshold in modes:
+            size, cpu = run_mode(messages, protocol, threshold, args.level)
+            print(f"{name:<10}{label:<24}{size:>10,.0f} B{cpu * 1e6:>9.2f} µs")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Connection stats stream cost: full broadcast per change vs. throttled deltas.
+
+Connects ``--connections`` fake sockets spread over ``--rooms`` rooms, then
+applies ``--events`` random join/leave events spread over ``--seconds``.
+The old approach rebuilt the full ``{room: count}`` map and broadcast it to
+every connection after each change; StatsStream sends subscribers one
+snapshot, then at most one delta of changed rooms per interval. Reports
+process CPU time and bytes handed to the sockets.
+
+Usage:
+    python -m benchmarks.bench_ws_stats --connections 2000 --rooms 500 --events 1000 --seconds 1
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import time
+
+from app.services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    scope = {"subprotocols": []}
+
+    def __init__(self, counter: list):
+        self.counter = counter
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        self.counter[0] += len(frame)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def legacy_send_connection_stats(manager: WebSocketManager):
+    """The previous send_connection_stats: full map to every connection"""
+    await manager.broadcast({
+        "type": "stats",
+        "total_connections": manager.get_connection_count(),
+        "active_rooms": len(manager.rooms),
+        "rooms": {room: len(connections) for room, connections in manager.rooms.items()},
+    })
+
+
+async def run_one(mode: str, connections: int, rooms: int, events: int, seconds: float, interval: float):
+    counter = [0]
+    manager = WebSocketManager(send_queue_size=100000, stats_interval=interval)
+    sockets = [FakeWebSocket(counter) for _ in range(connections)]
+    for index, websocket in enumerate(sockets):
+        await manager.connect(websocket)
+        manager.join_room(websocket, f"room-{index % rooms}")
+    if mode == "throttled deltas":
+        for websocket in sockets:
+            manager.subscribe_stats(websocket)
+    await asyncio.sleep(0.05)
+
+    rng = random.Random(7)
+    counter[0] = 0
+    start = time.process_time()
+    for _ in range(events):
+        websocket = rng.choice(sockets)
+        room = f"room-{rng.randrange(rooms)}"
+        if room in manager.get_connection_rooms(websocket):
+            manager.leave_room(websocket, room)
+        else:
+            manager.join_room(websocket, room)
+        if mode == "full broadcast":
+            await legacy_send_connection_stats(manager)
+        await asyncio.sleep(seconds / events)
+    # Let the last delta and the writers drain
+    await asyncio.sleep(interval + 0.05)
+    while manager.get_send_queue_depths()["total"]:
+        await asyncio.sleep(0.01)
+    cpu = time.process_time() - start
+
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    return cpu, counter[0]
+
+
+async def run(connections: int, rooms: int, events: int, seconds: float, interval: float):
+    print(f"{connections:,} connections, {rooms} rooms, {events:,} membership changes over {seconds:g} s")
+    print(f"{'mode':<18}{'CPU':>10}{'bytes sent':>16}")
+    for mode in ("full broadcast", "throttled deltas"):
+        # The manager prints per connection; discard it without buffering
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            cpu, sent = await run_one(mode, connections, rooms, events, seconds, interval)
+        print(f"{mode:<18}{cpu:>8.2f} s{sent / 1e6:>13,.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--interval", type=float, default=0.5, help="stats interval in seconds")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.connections, args.rooms, args.events, args.seconds, args.interval))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
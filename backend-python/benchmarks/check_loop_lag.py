@@ -0,0 +1,108 @@
+"""Event-loop lag while /api/system/health is hammered: sampled snapshot vs. inline psutil.
+
+Runs the app in-process over httpx's ASGI transport next to a ticker task
+that sleeps ``--tick`` ms and records how late it wakes up. The legacy
+handler called ``psutil.cpu_percent(interval=1)`` and ``disk_usage`` on the
+loop, stalling every other request and WebSocket for a second per health
+check; the current one reads the background sampler's snapshot. Exits with
+status 1 if the sampled handler's p99 lag exceeds ``--max-lag`` ms.
+
+Usage:
+    python -m benchmarks.check_loop_lag --requests 200 --concurrency 10 --max-lag 20
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+import psutil
+from fastapi import FastAPI
+
+from main import app
+
+
+async def legacy_health():
+    """The previous handler body: blocking psutil calls on the event loop"""
+    return {
+        "cpu_percent": psutil.cpu_percent(interval=1),
+        "memory_percent": psutil.virtual_memory().percent,
+        "disk_percent": psutil.disk_usage("/").used / psutil.disk_usage("/").total * 100,
+    }
+
+
+def legacy_app() -> FastAPI:
+    legacy = FastAPI()
+    legacy.get("/api/system/health")(legacy_health)
+    return legacy
+
+
+async def ticker(lags: list, tick: float, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(tick)
+        lags.append(time.perf_counter() - start - tick)
+
+
+async def measure(target, requests: int, concurrency: int, tick: float):
+    lags = []
+    stop = asyncio.Event()
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=target)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def check():
+            async with semaphore:
+                response = await client.get("/api/system/health")
+                response.raise_for_status()
+
+        tick_task = asyncio.create_task(ticker(lags, tick, stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(check() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await tick_task
+    return lags, elapsed
+
+
+def report(label: str, lags: list, elapsed: float, requests: int) -> float:
+    lags = sorted(lags) or [0.0]
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+    print(
+        f"{label:<10}{requests / elapsed:>10,.1f}/s"
+        f"{statistics.median(lags) * 1000:>10.2f} ms{p99 * 1000:>10.2f} ms{lags[-1] * 1000:>10.2f} ms"
+    )
+    return p99
+
+
+async def run(requests: int, legacy_requests: int, concurrency: int, tick: float, max_lag: float) -> int:
+    print(f"{'handler':<10}{'req rate':>12}{'p50 lag':>13}{'p99 lag':>13}{'max lag':>13}")
+    if legacy_requests:
+        lags, elapsed = await measure(legacy_app(), legacy_requests, concurrency, tick)
+        report("inline", lags, elapsed, legacy_requests)
+
+    async with app.router.lifespan_context(app):
+        lags, elapsed = await measure(app, requests, concurrency, tick)
+    p99 = report("sampled", lags, elapsed, requests)
+
+    if p99 * 1000 > max_lag:
+        print(f"FAIL: p99 loop lag {p99 * 1000:.2f} ms exceeds {max_lag:g} ms")
+        return 1
+    print(f"OK: p99 loop lag within {max_lag:g} ms")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--legacy-requests", type=int, default=3, help="each takes a second; 0 to skip")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--tick", type=float, default=5.0, help="ticker interval in ms")
+    parser.add_argument("--max-lag", type=float, default=20.0, help="allowed p99 lag in ms")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.requests, args.legacy_requests, args.concurrency, args.tick / 1000, args.max_lag))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
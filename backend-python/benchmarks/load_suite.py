@@ -0,0 +1,376 @@
+"""Load suite: boots the server against stub upstreams and compares latency with a baseline.
+
+Starts the GitHub and Azure OpenAI stubs from ``stub_servers``, runs
+``python main.py`` (the production entry point, with the compressed
+WebSocket protocol) in a subprocess pointed at them, and drives:
+
+- ``rest_*``: GET /health, /api/system/health, /api/github/user and
+  /api/github/repos, each request from a different client address
+- ``rate_limit``: one client hammering /api/system/info far past its limit
+- ``ws_churn``: connect, read the welcome frame, close
+- ``ws_broadcast``: one client's chat messages fanned out to every other
+  connection; latency is send to receipt at each receiver
+- ``ai_chat``: concurrent POST /api/azure/chat against the streaming stub
+
+Each workload reports throughput and p50/p95/p99 latency. Results are
+compared with ``benchmarks/baseline.json``: a p99 more than ``--tolerance``
+above the baseline, or throughput that much below it, is a regression and
+makes the suite exit 1. Baselines are machine specific; record one with
+``--update-baseline`` on the machine that runs the comparison. A baseline
+marked ``"placeholder": true`` (like the committed one) is only printed
+alongside, never failed against.
+
+Usage:
+    python -m benchmarks.load_suite
+    python -m benchmarks.load_suite --only ws_churn,ai_chat --scale 0.5
+    python -m benchmarks.load_suite --update-baseline
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+from benchmarks.stub_servers import StubServer, azure_openai_stub_app, free_port, github_stub_app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# Operations and concurrency per workload at --scale 1
+WORKLOADS = {
+    "rest": {"requests": 2000, "concurrency": 32},
+    "rate_limit": {"requests": 3000, "concurrency": 32},
+    "ws_churn": {"connections": 500, "concurrency": 16},
+    "ws_broadcast": {"subscribers": 200, "messages": 50, "interval": 0.01},
+    "ai_chat": {"requests": 200, "concurrency": 32},
+}
+
+REST_ENDPOINTS = {
+    "rest_health": "/health",
+    "rest_system_health": "/api/system/health",
+    "rest_github_user": "/api/github/user",
+    "rest_github_repos": "/api/github/repos?limit=30",
+}
+
+# Differences below this are noise whatever the tolerance says
+MIN_P99_DELTA_MS = 2.0
+
+
+class Result:
+    """Latencies and outcome counts of one workload"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self.extra: Dict[str, float] = {}
+
+    def summary(self) -> Dict[str, float]:
+        latencies = np.array(self.latencies or [0.0]) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            "operations": len(self.latencies),
+            "errors": self.errors,
+            "throughput": round(len(self.latencies) / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            **self.extra,
+        }
+
+
+async def drive(operations: int, concurrency: int, operation: Callable[[int], Awaitable[bool]]) -> Result:
+    """Run ``operation(i)`` for i in range(operations), ``concurrency`` at a time, timing each"""
+    result = Result()
+    counter = itertools.count()
+
+    async def worker():
+        for index in iter(lambda: next(counter), None):
+            if index >= operations:
+                return
+            start = time.perf_counter()
+            try:
+                ok = await operation(index)
+            except Exception:
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - start)
+            else:
+                result.errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def client_address(index: int) -> str:
+    return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+
+async def run_rest(base_url: str, scale: float) -> Dict[str, Result]:
+    config = WORKLOADS["rest"]
+    operations = max(1, int(config["requests"] * scale))
+    limits = httpx.Limits(max_connections=config["concurrency"], max_keepalive_connections=config["concurrency"])
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        addresses = itertools.count()
+        for name, path in REST_ENDPOINTS.items():
+            async def get(index: int, path=path) -> bool:
+                # A fresh client address per request keeps these under the rate limit
+                response = await client.get(path, headers={"X-Forwarded-For": client_address(next(addresses))})
+                return response.status_code == 200
+
+            results[name] = await drive(operations, config["concurrency"], get)
+    return results
+
+
+async def run_rate_limit(base_url: str, scale: float) -> Dict[str, Result]:
+    config = WORKLOADS["rate_limit"]
+    limits = httpx.Limits(max_connections=config["concurrency"], max_keepalive_connections=config["concurrency"])
+    rejected = 0
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def get(index: int) -> bool:
+            nonlocal rejected
+            response = await client.get("/api/system/info", headers={"X-Forwarded-For": "203.0.113.7"})
+            rejected += response.status_code == 429
+            return response.status_code in (200, 429)
+
+        result = await drive(max(1, int(config["requests"] * scale)), config["concurrency"], get)
+    result.extra["rejected_fraction"] = round(rejected / max(1, len(result.latencies)), 3)
+    return {"rate_limit": result}
+
+
+async def run_ws_churn(ws_url: str, scale: float) -> Dict[str, Result]:
+    config = WORKLOADS["ws_churn"]
+
+    async def churn(index: int) -> bool:
+        async with websockets.connect(ws_url) as websocket:
+            welcome = json.loads(await websocket.recv())
+            return welcome.get("type") == "welcome"
+
+    return {"ws_churn": await drive(max(1, int(config["connections"] * scale)), config["concurrency"], churn)}
+
+
+async def run_ws_broadcast(ws_url: str, scale: float) -> Dict[str, Result]:
+    config = WORKLOADS["ws_broadcast"]
+    subscribers = max(1, int(config["subscribers"] * scale))
+    messages = max(1, int(config["messages"] * scale))
+    expected = subscribers * messages
+    result = Result()
+    received = 0
+    done = asyncio.Event()
+
+    async def receive(websocket):
+        nonlocal received
+        async for frame in websocket:
+            data = json.loads(frame)
+            if data.get("type") != "broadcast" or not data["message"].startswith("bench:"):
+                continue
+            result.latencies.append(time.perf_counter() - float(data["message"][6:]))
+            received += 1
+            if received >= expected:
+                done.set()
+
+    sockets = []
+    try:
+        for index in range(subscribers):
+            websocket = await websockets.connect(ws_url)
+            await websocket.recv()
+            await websocket.send(json.dumps({"type": "join_room", "room": f"bench-{index % 10}"}))
+            sockets.append(websocket)
+        readers = [asyncio.create_task(receive(websocket)) for websocket in sockets]
+
+        async with websockets.connect(ws_url) as sender:
+            await sender.recv()
+            # Let the joins settle before timing anything
+            await asyncio.sleep(0.5)
+            start = time.perf_counter()
+            for _ in range(messages):
+                await sender.send(json.dumps({"type": "message", "message": f"bench:{time.perf_counter()}"}))
+                await asyncio.sleep(config["interval"])
+            try:
+                await asyncio.wait_for(done.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                pass
+            result.elapsed = time.perf_counter() - start
+        for reader in readers:
+            reader.cancel()
+    finally:
+        await asyncio.gather(*(websocket.close() for websocket in sockets), return_exceptions=True)
+
+    result.errors = expected - received
+    return {"ws_broadcast": result}
+
+
+async def run_ai_chat(base_url: str, scale: float) -> Dict[str, Result]:
+    config = WORKLOADS["ai_chat"]
+    limits = httpx.Limits(max_connections=config["concurrency"], max_keepalive_connections=config["concurrency"])
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def chat(index: int) -> bool:
+            response = await client.post(
+                "/api/azure/chat",
+                json={"message": f"benchmark question number {index}"},
+                headers={"X-Forwarded-For": client_address(index)},
+            )
+            return response.status_code == 200
+
+        return {"ai_chat": await drive(max(1, int(config["requests"] * scale)), config["concurrency"], chat)}
+
+
+class AppServer:
+    """``python main.py`` in a subprocess, for the duration of a ``with`` block"""
+
+    def __init__(self, env: Dict[str, str]):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {**os.environ, **env, "PORT": str(self.port)}
+        self.log = tempfile.NamedTemporaryFile("w+", prefix="load_suite_", suffix=".log", delete=False)
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "AppServer":
+        self.process = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=BACKEND_DIR, env=self.env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.log.seek(0)
+                raise RuntimeError(f"server did not start:\n{self.log.read()[-2000:]}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        os.unlink(self.log.name)
+
+
+async def run_workloads(base_url: str, names: List[str], scale: float) -> Dict[str, Dict[str, float]]:
+    ws_url = base_url.replace("http://", "ws://") + "/ws/websocket"
+    runners = {
+        "rest": lambda: run_rest(base_url, scale),
+        "rate_limit": lambda: run_rate_limit(base_url, scale),
+        "ws_churn": lambda: run_ws_churn(ws_url, scale),
+        "ws_broadcast": lambda: run_ws_broadcast(ws_url, scale),
+        "ai_chat": lambda: run_ai_chat(base_url, scale),
+    }
+    summaries = {}
+    for name in names:
+        for workload, result in (await runners[name]()).items():
+            summaries[workload] = result.summary()
+    return summaries
+
+
+def compare(summaries: Dict[str, Dict[str, float]], baseline: Dict, tolerance: float) -> List[str]:
+    """Print results next to the baseline; returns the regressed workloads"""
+    regressions = []
+    workloads = baseline.get("workloads", {})
+    print(f"{'workload':<20}{'ops':>7}{'err':>6}{'ops/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}   vs baseline")
+    for name, summary in summaries.items():
+        line = (
+            f"{name:<20}{summary['operations']:>7}{summary['errors']:>6}{summary['throughput']:>10,.1f}"
+            f"{summary['p50_ms']:>7.1f}ms{summary['p95_ms']:>7.1f}ms{summary['p99_ms']:>7.1f}ms"
+        )
+        base = workloads.get(name)
+        if base is None:
+            print(f"{line}   (no baseline)")
+            continue
+
+        p99_change = summary["p99_ms"] / base["p99_ms"] - 1 if base["p99_ms"] else 0.0
+        throughput_change = summary["throughput"] / base["throughput"] - 1 if base["throughput"] else 0.0
+        slower = p99_change > tolerance and summary["p99_ms"] - base["p99_ms"] > MIN_P99_DELTA_MS
+        regressed = slower or throughput_change < -tolerance or summary["errors"] > base["errors"]
+        if regressed:
+            regressions.append(name)
+        print(f"{line}   p99 {p99_change:+.0%}, ops/s {throughput_change:+.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help=f"comma-separated subset of {','.join(WORKLOADS)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every workload's operation count")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=None, help="allowed fractional change (default from baseline)")
+    parser.add_argument("--update-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="Azure stub delay per streamed word")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(WORKLOADS)
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+
+    with StubServer(github_stub_app()) as github, \
+            StubServer(azure_openai_stub_app(chunk_delay=args.chunk_delay)) as azure:
+        env = {
+            "ENVIRONMENT": "benchmark",
+            "GITHUB_TOKEN": "stub",
+            "GITHUB_API_URL": github.url,
+            "AZURE_OPENAI_API_KEY": "stub",
+            "AZURE_AI_FOUNDRY_ENDPOINT": azure.url,
+            # Measure the server, not the token budget
+            "AI_TOKENS_PER_MINUTE": "1000000000",
+            "RATE_LIMIT_BACKEND": "memory",
+            "WS_BACKPLANE": "none",
+        }
+        with AppServer(env) as server:
+            print(f"server {server.url}, scale {args.scale:g}, workloads: {', '.join(names)}")
+            summaries = asyncio.run(run_workloads(server.url, names, args.scale))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if baseline and baseline.get("scale") != args.scale:
+        print(f"note: baseline was recorded at scale {baseline.get('scale')}, this run is {args.scale:g}")
+    if baseline.get("placeholder"):
+        print(f"note: {baseline.get('note', 'placeholder baseline')}; regressions won't fail this run")
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", 0.3)
+    regressions = compare(summaries, baseline, tolerance)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps({
+            "scale": args.scale,
+            "tolerance": tolerance,
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            # Placeholder numbers are not kept next to real ones
+            "workloads": {**({} if baseline.get("placeholder") else baseline.get("workloads", {})), **summaries},
+        }, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if regressions and baseline.get("placeholder"):
+        print(f"placeholder baseline: {', '.join(regressions)} flagged but not failed")
+        return 0
+    if regressions:
+        print(f"FAIL: regressions in {', '.join(regressions)} (tolerance {tolerance:.0%})")
+        return 1
+    print(f"OK: no regressions beyond {tolerance:.0%}" if baseline else "no baseline to compare against")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Local stub upstreams for benchmarks.
+
+Each stub is a small Starlette app served by uvicorn on a free localhost
+port in a background thread, so benchmarks exercise real TCP connections
+without touching the internet.
+"""
+import asyncio
+import hashlib
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Run an ASGI app on localhost for the duration of a ``with`` block"""
+
+    def __init__(self, app, port: int = None, lifespan: str = "off"):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan=lifespan)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def conditional_json(request: Request, payload, headers: dict = None) -> Response:
+    """JSON response with an ETag, answering If-None-Match with 304 like GitHub"""
+    body = json.dumps(payload).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {**(headers or {}), "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def github_stub_app(repo_count: int = 250, latency: float = 0.0) -> Starlette:
+    """Minimal api.github.com stand-in: /user, /user/repos and /rate_limit"""
+
+    def repo(index: int) -> dict:
+        return {
+            "id": index,
+            "name": f"repo-{index}",
+            "full_name": f"octocat/repo-{index}",
+            "description": f"Stub repository {index}",
+            "private": index % 5 == 0,
+            "html_url": f"https://github.com/octocat/repo-{index}",
+            "language": "Python",
+            "stargazers_count": index * 3,
+            "forks_count": index,
+            "updated_at": "2024-01-01T00:00:00Z",
+            "created_at": "2023-01-01T00:00:00Z",
+        }
+
+    async def user(request: Request):
+        await asyncio.sleep(latency)
+        return conditional_json(request, {
+            "login": "octocat",
+            "name": "The Octocat",
+            "email": None,
+            "avatar_url": "https://avatars.githubusercontent.com/u/583231",
+            "public_repos": repo_count,
+            "followers": 100,
+            "following": 0,
+        })
+
+    async def repos(request: Request):
+        await asyncio.sleep(latency)
+        per_page = min(int(request.query_params.get("per_page", 30)), 100)
+        page = int(request.query_params.get("page", 1))
+        start = (page - 1) * per_page
+        items = [repo(i) for i in range(start, min(start + per_page, repo_count))]
+
+        headers = {}
+        last_page = max(1, -(-repo_count // per_page))
+        if page < last_page:
+            base = str(request.url.remove_query_params("page"))
+            headers["Link"] = (
+                f'<{base}&page={page + 1}>; rel="next", '
+                f'<{base}&page={last_page}>; rel="last"'
+            )
+        return conditional_json(request, items, headers)
+
+    async def rate_limit(request: Request):
+        await asyncio.sleep(latency)
+        return JSONResponse({"rate": {"limit": 5000, "remaining": 4999, "reset": int(time.time()) + 3600}})
+
+    return Starlette(routes=[
+        Route("/user", user),
+        Route("/user/repos", repos),
+        Route("/rate_limit", rate_limit),
+    ])
+
+
+def azure_openai_stub_app(chunk_delay: float = 0.0, latency: float = 0.0) -> Starlette:
+    """Azure OpenAI stand-in: chat completions streaming one chunk per word, and embeddings"""
+    from app.services.vector_index import HashingEmbedder
+
+    embedder = HashingEmbedder()
+    embedding_calls = []
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        deployment = request.path_params["deployment"]
+        words = f"Stub reply to: {body['messages'][-1]['content']}".split(" ")
+        completion_id = f"chatcmpl-stub-{time.monotonic_ns()}"
+
+        if not body.get("stream"):
+            # A whole completion takes as long as generating every chunk
+            await asyncio.sleep(chunk_delay * len(words))
+            return JSONResponse({
+                "id": completion_id,
+                "model": deployment,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 8, "completion_tokens": len(words), "total_tokens": 8 + len(words)},
+            })
+
+        async def chunks():
+            # Content filter results arrive first, without choices, as on Azure
+            yield f'data: {json.dumps({"id": "", "choices": [], "prompt_filter_results": []})}\n\n'
+            for index, word in enumerate(words):
+                await asyncio.sleep(chunk_delay)
+                delta = {"content": word if index == 0 else f" {word}"}
+                chunk = {"id": completion_id, "model": deployment,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            chunk = {"id": completion_id, "model": deployment,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    async def embeddings(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        embedding_calls.append(len(texts))
+        vectors = embedder.embed(texts).tolist()
+        tokens = sum(len(text.split()) for text in texts)
+        return JSONResponse({
+            "object": "list",
+            # Azure may return items out of order; clients sort by index
+            "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in reversed(list(enumerate(vectors)))],
+            "model": request.path_params["deployment"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    app = Starlette(routes=[
+        Route("/openai/deployments/{deployment}/chat/completions", chat_completions, methods=["POST"]),
+        Route("/openai/deployments/{deployment}/embeddings", embeddings, methods=["POST"]),
+    ])
+    # Batch sizes of the embeddings calls received, for checking client batching
+    app.state.embedding_calls = embedding_calls
+    return app
@@ -1,7 +1,8 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+from contextlib import asynccontextmanager
 import uvicorn
 import os
 from datetime import datetime
@@ -9,13 +10,161 @@ import logging
 
 from app.middleware.security import SecurityMiddleware
 from app.middleware.rate_limiter import RateLimitMiddleware
+from app.middleware.metrics import MetricsMiddleware
 from app.routers import azure_ai, github, websocket, system
 from app.services.websocket_manager import WebSocketManager
+from app.services.metrics import metrics
+from app.services.http_clients import UpstreamClients
+from app.services.http_cache import ConditionalCache
+from app.services.azure_openai import AzureOpenAIClient
+from app.services.completion_cache import CompletionCache
+from app.services.admission import AdmissionController
+from app.services.vector_index import SharedVectorIndex
+from app.services.json_codec import ORJSON_AVAILABLE
+from app.services.pubsub import create_backplane
+from app.services.singleflight import collect_flight_stats, total_in_flight
+from app.services.system_sampler import SystemSampler
+from app.services.metrics_history import HistoryRecorder
+from app.services.loop_monitor import LoopMonitor
+from app.services.profiler import SamplingProfiler
+from app.services.ws_compression import WebSocketProtocol as CompressedWebSocketProtocol
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown"""
+    # Pooled upstream HTTP clients (GitHub, Azure OpenAI)
+    app.state.http_clients = UpstreamClients()
+    # Deterministic chat completions are cached
+    app.state.completion_cache = CompletionCache.from_env("COMPLETION_CACHE")
+    # Per-model token budgets in front of upstream AI calls
+    app.state.ai_admission = AdmissionController.from_env()
+    # Azure OpenAI chat completions over the pooled client
+    app.state.azure_openai = AzureOpenAIClient(
+        app.state.http_clients, app.state.completion_cache, app.state.ai_admission
+    )
+    # Embedding search index, memory-mapped from VECTOR_INDEX_PATH and shared with the other workers
+    app.state.vector_index = SharedVectorIndex(os.getenv("VECTOR_INDEX_PATH"))
+    # ETag-validated cache of GitHub API responses
+    app.state.github_cache = ConditionalCache.from_env("GITHUB_CACHE")
+    # Host and process metrics sampled in a worker thread, read by the health endpoints
+    app.state.system_sampler = SystemSampler.from_env()
+    await app.state.system_sampler.start()
+    # Event-loop lag and stacks of callbacks that block it; profiles on demand
+    app.state.loop_monitor = LoopMonitor.from_env()
+    await app.state.loop_monitor.start()
+    app.state.profiler = SamplingProfiler.from_env()
+    metrics.register_callback(
+        "event_loop_lag_seconds", "Event-loop lag at the last monitor tick", lambda: app.state.loop_monitor.lag
+    )
+    metrics.register_callback(
+        "event_loop_lag_max_seconds", "Largest event-loop lag since startup", lambda: app.state.loop_monitor.max_lag
+    )
+    metrics.register_callback(
+        "event_loop_slow_callbacks_total", "Times the event loop was blocked past LOOP_SLOW_CALLBACK_MS",
+        lambda: app.state.loop_monitor.slow_count, kind="counter"
+    )
+    # Per-second samples kept at several resolutions for /api/system/metrics/history
+    app.state.metrics_history = HistoryRecorder(metrics, {
+        "loop_lag_ms": lambda: app.state.loop_monitor.take_peak() * 1000,
+        "cpu_percent": lambda: (app.state.system_sampler.snapshot or {}).get("cpu_percent"),
+        "memory_percent": lambda: (app.state.system_sampler.snapshot or {}).get("memory", {}).get("percent"),
+        "websocket_connections": websocket_manager.get_connection_count,
+    })
+    await app.state.metrics_history.start()
+    metrics.register_callback(
+        "metrics_history_memory_bytes", "Memory held by the metrics history ring buffers",
+        app.state.metrics_history.history.memory_usage
+    )
+    metrics.register_callback(
+        "process_resident_memory_bytes", "Resident memory of this worker (sampled)",
+        lambda: (app.state.system_sampler.snapshot or {}).get("process", {}).get("rss", 0)
+    )
+    metrics.register_callback(
+        "process_open_fds", "Open file descriptors of this worker (sampled)",
+        lambda: (app.state.system_sampler.snapshot or {}).get("process", {}).get("num_fds", 0)
+    )
+    metrics.register_callback(
+        "system_cpu_percent", "Host CPU utilisation (sampled)",
+        lambda: (app.state.system_sampler.snapshot or {}).get("cpu_percent", 0)
+    )
+    metrics.register_callback(
+        "github_cache_requests_total", "GitHub API cache lookups by result",
+        lambda: app.state.github_cache.counts, kind="counter", label="result"
+    )
+    metrics.register_callback(
+        "github_cache_entries", "Responses held in the GitHub API cache",
+        lambda: len(app.state.github_cache.entries)
+    )
+    metrics.register_callback(
+        "completion_cache_requests_total", "Chat completion cache lookups by result",
+        lambda: app.state.completion_cache.counts, kind="counter", label="result"
+    )
+    metrics.register_callback(
+        "completion_cache_entries", "Completions held in the chat completion cache",
+        lambda: len(app.state.completion_cache.entries)
+    )
+    metrics.register_callback(
+        "ai_admission_total", "AI calls by admission result",
+        lambda: app.state.ai_admission.counts, kind="counter", label="result"
+    )
+    metrics.register_callback(
+        "ai_admission_queue_depth", "AI calls waiting for token budget, by model",
+        lambda: app.state.ai_admission.queue_depths(), label="model"
+    )
+    metrics.register_callback(
+        "vector_index_documents", "Documents in the embedding search index",
+        lambda: len(app.state.vector_index)
+    )
+    metrics.register_callback(
+        "singleflight_calls_total", "Calls made through request coalescing, by flight group",
+        lambda: collect_flight_stats("calls"), kind="counter", label="group"
+    )
+    metrics.register_callback(
+        "singleflight_shared_total", "Calls that joined an in-flight upstream request, by flight group",
+        lambda: collect_flight_stats("shared"), kind="counter", label="group"
+    )
+    metrics.register_callback(
+        "singleflight_errors_total", "Coalesced upstream requests that failed, by flight group",
+        lambda: collect_flight_stats("errors"), kind="counter", label="group"
+    )
+    metrics.register_callback(
+        "singleflight_in_flight", "Coalesced upstream requests currently in flight",
+        total_in_flight
+    )
+    # Carry WebSocket broadcasts to the other workers and replicas (WS_BACKPLANE)
+    backplane = create_backplane()
+    if backplane is not None:
+        await websocket_manager.attach_backplane(backplane)
+        metrics.register_callback(
+            "websocket_backplane_frames_total", "WebSocket frames relayed through the pub/sub backplane",
+            lambda: backplane.counts, kind="counter", label="direction"
+        )
+        metrics.register_callback(
+            "websocket_backplane_batches_total", "Batched messages published on the pub/sub backplane",
+            lambda: backplane.batches, kind="counter"
+        )
+        metrics.register_callback(
+            "websocket_backplane_errors_total", "Malformed backplane messages and failed frame deliveries",
+            lambda: backplane.errors, kind="counter", label="kind"
+        )
+        metrics.register_callback(
+            "websocket_backplane_channels", "Pub/sub channels this worker is subscribed to",
+            lambda: len(backplane.subscribed)
+        )
+    yield
+    await websocket_manager.detach_backplane()
+    await app.state.system_sampler.aclose()
+    await app.state.metrics_history.aclose()
+    await app.state.loop_monitor.aclose()
+    await app.state.github_cache.aclose()
+    await app.state.completion_cache.aclose()
+    await app.state.ai_admission.aclose()
+    await app.state.http_clients.aclose()
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Foundry Python Backend",
@@ -23,6 +172,9 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs" if os.getenv("ENVIRONMENT") != "production" else None,
     redoc_url="/redoc" if os.getenv("ENVIRONMENT") != "production" else None,
+    lifespan=lifespan,
+    # orjson encodes responses several times faster than the stdlib
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse,
 )
 
 # Initialize WebSocket manager
@@ -32,6 +184,9 @@ websocket_manager = WebSocketManager()
 app.add_middleware(SecurityMiddleware)
 app.add_middleware(RateLimitMiddleware)
 
+# Metrics middleware (outside the rate limiter so rejections are timed too)
+app.add_middleware(MetricsMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -93,11 +248,55 @@ async def global_exception_handler(request, exc):
 # Add WebSocket manager to app state
 app.state.websocket_manager = websocket_manager
 
+# WebSocket gauges, read at scrape time
+metrics.register_callback(
+    "websocket_connections", "Open WebSocket connections", websocket_manager.get_connection_count
+)
+metrics.register_callback(
+    "websocket_rooms", "Active WebSocket rooms", lambda: len(websocket_manager.rooms)
+)
+metrics.register_callback(
+    "websocket_room_memberships",
+    "Connection-room memberships across all rooms",
+    lambda: sum(len(connections) for connections in websocket_manager.rooms.values()),
+)
+metrics.register_callback(
+    "websocket_connection_memory_bytes",
+    "Approximate memory held by WebSocket connection records and send queues",
+    websocket_manager.get_memory_usage,
+)
+metrics.register_callback(
+    "websocket_requests_in_flight", "Client requests running on WebSocket connections",
+    websocket_manager.get_request_count
+)
+metrics.register_callback(
+    "websocket_stats_subscribers", "WebSocket clients subscribed to connection stats",
+    lambda: len(websocket_manager.stats.subscribers)
+)
+metrics.register_callback(
+    "websocket_stats_messages_total", "Connection stats messages by kind (snapshot or delta)",
+    lambda: websocket_manager.stats.counts, kind="counter", label="kind"
+)
+metrics.register_callback(
+    "websocket_send_queue_depth", "Frames waiting in WebSocket send queues",
+    lambda: websocket_manager.get_send_queue_depths()["total"]
+)
+metrics.register_callback(
+    "websocket_send_queue_max_depth", "Longest WebSocket send queue",
+    lambda: websocket_manager.get_send_queue_depths()["max"]
+)
+metrics.register_callback(
+    "websocket_dropped_messages_total", "WebSocket frames dropped by full send queues, by overflow policy",
+    lambda: websocket_manager.dropped_messages, kind="counter", label="policy"
+)
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=int(os.getenv("PORT", 8000)),
         reload=os.getenv("ENVIRONMENT") == "development",
-        log_level="info"
+        log_level="info",
+        # permessage-deflate with WS_COMPRESSION_* settings; small frames skip compression
+        ws=CompressedWebSocketProtocol,
     )
\ No newline at end of file
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_leave_the_queue():
+    admission = AdmissionController(default_tokens_per_minute=60, max_wait=30)
+    await admission.admit("model", 60)
+    waiters = [asyncio.create_task(admission.admit("model", 10)) for _ in range(3)]
+    await asyncio.sleep(0)
+    queue = admission.models["model"]
+    assert len(queue.waiters) == 3 and queue.queued_tokens == 30
+
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    assert queue.waiters == [] and queue.queued_tokens == 0
+    assert admission.queue_depths() == {"model": 0}
+    await admission.aclose()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_waiters_leave_the_queue():
+    admission = AdmissionController(default_tokens_per_minute=6000, max_wait=0.1)
+    await admission.admit("model", 6000)
+    waiter = asyncio.create_task(admission.admit("model", 1))
+    await asyncio.sleep(0)
+    queue = admission.models["model"]
+    assert len(queue.waiters) == 1
+    # Someone else spent the budget; the waiter can't be admitted in time
+    queue.bucket.tokens = -1000
+
+    with pytest.raises(AdmissionRejected):
+        await waiter
+    assert queue.waiters == [] and queue.queued_tokens == 0
+    await admission.aclose()
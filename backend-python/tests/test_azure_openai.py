@@ -0,0 +1,112 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services.azure_openai import OTHER_MODELS, AzureOpenAIClient, AzureOpenAIError
+from app.services.completion_cache import CompletionCache
+
+
+def make_client(handler, cache=None) -> AzureOpenAIClient:
+    upstream = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="https://azure.test")
+    client = AzureOpenAIClient(SimpleNamespace(azure_openai=upstream, azure_openai_configured=True), cache)
+    client.embedding_batch_size = 1
+    return client
+
+
+@pytest.mark.asyncio
+async def test_embed_batches_in_order():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        text = json.loads(request.content)["input"][0]
+        return httpx.Response(200, json={
+            "data": [{"index": 0, "embedding": [float(len(text))]}],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        })
+
+    vectors, usage = await make_client(handler).embed(["a", "bb", "ccc"])
+    assert vectors.tolist() == [[1.0], [2.0], [3.0]]
+    assert usage == {"prompt_tokens": 3, "total_tokens": 3}
+
+
+@pytest.mark.asyncio
+async def test_embed_cancels_other_batches_on_first_error():
+    cancelled = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if json.loads(request.content)["input"] == ["bad"]:
+            return httpx.Response(400, json={"error": {"message": "bad input"}})
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(request)
+            raise
+        return httpx.Response(200, json={"data": []})
+
+    with pytest.raises(AzureOpenAIError) as raised:
+        await asyncio.wait_for(make_client(handler).embed(["slow", "bad", "slow"]), 1)
+    assert raised.value.status_code == 400
+    await asyncio.sleep(0)
+    assert len(cancelled) == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_models_go_upstream_but_share_the_other_label():
+    paths = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "answer"}, "finish_reason": "stop"}]})
+
+    client = make_client(handler)
+    admitted = []
+
+    async def admit(model, cost, priority):
+        admitted.append(model)
+
+    client.admission = SimpleNamespace(admit=admit)
+    result = await client.chat([{"role": "user", "content": "hi"}], "made-up-model")
+    await client.chat([{"role": "user", "content": "hi"}], "gpt-4")
+    assert result["model"] == "made-up-model"
+    assert paths == [
+        "/openai/deployments/made-up-model/chat/completions",
+        "/openai/deployments/gpt-4/chat/completions",
+    ]
+    assert admitted == [OTHER_MODELS, "gpt-4"]
+    assert client.slots("made-up-model") is client.slots("another-model")
+    assert set(client.deployment_slots) == {OTHER_MODELS}
+
+
+def test_models_endpoint_lists_every_known_model():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers.azure_ai import router
+    from app.services.azure_openai import get_azure_openai
+
+    client = make_client(lambda request: httpx.Response(500))
+    client.models["my-model"] = "my-model"
+    app = FastAPI()
+    app.include_router(router, prefix="/api/azure")
+    app.dependency_overrides[get_azure_openai] = lambda: client
+    listed = TestClient(app).get("/api/azure/models").json()["models"]
+    assert [model["id"] for model in listed] == list(client.models.values())
+    assert {"gpt-3.5-turbo", "gpt-4", "text-embedding-ada-002", "my-model"} <= {model["id"] for model in listed}
+
+
+@pytest.mark.asyncio
+async def test_model_casing_resolves_to_one_cache_key_and_deployment():
+    paths = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "answer"}, "finish_reason": "stop"}]})
+
+    client = make_client(handler, CompletionCache())
+    messages = [{"role": "user", "content": "hi"}]
+    first = await client.chat(messages, "GPT-3.5-Turbo", temperature=0)
+    second = await client.chat(messages, " gpt-3.5-turbo", temperature=0)
+    assert paths == ["/openai/deployments/gpt-3.5-turbo/chat/completions"]
+    assert first["model"] == second["model"] == "gpt-3.5-turbo"
+    assert (first["cached"], second["cached"]) == (False, True)
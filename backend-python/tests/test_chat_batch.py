@@ -0,0 +1,70 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.routers.azure_ai import router
+from app.services.azure_openai import AzureOpenAIClient, get_azure_openai
+
+
+class Upstream:
+    """Chat completions that echo the prompt, tracking concurrent calls per deployment"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.max_in_flight = {}
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        deployment = request.url.path.split("/")[3]
+        self.in_flight[deployment] = self.in_flight.get(deployment, 0) + 1
+        self.max_in_flight[deployment] = max(self.max_in_flight.get(deployment, 0), self.in_flight[deployment])
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight[deployment] -= 1
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        if prompt == "fail":
+            return httpx.Response(400, json={"error": {"message": "content filtered"}})
+        return httpx.Response(200, json={"choices": [{"message": {"content": prompt.upper()}, "finish_reason": "stop"}]})
+
+
+async def run_batch(upstream: Upstream, body: dict, deployment_concurrency: int) -> list:
+    azure = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url="https://azure.test")
+    ai = AzureOpenAIClient(SimpleNamespace(azure_openai=azure, azure_openai_configured=True))
+    ai.deployment_concurrency = deployment_concurrency
+    app = FastAPI()
+    app.include_router(router, prefix="/api/azure")
+    app.dependency_overrides[get_azure_openai] = lambda: ai
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/azure/chat/batch", json=body)
+    await azure.aclose()
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_every_result_within_the_deployment_limit():
+    upstream = Upstream()
+    items = [{"message": f"prompt {i}", "model": "gpt-4" if i % 2 else "gpt-3.5-turbo"} for i in range(20)]
+    results = await run_batch(upstream, {"items": items, "concurrency": 16}, deployment_concurrency=3)
+
+    assert sorted(result["index"] for result in results) == list(range(20))
+    for result in results:
+        assert result["status"] == 200
+        assert result["result"]["message"] == f"PROMPT {result['index']}"
+    assert upstream.max_in_flight == {"gpt-3.5-turbo": 3, "gpt-4": 3}
+
+
+@pytest.mark.asyncio
+async def test_failed_items_are_reported_in_band_without_stopping_the_batch():
+    upstream = Upstream()
+    items = [{"message": "ok"}, {"message": "fail"}, {"message": "ok again"}]
+    results = {result["index"]: result for result in await run_batch(upstream, {"items": items, "concurrency": 1}, 8)}
+
+    assert results[0]["status"] == results[2]["status"] == 200
+    assert results[1]["status"] == 502 and "content filtered" in results[1]["error"]
+    assert upstream.max_in_flight == {"gpt-3.5-turbo": 1}
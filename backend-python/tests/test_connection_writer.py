@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.services.connection_writer import DISCONNECT, DROP_NEWEST, DROP_OLDEST, OVERFLOW_POLICIES, ConnectionWriter
+
+
+class SlowWebSocket:
+    """Records frames; each send waits until the test releases it"""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, frame: str):
+        await self.gate.wait()
+        self.sent.append(frame)
+
+    async def send_bytes(self, frame: bytes):
+        await self.send_text(frame)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def make_writer(websocket, policy, max_size=2, reply_timeout=1.0):
+    drops = {name: 0 for name in OVERFLOW_POLICIES}
+    failed = []
+    writer = ConnectionWriter(websocket, max_size, policy, drops, failed.append, reply_timeout)
+    return writer, drops
+
+
+async def drain(websocket, writer):
+    websocket.gate.set()
+    while len(writer):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", [DROP_OLDEST, DROP_NEWEST])
+async def test_replies_are_never_dropped(policy):
+    websocket = SlowWebSocket()
+    writer, drops = make_writer(websocket, policy)
+
+    tokens = [f"delta-{i}" for i in range(6)]
+
+    async def stream():
+        for token in tokens:
+            assert await writer.send(token)
+
+    streaming = asyncio.create_task(stream())
+    for i in range(5):
+        writer.enqueue(f"broadcast-{i}")
+    await asyncio.sleep(0.01)
+    # The reply queue is full, so the stream is waiting instead of dropping
+    assert not streaming.done()
+
+    await drain(websocket, writer)
+    await streaming
+    await drain(websocket, writer)
+
+    assert [frame for frame in websocket.sent if frame.startswith("delta")] == tokens
+    assert drops[policy] == 3
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_stalled_reply_disconnects_instead_of_truncating():
+    websocket = SlowWebSocket()
+    writer, drops = make_writer(websocket, DROP_OLDEST, max_size=1, reply_timeout=0.05)
+
+    assert await writer.send("delta-0")
+    await asyncio.sleep(0)
+    assert await writer.send("delta-1")
+    assert not await writer.send("delta-2")
+
+    assert writer.closed
+    assert drops[DISCONNECT] == 1
+    await asyncio.sleep(0)
+    assert websocket.closed_with == 1013
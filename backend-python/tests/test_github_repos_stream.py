@@ -0,0 +1,81 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.routers.github import router
+from app.services.http_clients import get_upstream_clients
+
+PAGES = 5
+PER_PAGE = 100
+
+
+def repo(number: int) -> dict:
+    return {
+        "id": number, "name": f"repo-{number}", "full_name": f"octocat/repo-{number}", "description": None,
+        "private": False, "html_url": f"https://github.test/octocat/repo-{number}", "language": "Python",
+        "stargazers_count": 0, "forks_count": 0,
+        "updated_at": "2024-01-01T00:00:00Z", "created_at": "2023-01-01T00:00:00Z",
+    }
+
+
+class PaginatedUpstream:
+    """GitHub /user/repos with a Link header, optionally failing one page"""
+
+    def __init__(self, failing_page=None):
+        self.failing_page = failing_page
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        assert int(request.url.params["per_page"]) == PER_PAGE
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Later pages answer first, so pages arrive out of order
+            await asyncio.sleep(0.01 * (PAGES - page))
+        finally:
+            self.in_flight -= 1
+        if page == self.failing_page:
+            return httpx.Response(502, json={"message": "Bad gateway"})
+        start = (page - 1) * PER_PAGE
+        link = f'<https://api.github.test/user/repos?per_page={PER_PAGE}&page={PAGES}>; rel="last"'
+        return httpx.Response(200, json=[repo(i) for i in range(start, start + PER_PAGE)], headers={"Link": link})
+
+
+async def stream_lines(upstream: PaginatedUpstream, concurrency: int) -> list:
+    github = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url="https://api.github.test")
+    app = FastAPI()
+    app.include_router(router, prefix="/api/github")
+    app.dependency_overrides[get_upstream_clients] = lambda: SimpleNamespace(github=github, github_configured=True)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/github/repos/all", params={"concurrency": concurrency})
+    await github.aclose()
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_every_page_is_streamed_once_with_bounded_concurrency():
+    upstream = PaginatedUpstream()
+    lines = await stream_lines(upstream, concurrency=2)
+    ids = [line["id"] for line in lines]
+    assert ids[:PER_PAGE] == list(range(PER_PAGE))
+    assert sorted(ids) == list(range(PAGES * PER_PAGE))
+    assert upstream.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_a_failing_page_ends_the_stream_with_an_error_line():
+    lines = await stream_lines(PaginatedUpstream(failing_page=3), concurrency=4)
+    *repos, error = lines
+    assert error["error"] == "Failed to fetch page 3" and "502" in error["details"]
+    ids = [line["id"] for line in repos]
+    assert ids[:PER_PAGE] == list(range(PER_PAGE))
+    assert len(ids) == len(set(ids))
+    assert all(not 2 * PER_PAGE <= repo_id < 3 * PER_PAGE for repo_id in ids)
@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.http_cache import ConditionalCache
+
+
+class Upstream:
+    """Mock API whose answer can change between requests; records If-None-Match"""
+
+    def __init__(self):
+        self.payload, self.etag = {"version": 1}, '"v1"'
+        self.status = None
+        self.error = None
+        self.validators = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.validators.append(request.headers.get("If-None-Match"))
+        if self.error is not None:
+            raise self.error
+        if self.status is not None:
+            return httpx.Response(self.status, json={"message": "upstream failed"})
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=self.payload, headers={"ETag": self.etag})
+
+
+def make_client(upstream: Upstream) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url="https://api.test")
+
+
+def age(cache: ConditionalCache, seconds: float):
+    for entry, _ in cache.entries.entries.values():
+        entry.fetched_at -= seconds
+
+
+async def settle(cache: ConditionalCache):
+    await asyncio.gather(*cache.revalidations.values(), return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_fresh_hits_skip_upstream_and_expired_entries_revalidate_with_304():
+    upstream, cache = Upstream(), ConditionalCache(ttl=60, stale_ttl=300)
+    async with make_client(upstream) as client:
+        assert await cache.fetch_json(client, "/user", token="t") == (200, {"version": 1})
+        assert await cache.fetch_json(client, "/user", token="t") == (200, {"version": 1})
+        assert upstream.validators == [None]
+
+        age(cache, 1000)
+        assert await cache.fetch_json(client, "/user", token="t") == (200, {"version": 1})
+        assert upstream.validators == [None, '"v1"']
+        # The 304 made the entry fresh again
+        assert await cache.fetch_json(client, "/user", token="t") == (200, {"version": 1})
+    assert len(upstream.validators) == 2
+    assert cache.counts == {"fresh": 2, "stale": 0, "not_modified": 1, "miss": 1}
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_served_while_one_background_request_refreshes_them():
+    upstream, cache = Upstream(), ConditionalCache(ttl=60, stale_ttl=300)
+    async with make_client(upstream) as client:
+        await cache.fetch_json(client, "/repos", {"page": 1})
+        upstream.payload, upstream.etag = {"version": 2}, '"v2"'
+        age(cache, 100)
+
+        first, second = await asyncio.gather(
+            cache.fetch_json(client, "/repos", {"page": 1}),
+            cache.fetch_json(client, "/repos", {"page": 1}),
+        )
+        assert first == second == (200, {"version": 1})
+        await settle(cache)
+        assert upstream.validators == [None, '"v1"']
+        assert await cache.fetch_json(client, "/repos", {"page": 1}) == (200, {"version": 2})
+    assert cache.counts["stale"] == 2 and cache.revalidations == {}
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_are_passed_through_and_never_cached():
+    upstream, cache = Upstream(), ConditionalCache(ttl=60, stale_ttl=300)
+    async with make_client(upstream) as client:
+        upstream.status = 502
+        assert await cache.fetch_json(client, "/user") == (502, None)
+        assert len(cache.entries) == 0
+
+        upstream.status = None
+        await cache.fetch_json(client, "/user")
+        upstream.payload, upstream.etag, upstream.status = {"version": 2}, '"v2"', 500
+        age(cache, 100)
+        # A failed background refresh keeps serving the stale payload
+        assert await cache.fetch_json(client, "/user") == (200, {"version": 1})
+        await settle(cache)
+        upstream.error = httpx.ConnectError("connection refused")
+        assert await cache.fetch_json(client, "/user") == (200, {"version": 1})
+        await settle(cache)
+        assert cache.revalidations == {}
+
+        # Past the stale window the error reaches the caller
+        age(cache, 1000)
+        with pytest.raises(httpx.ConnectError):
+            await cache.fetch_json(client, "/user")
+        upstream.error = upstream.status = None
+        assert await cache.fetch_json(client, "/user") == (200, {"version": 2})
@@ -0,0 +1,48 @@
+import importlib.util
+import logging
+
+import pytest
+
+from app.services import http_clients
+from app.services.http_clients import UpstreamClients, http2_enabled
+from main import app
+
+
+def test_clients_are_configured_once_from_the_environment(monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKEN", "secret")
+    monkeypatch.setenv("GITHUB_API_URL", "https://github.test")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "key")
+    monkeypatch.setenv("AZURE_AI_FOUNDRY_ENDPOINT", "https://azure.test")
+    monkeypatch.setenv("HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("HTTP_CONNECT_TIMEOUT", "1.5")
+    clients = UpstreamClients()
+
+    assert clients.github_configured and clients.azure_openai_configured
+    assert clients.get("github") is clients.github
+    assert str(clients.github.base_url) == "https://github.test"
+    assert clients.github.headers["Authorization"] == "Bearer secret"
+    assert clients.azure_openai.headers["api-key"] == "key"
+    assert clients.limits.max_connections == 7
+    assert clients.github.timeout.connect == 1.5
+
+
+def test_http2_follows_the_setting_and_the_h2_package(monkeypatch, caplog):
+    monkeypatch.delenv("HTTP2_ENABLED", raising=False)
+    assert http2_enabled() == (importlib.util.find_spec("h2") is not None)
+    monkeypatch.setenv("HTTP2_ENABLED", "false")
+    assert http2_enabled() is False
+
+    monkeypatch.setenv("HTTP2_ENABLED", "true")
+    monkeypatch.setattr(http_clients.importlib.util, "find_spec", lambda name: None)
+    with caplog.at_level(logging.WARNING, logger="app.services.http_clients"):
+        assert http2_enabled() is False
+    assert "h2 package is missing" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_lifespan_shares_the_clients_and_closes_them_on_shutdown():
+    async with app.router.lifespan_context(app):
+        clients = app.state.http_clients
+        assert app.state.azure_openai.client is clients.azure_openai
+        assert not clients.github.is_closed
+    assert clients.github.is_closed and clients.azure_openai.is_closed
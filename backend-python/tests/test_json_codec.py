@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services import json_codec, ws_protocol
+from app.services.websocket_manager import WebSocketManager
+
+MESSAGE = {"type": "stats", "at": datetime(2024, 1, 2, 3, 4, 5), "rooms": {"café": 2}, "counts": {1: 3}}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_encoding_is_compact_utf8_with_or_without_orjson(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(json_codec, "orjson", None)
+    text = json_codec.dumps(MESSAGE)
+    assert json_codec.dumps_bytes(MESSAGE) == text.encode()
+    assert ", " not in text and ": " not in text and "café" in text
+    assert json_codec.loads(text) == {
+        "type": "stats",
+        # orjson writes datetimes as ISO 8601; the stdlib fallback uses str()
+        "at": "2024-01-02T03:04:05" if use_orjson else "2024-01-02 03:04:05",
+        "rooms": {"café": 2},
+        "counts": {"1": 3},
+    }
+
+
+class FakeWebSocket:
+    def __init__(self, subprotocols=()):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        self.frames.append(frame)
+
+    async def send_bytes(self, frame: bytes):
+        self.frames.append(frame)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once_per_protocol_and_shares_the_frame(monkeypatch):
+    encodes = []
+    encode = ws_protocol.encode
+
+    def counting_encode(message, protocol):
+        encodes.append(protocol)
+        return encode(message, protocol)
+
+    monkeypatch.setattr(ws_protocol, "encode", counting_encode)
+    manager = WebSocketManager()
+    websockets = [FakeWebSocket() for _ in range(50)] + [FakeWebSocket(["msgpack"]) for _ in range(10)]
+    for websocket in websockets:
+        await manager.connect(websocket)
+
+    await manager.broadcast({"type": "message", "content": "hello"})
+    await asyncio.sleep(0.05)
+    assert sorted(encodes) == ["json", "msgpack"]
+    json_frames = {id(websocket.frames[0]) for websocket in websockets[:50]}
+    assert len(json_frames) == 1
+    assert ws_protocol.decode(websockets[-1].frames[0], "msgpack") == {"type": "message", "content": "hello"}
+    for websocket in websockets:
+        manager.disconnect(websocket)
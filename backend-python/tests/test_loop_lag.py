@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.check_loop_lag import ticker
+from main import app
+
+# Generous for shared CI runners; one blocking psutil call per health check costs a second
+MAX_P99_LAG = 0.05
+
+
+@pytest.mark.asyncio
+async def test_health_checks_and_sampling_do_not_block_the_event_loop(monkeypatch):
+    # Sample every 20 ms so about 50 sampler runs overlap the health checks
+    monkeypatch.setenv("SYSTEM_SAMPLE_INTERVAL", "0.02")
+    lags = []
+    stop = asyncio.Event()
+
+    async with app.router.lifespan_context(app):
+        sampler = app.state.system_sampler
+        first_sample = sampler.snapshot["sampled_at"]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def check():
+                response = await client.get("/api/system/health")
+                assert response.status_code == 200
+
+            tick_task = asyncio.create_task(ticker(lags, 0.005, stop))
+            # About a second of traffic, in bursts of 10, within the rate limit
+            for _ in range(20):
+                await asyncio.gather(*(check() for _ in range(10)))
+                await asyncio.sleep(0.05)
+            stop.set()
+            await tick_task
+        assert sampler.snapshot["sampled_at"] > first_sample
+        assert sampler.errors == 0
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)]
+    assert len(lags) > 100
+    assert p99 < MAX_P99_LAG, f"p99 loop lag {p99 * 1000:.1f} ms"
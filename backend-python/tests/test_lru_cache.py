@@ -0,0 +1,53 @@
+from app.services.lru_cache import LRUCache
+from app.services.rate_limit_engine import GCRARateLimiter
+
+
+def test_expire_reclaims_keys_behind_a_long_lived_one():
+    cache = LRUCache(1000)
+    cache.set("heavy", 1, expires_at=160.0)
+    for index in range(900):
+        cache.set(f"light-{index}", 1, expires_at=101.0)
+
+    assert cache.expire(105.0, limit=None) == 900
+    assert len(cache) == 1
+    assert cache.stats()["expirations"] == 900
+
+
+def test_expire_is_incremental_and_soonest_first():
+    cache = LRUCache(10)
+    cache.set("late", 1, expires_at=30.0)
+    cache.set("early", 1, expires_at=10.0)
+    cache.set("middle", 1, expires_at=20.0)
+
+    assert cache.expire(25.0, limit=1) == 1
+    assert "early" not in cache and "middle" in cache
+    assert cache.expire(25.0) == 1
+    assert list(cache.entries) == ["late"]
+
+
+def test_updated_expiry_is_honoured():
+    cache = LRUCache(10)
+    cache.set("key", 1, expires_at=10.0)
+    cache.set("key", 2, expires_at=50.0)
+
+    assert cache.expire(20.0, limit=None) == 0
+    assert cache.get("key", now=20.0) == 2
+    assert cache.expire(60.0, limit=None) == 1
+
+
+def test_heap_stays_bounded_under_repeated_updates():
+    cache = LRUCache(10)
+    for step in range(10_000):
+        cache.set("key", step, expires_at=1000.0 + step)
+    assert len(cache.expiry_heap) <= 64 + 2 * len(cache)
+
+
+def test_rate_limiter_purges_light_clients_behind_a_heavy_one():
+    limiter = GCRARateLimiter(60, 60, max_clients=1000)
+    for _ in range(60):
+        limiter.hit("heavy", 100.0)
+    for index in range(900):
+        limiter.hit(f"light-{index}", 100.0)
+
+    assert limiter.purge(105.0) == 900
+    assert len(limiter) == 1
@@ -0,0 +1,59 @@
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app.middleware.metrics import MetricsMiddleware
+from app.services.metrics import Metrics
+
+
+def test_histograms_render_cumulative_buckets_per_route_and_status_class():
+    registry = Metrics(buckets=(0.1, 1.0))
+    for duration in (0.05, 0.5, 5.0):
+        registry.observe_request("/items/{item_id}", 200, duration)
+    registry.observe_request("/items/{item_id}", 404, 0.01)
+    registry.observe_request("/items/{item_id}", 999, 0.01)
+
+    lines = registry.render().splitlines()
+    labels = 'route="/items/{item_id}",status="2xx"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in lines
+    assert f'http_request_duration_seconds_bucket{{{labels},le="1.0"}} 2' in lines
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in lines
+    assert f"http_request_duration_seconds_sum{{{labels}}} 5.55" in lines
+    assert 'http_request_duration_seconds_count{route="/items/{item_id}",status="4xx"} 1' in lines
+    assert 'http_request_duration_seconds_count{route="/items/{item_id}",status="5xx"} 1' in lines
+
+
+def test_callbacks_are_rendered_with_labels_and_broken_ones_are_skipped():
+    registry = Metrics()
+    registry.register_callback("queue_depth", "Waiting calls", lambda: {'gpt "4"': 2, "other": 0}, label="model")
+    registry.register_callback("uptime_seconds", "Uptime", lambda: 12.0, kind="counter")
+    registry.register_callback("broken", "Fails", lambda: 1 / 0)
+
+    text = registry.render()
+    assert '# TYPE queue_depth gauge\nqueue_depth{model="gpt \\"4\\""} 2\nqueue_depth{model="other"} 0\n' in text
+    assert "# TYPE uptime_seconds counter\nuptime_seconds 12\n" in text
+    assert "broken" not in text
+
+
+@pytest.mark.asyncio
+async def test_middleware_labels_requests_by_route_template():
+    registry = Metrics()
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for item_id in (1, 2, 0):
+            await client.get(f"/items/{item_id}")
+        await client.get("/missing/path")
+
+    assert set(registry.http_latency) == {"/items/{item_id}", "unmatched"}
+    assert registry.http_latency["/items/{item_id}"]["2xx"].count == 2
+    assert registry.http_latency["/items/{item_id}"]["4xx"].count == 1
+    assert registry.http_latency["unmatched"]["4xx"].count == 1
+    assert registry.http_in_flight == 0
@@ -0,0 +1,62 @@
+import asyncio
+import math
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import system
+from app.services.metrics import Metrics
+from app.services.metrics_history import HistoryRecorder, MetricsHistory
+
+
+def test_query_averages_samples_into_steps():
+    history = MetricsHistory(["cpu"], [(1.0, 60)])
+    for second in range(10):
+        history.record(1000.0 + second, {"cpu": float(second)})
+    result = history.query(1000.0, 1010.0, step=5.0)
+    assert result["timestamps"] == [1000.0, 1005.0]
+    assert result["series"]["cpu"] == [2.0, 7.0]
+
+
+def test_non_finite_samples_are_recorded_as_absent():
+    history = MetricsHistory(["cpu"], [(1.0, 60)])
+    history.record(1000.0, {"cpu": math.inf})
+    history.record(1001.0, {"cpu": 5.0})
+    assert history.query(1000.0, 1002.0, step=1.0)["series"]["cpu"] == [None, 5.0]
+
+
+def test_non_finite_ranges_are_rejected():
+    history = MetricsHistory(["cpu"], [(1.0, 60)])
+    with pytest.raises(ValueError):
+        history.query(-1.7e308, 1.7e308)
+
+
+@pytest.mark.asyncio
+async def test_recorder_survives_a_failing_sample():
+    recorder = HistoryRecorder(Metrics(), {"cpu": lambda: 1.0}, interval=0.01)
+    calls = 0
+    sample = recorder.sample
+
+    def flaky_sample(lag, elapsed):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("boom")
+        return sample(lag, elapsed)
+
+    recorder.sample = flaky_sample
+    await recorder.start()
+    await asyncio.sleep(0.1)
+    assert not recorder.task.done()
+    assert recorder.errors == 1 and calls > 1
+    await recorder.aclose()
+
+
+@pytest.mark.parametrize("query", ["start=nan", "end=inf", "step=inf", "start=-inf"])
+def test_history_endpoint_rejects_non_finite_params(query):
+    app = FastAPI()
+    app.include_router(system.router, prefix="/api/system")
+    app.state.metrics_history = HistoryRecorder(Metrics(), {})
+    response = TestClient(app).get(f"/api/system/metrics/history?{query}")
+    assert response.status_code == 422
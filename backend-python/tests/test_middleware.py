@@ -0,0 +1,87 @@
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.rate_limiter import RateLimitMiddleware
+from app.middleware.security import SecurityMiddleware
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/items")
+    async def items():
+        return {"items": []}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk {i}\n"
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.websocket("/ws")
+    async def echo(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text(await websocket.receive_text())
+        await websocket.close()
+
+    app.add_middleware(RateLimitMiddleware, requests_per_minute=3, algorithm="gcra", backend="memory")
+    app.add_middleware(SecurityMiddleware)
+    return app
+
+
+def make_client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_security_headers_are_added_without_touching_streamed_bodies():
+    async with make_client(make_app()) as client:
+        response = await client.get("/stream")
+    assert response.text == "chunk 0\nchunk 1\nchunk 2\n"
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["x-frame-options"] == "DENY"
+    assert "default-src 'self'" in response.headers["content-security-policy"]
+    assert float(response.headers["x-process-time"]) >= 0
+    assert "strict-transport-security" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_clients_are_limited_separately_with_a_prebuilt_429():
+    async with make_client(make_app()) as client:
+        first = await client.get("/items", headers={"X-Forwarded-For": "10.0.0.1, 10.0.0.9"})
+        assert first.headers["x-ratelimit-limit"] == "3"
+        assert first.headers["x-ratelimit-remaining"] == "2"
+        for _ in range(2):
+            await client.get("/items", headers={"X-Forwarded-For": "10.0.0.1"})
+
+        rejected = await client.get("/items", headers={"X-Forwarded-For": "10.0.0.1"})
+        other = await client.get("/items", headers={"X-Real-IP": "10.0.0.2"})
+        exempt = await client.get("/health", headers={"X-Forwarded-For": "10.0.0.1"})
+
+    assert rejected.status_code == 429
+    body = json.loads(rejected.content)
+    assert body["error"] == "Rate limit exceeded" and body["retry_after"] >= 1
+    assert rejected.headers["retry-after"] == str(body["retry_after"])
+    assert rejected.headers["x-ratelimit-remaining"] == "0"
+    # The rejection skips the app but still passes through the security middleware
+    assert rejected.headers["x-frame-options"] == "DENY"
+    assert other.status_code == 200 and other.headers["x-ratelimit-remaining"] == "2"
+    assert exempt.status_code == 200 and "x-ratelimit-limit" not in exempt.headers
+
+
+def test_websockets_pass_through_untouched():
+    with TestClient(make_app()) as client:
+        for _ in range(5):
+            with client.websocket_connect("/ws") as websocket:
+                websocket.send_text("ping")
+                assert websocket.receive_text() == "ping"
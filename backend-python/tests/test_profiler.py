@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.loop_monitor import LoopMonitor
+from app.services.profiler import ProfilerBusy, SamplingProfiler
+
+
+def spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.mark.asyncio
+async def test_profile_collapses_the_stacks_of_busy_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="busy worker")
+    worker.start()
+    try:
+        collapsed, samples = await SamplingProfiler().profile(0.2, hz=200)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert samples > 10
+    lines = collapsed.splitlines()
+    busy = [line for line in lines if line.startswith("busy_worker;")]
+    assert busy and all(";tests.test_profiler:spin" in line for line in busy)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_one_profile_at_a_time_until_the_sampling_thread_exits():
+    profiler = SamplingProfiler()
+    collect, exited = profiler.collect, threading.Event()
+
+    def slow_to_exit(*args):
+        try:
+            return collect(*args)
+        finally:
+            time.sleep(0.1)
+            exited.set()
+
+    profiler.collect = slow_to_exit
+    task = asyncio.create_task(profiler.profile(30))
+    await asyncio.sleep(0.05)
+    with pytest.raises(ProfilerBusy):
+        await profiler.profile(0.1)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # The cancelled request stopped the sampling thread, which frees the profiler once it exits
+    assert profiler.running
+    deadline = time.monotonic() + 2
+    while profiler.running:
+        assert time.monotonic() < deadline, "sampling thread kept running"
+        await asyncio.sleep(0.01)
+    assert exited.is_set()
+    await profiler.profile(0.05)
+    assert profiler.profiles == 1
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_captures_the_stack_of_a_blocking_call():
+    monitor = LoopMonitor(interval=0.01, slow_threshold=0.05)
+    await monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.3)
+    await asyncio.sleep(0.05)
+    await monitor.aclose()
+
+    stats = monitor.get_stats()
+    assert stats["max_lag_ms"] >= 200
+    assert stats["slow_callbacks_total"] >= 1
+    stall = stats["slow_callbacks"][0]
+    assert stall["blocked_ms"] >= 50
+    assert any("test_loop_monitor_captures_the_stack_of_a_blocking_call" in entry for entry in stall["stack"])
@@ -0,0 +1,106 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from app.services.pubsub import InMemoryBackplane, InMemoryHub, RedisBackplane, room_channel
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+def make_backplane(server) -> RedisBackplane:
+    backplane = RedisBackplane(fakeredis.aioredis.FakeRedis(server=server), batch_interval=0)
+    backplane.retry_min_delay = 0.01
+    backplane.retry_max_delay = 0.05
+    return backplane
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backplanes_relay_room_frames():
+    hub = InMemoryHub()
+    sender, receiver = InMemoryBackplane(hub, batch_interval=0), InMemoryBackplane(hub, batch_interval=0)
+    received = []
+    await sender.start(lambda channel, frame: None)
+    await receiver.start(lambda channel, frame: received.append((channel, frame)))
+    receiver.subscribe(room_channel("lobby"))
+    await wait_for(lambda: receiver.subscribed == receiver.wanted)
+
+    sender.publish(room_channel("lobby"), "hello")
+    await wait_for(lambda: received)
+    assert received == [("room:lobby", "hello")]
+    await sender.aclose()
+    await receiver.aclose()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_is_retried_when_redis_is_down_at_startup():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    backplane = make_backplane(server)
+    received = []
+    await backplane.start(lambda channel, frame: received.append(frame))
+    backplane.subscribe(room_channel("lobby"))
+    assert backplane.subscribed == set()
+
+    server.connected = True
+    await wait_for(lambda: backplane.subscribed == backplane.wanted)
+    publisher = fakeredis.aioredis.FakeRedis(server=server)
+    await publisher.publish("ws:room:lobby", b'{"w":"other","f":["hello"]}')
+    await wait_for(lambda: received)
+    assert received == ["hello"]
+    await backplane.aclose()
+
+
+@pytest.mark.asyncio
+async def test_rooms_are_resubscribed_after_the_connection_drops():
+    server = fakeredis.FakeServer()
+    backplane = make_backplane(server)
+    received = []
+    await backplane.start(lambda channel, frame: received.append(frame))
+    backplane.subscribe(room_channel("lobby"))
+    await wait_for(lambda: backplane.subscribed == backplane.wanted)
+
+    server.connected = False
+    await wait_for(lambda: backplane.subscribed != backplane.wanted)
+    server.connected = True
+    await wait_for(lambda: backplane.subscribed == backplane.wanted)
+
+    publisher = fakeredis.aioredis.FakeRedis(server=server)
+    await wait_for(lambda: backplane.pubsub.connection is not None)
+    await publisher.publish("ws:room:lobby", b'{"w":"other","f":["after reconnect"]}')
+    await wait_for(lambda: received)
+    assert received == ["after reconnect"]
+    await backplane.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bad_messages_are_counted_without_resubscribing():
+    server = fakeredis.FakeServer()
+    backplane = make_backplane(server)
+    received = []
+
+    def handler(channel, frame):
+        if frame == "boom":
+            raise RuntimeError("handler failed")
+        received.append(frame)
+
+    await backplane.start(handler)
+    await wait_for(lambda: backplane.subscribed == backplane.wanted)
+    resubscribes = []
+    backplane.resubscribe = lambda: resubscribes.append(True)
+
+    publisher = fakeredis.aioredis.FakeRedis(server=server)
+    await publisher.publish("ws:broadcast", b"not json")
+    await publisher.publish("ws:broadcast", b'{"f":["no worker id"]}')
+    await publisher.publish("ws:broadcast", b'{"w":"other","f":["boom","after"]}')
+    await wait_for(lambda: received)
+    assert received == ["after"]
+    assert backplane.errors == {"malformed": 2, "handler": 1}
+    assert resubscribes == []
+    await backplane.aclose()
@@ -0,0 +1,109 @@
+import time
+
+import fakeredis
+import pytest
+import redis
+
+from app.services.rate_limit_engine import (
+    GCRARateLimiter,
+    RedisRateLimiter,
+    SlidingWindowRateLimiter,
+    create_rate_limiter,
+)
+
+
+def test_gcra_allows_burst_then_rejects():
+    limiter = GCRARateLimiter(5, 60)
+    assert all(limiter.hit("client", 100.0).allowed for _ in range(5))
+
+    rejected = limiter.hit("client", 100.0)
+    assert not rejected.allowed
+    assert rejected.retry_after == 12.0
+    assert limiter.hit("client", 100.0 + rejected.retry_after).allowed
+
+
+def test_sliding_window_retry_after_when_current_window_is_full():
+    limiter = SlidingWindowRateLimiter(5, 60)
+    now = 20.0
+    assert all(limiter.hit("client", now).allowed for _ in range(5))
+
+    rejected = limiter.hit("client", now)
+    assert not rejected.allowed
+    # 40 s to the next window, then 12 s until the old window weighs in at 4/5
+    assert rejected.retry_after == 52.0
+    assert not limiter.hit("client", now + rejected.retry_after - 0.01).allowed
+    assert limiter.hit("client", now + rejected.retry_after + 1e-6).allowed
+
+
+def test_sliding_window_retry_after_while_previous_window_slides_out():
+    limiter = SlidingWindowRateLimiter(5, 60)
+    assert all(limiter.hit("client", 50.0).allowed for _ in range(5))
+
+    rejected = limiter.hit("client", 65.0)
+    assert not rejected.allowed
+    assert not limiter.hit("client", 65.0 + rejected.retry_after - 0.01).allowed
+    assert limiter.hit("client", 65.0 + rejected.retry_after + 1e-6).allowed
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["gcra", "sliding_window"])
+async def test_redis_script_enforces_limit(redis_client, algorithm):
+    limiter = RedisRateLimiter(redis_client, 5, 60, algorithm)
+
+    results = [await limiter.acquire("client") for _ in range(6)]
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert [result.remaining for result in results[:5]] == [4, 3, 2, 1, 0]
+    assert results[-1].retry_after > 0
+    # Other clients have their own quota
+    assert (await limiter.acquire("other")).allowed
+    assert len(limiter) == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_sliding_window_matches_local_retry_after(redis_client):
+    limiter = RedisRateLimiter(redis_client, 5, 60, "sliding_window")
+    for _ in range(5):
+        await limiter.acquire("client")
+    rejected = await limiter.acquire("client")
+
+    local = SlidingWindowRateLimiter(5, 60)
+    now = time.time()
+    for _ in range(5):
+        local.hit("client", now)
+    expected = local.hit("client", now).retry_after
+    assert rejected.retry_after == pytest.approx(expected, abs=1.0)
+
+
+class BrokenScript:
+    async def __call__(self, keys, args):
+        raise redis.exceptions.ConnectionError("connection refused")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["gcra", "sliding_window"])
+async def test_redis_outage_falls_back_to_same_algorithm(redis_client, algorithm):
+    limiter = RedisRateLimiter(redis_client, 5, 60, algorithm)
+    limiter.script = BrokenScript()
+
+    results = [await limiter.acquire("client") for _ in range(6)]
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert not limiter.available
+    assert limiter.fallback.algorithm == algorithm
+
+
+def test_create_rate_limiter_honours_algorithm_with_redis_backend(monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    limiter = create_rate_limiter(5, 60, "sliding_window", "redis")
+    assert isinstance(limiter, RedisRateLimiter)
+    assert limiter.algorithm == "sliding_window"
+    assert isinstance(limiter.fallback, SlidingWindowRateLimiter)
+
+
+def test_redis_limiter_rejects_mismatched_fallback(redis_client):
+    with pytest.raises(ValueError):
+        RedisRateLimiter(redis_client, 5, 60, "gcra", fallback=SlidingWindowRateLimiter(5, 60))
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight, collect_flight_stats
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight("test_share")
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert flight.stats() == {"calls": 5, "shared": 4, "errors": 0}
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_labelled_by_group_not_key():
+    flight = SingleFlight("test_labels")
+
+    async def fetch():
+        return None
+
+    for page in range(50):
+        await flight.do(f"0123456789abcdef:/user/repos?page={page}", fetch)
+
+    calls = collect_flight_stats("calls")
+    assert calls["test_labels"] == 50
+    assert not any("/user/repos" in label for label in calls)
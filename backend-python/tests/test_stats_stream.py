@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.connection_writer import DROP_OLDEST
+from app.services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """Records frames; sends block while the gate is closed"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        await self.gate.wait()
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code: int = 1000):
+        pass
+
+    def frames(self, kind: str) -> list:
+        return [frame for frame in self.sent if frame.get("type") == kind]
+
+
+async def settle(seconds: float = 0.05):
+    await asyncio.sleep(seconds)
+
+
+def make_manager(**kwargs) -> WebSocketManager:
+    return WebSocketManager(stats_interval=0.02, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_subscribe_sends_a_snapshot_and_unsubscribe_stops_deltas():
+    manager = make_manager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket)
+    manager.join_room(websocket, "lobby")
+    manager.subscribe_stats(websocket)
+    await settle()
+    [snapshot] = websocket.frames("stats")
+    assert snapshot["rooms"] == {"lobby": 1} and snapshot["total_connections"] == 1
+
+    manager.unsubscribe_stats(websocket)
+    manager.leave_room(websocket, "lobby")
+    await settle()
+    assert websocket.frames("stats_delta") == []
+    manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_changes_within_an_interval_are_coalesced_into_one_delta():
+    manager = make_manager()
+    subscriber, other = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(subscriber)
+    await manager.connect(other)
+    manager.subscribe_stats(subscriber)
+    await settle()
+
+    manager.join_room(other, "a")
+    manager.join_room(other, "b")
+    manager.leave_room(other, "a")
+    await settle()
+    [delta] = subscriber.frames("stats_delta")
+    assert delta["rooms"] == {"a": 0, "b": 1}
+    assert delta["active_rooms"] == 1
+    manager.disconnect(subscriber)
+    manager.disconnect(other)
+
+
+@pytest.mark.asyncio
+async def test_subscriber_that_lost_a_frame_gets_a_fresh_snapshot():
+    manager = make_manager(send_queue_size=2, overflow_policy=DROP_OLDEST)
+    subscriber, other = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(subscriber)
+    await manager.connect(other)
+    manager.subscribe_stats(subscriber)
+    await settle()
+
+    # The client stalls while broadcasts overflow its queue
+    subscriber.gate.clear()
+    manager.join_room(other, "lobby")
+    await settle()
+    for index in range(5):
+        await manager.broadcast({"type": "broadcast", "message": index})
+    assert manager.connections[subscriber].writer.dropped > 0
+
+    subscriber.gate.set()
+    await settle()
+    snapshots = subscriber.frames("stats")
+    assert len(snapshots) == 2
+    assert snapshots[-1]["rooms"] == {"lobby": 1}
+    assert manager.stats.counts["resync"] == 1
+    manager.disconnect(subscriber)
+    manager.disconnect(other)
@@ -0,0 +1,107 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.services.vector_index import HashingEmbedder, SharedVectorIndex, VectorIndex
+
+embedder = HashingEmbedder(64)
+
+
+def add_texts(index, texts):
+    index.add(texts, embedder.embed(texts), [{"text": text} for text in texts])
+
+
+def test_search_ranks_matching_text_first():
+    index = VectorIndex()
+    add_texts(index, ["redis rate limit", "websocket chat", "vector search"])
+    results = index.search(embedder.embed(["websocket chat"])[0], k=2)
+    assert [result["id"] for result in results][0] == "websocket chat"
+    assert results[0]["score"] == pytest.approx(1.0)
+
+
+def test_workers_see_each_others_documents(tmp_path):
+    path = str(tmp_path / "index")
+    first, second = SharedVectorIndex(path), SharedVectorIndex(path)
+
+    add_texts(first, ["alpha", "beta"])
+    add_texts(second, ["gamma"])
+    # The second writer replayed the first one's adds before appending its own
+    assert sorted(second.index.ids) == ["alpha", "beta", "gamma"]
+    assert sorted(first.refresh().ids) == ["alpha", "beta", "gamma"]
+    assert sorted(SharedVectorIndex(path).index.ids) == ["alpha", "beta", "gamma"]
+
+
+def test_replacing_a_document_is_replayed(tmp_path):
+    path = str(tmp_path / "index")
+    first, second = SharedVectorIndex(path), SharedVectorIndex(path)
+    first.add(["doc"], embedder.embed(["old text"]), [{"text": "old"}])
+    second.add(["doc"], embedder.embed(["new text"]), [{"text": "new"}])
+
+    index = first.refresh()
+    assert len(index) == 1
+    assert index.search(embedder.embed(["new text"])[0], k=1)[0]["metadata"] == {"text": "new"}
+
+
+def test_log_is_compacted_into_a_snapshot(tmp_path):
+    path = str(tmp_path / "index")
+    writer = SharedVectorIndex(path, compact_min_bytes=0)
+    reader = SharedVectorIndex(path)
+    for i in range(5):
+        add_texts(writer, [f"document {i}"])
+    assert writer.compactions > 0
+
+    index = reader.refresh()
+    assert sorted(index.ids) == sorted(f"document {i}" for i in range(5))
+
+
+def test_reload_after_compaction_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "index")
+    writer = SharedVectorIndex(path, compact_min_bytes=0)
+    add_texts(writer, ["only document"])
+    assert writer.compactions == 1 and writer.offset == 0
+    assert isinstance(SharedVectorIndex(path).index.base, np.memmap)
+
+
+def test_replayed_rows_leave_the_snapshot_mapped(tmp_path):
+    path = str(tmp_path / "index")
+    writer = SharedVectorIndex(path, compact_min_bytes=0)
+    add_texts(writer, ["first document", "second document"])
+    reader = SharedVectorIndex(path)
+
+    writer.compact_min_bytes = 1 << 30
+    add_texts(writer, ["third document"])
+    writer.add(["first document"], embedder.embed(["replacement text"]), [{"text": "replaced"}])
+
+    index = reader.refresh()
+    assert isinstance(index.base, np.memmap) and index.base_size == 2
+    assert index.stats()["memory_rows"] == 2
+    assert len(index) == 3
+    results = index.search(embedder.embed(["replacement text"])[0], k=3)
+    assert [result["id"] for result in results].count("first document") == 1
+    assert results[0] == {"id": "first document", "score": pytest.approx(1.0), "metadata": {"text": "replaced"}}
+
+    # Saving writes each live document once, with its latest vector
+    index.save(str(tmp_path / "copy"))
+    copy = VectorIndex.load(str(tmp_path / "copy"))
+    assert sorted(copy.ids) == ["first document", "second document", "third document"]
+    assert copy.search(embedder.embed(["replacement text"])[0], k=1)[0]["metadata"] == {"text": "replaced"}
+
+
+def add_in_process(path, worker):
+    index = SharedVectorIndex(path, compact_min_bytes=2000)
+    for i in range(20):
+        add_texts(index, [f"worker {worker} document {i}"])
+
+
+def test_concurrent_processes_lose_no_documents(tmp_path):
+    path = str(tmp_path / "index")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=add_in_process, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    assert len(SharedVectorIndex(path).index) == 80
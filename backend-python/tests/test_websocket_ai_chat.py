@@ -0,0 +1,57 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+class BrokenStream:
+    """A stream whose upstream sends a malformed chunk after one delta"""
+
+    id = "chatcmpl-broken"
+    finish_reason = None
+
+    async def __aiter__(self):
+        yield "partial"
+        json.loads("{not json")
+
+    async def aclose(self):
+        pass
+
+
+def next_reply(websocket, request_id: str) -> dict:
+    while True:
+        frame = websocket.receive_json()
+        if frame.get("request_id") == request_id:
+            return frame
+
+
+def test_invalid_payload_gets_an_ai_error():
+    with TestClient(app) as client, client.websocket_connect("/ws/websocket") as websocket:
+        websocket.send_json({"type": "ai_chat", "request_id": "r1", "message": "hi", "max_tokens": "many"})
+        frame = next_reply(websocket, "r1")
+        assert frame["type"] == "ai_error"
+        assert "max_tokens" in frame["message"]
+
+
+def test_stream_failure_gets_an_ai_error(monkeypatch):
+    with TestClient(app) as client:
+        async def stream_chat(*args, **kwargs):
+            return BrokenStream()
+
+        monkeypatch.setattr(app.state.azure_openai, "stream_chat", stream_chat)
+        with client.websocket_connect("/ws/websocket") as websocket:
+            websocket.send_json({"type": "ai_chat", "request_id": "r2", "message": "hi"})
+            assert next_reply(websocket, "r2") == {"type": "ai_delta", "request_id": "r2", "delta": "partial"}
+            frame = next_reply(websocket, "r2")
+            assert frame["type"] == "ai_error" and frame["message"] == "AI service error"
+
+
+def test_valid_payload_streams_a_response():
+    with TestClient(app) as client, client.websocket_connect("/ws/websocket") as websocket:
+        websocket.send_json({"type": "ai_chat", "request_id": "r3", "message": "hi there", "max_tokens": "20"})
+        frames = [next_reply(websocket, "r3")]
+        while frames[-1]["type"] == "ai_delta":
+            frames.append(next_reply(websocket, "r3"))
+        assert frames[-1]["type"] == "ai_response"
+        assert "".join(frame["delta"] for frame in frames[:-1]) == frames[-1]["message"]
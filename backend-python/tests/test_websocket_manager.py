@@ -0,0 +1,70 @@
+import logging
+
+import pytest
+
+from app.services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_connection_ids_are_stable_and_never_reused():
+    manager = WebSocketManager()
+    first, second = FakeWebSocket(), FakeWebSocket()
+    first_id = (await manager.connect(first)).id
+    second_id = (await manager.connect(second)).id
+    assert manager.get_client_id(first) == first_id < second_id
+
+    manager.disconnect(first)
+    assert manager.get_client_id(first) is None
+    assert manager.get_client_id(second) == second_id
+    third = FakeWebSocket()
+    assert (await manager.connect(third)).id > second_id
+    manager.disconnect(second)
+    manager.disconnect(third)
+
+
+@pytest.mark.asyncio
+async def test_disconnect_leaves_every_room_and_drops_empty_ones():
+    manager = WebSocketManager()
+    leaving, staying = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(leaving)
+    await manager.connect(staying)
+    for room in ("lobby", "support"):
+        manager.join_room(leaving, room)
+    manager.join_room(staying, "lobby")
+
+    manager.disconnect(leaving)
+    manager.disconnect(leaving)
+    assert list(manager.rooms) == ["lobby"]
+    assert manager.rooms["lobby"] == {manager.connections[staying]}
+    assert manager.get_connection_count() == 1
+    manager.disconnect(staying)
+
+
+@pytest.mark.asyncio
+async def test_connection_events_are_logged_not_printed(capsys, caplog):
+    manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    with caplog.at_level(logging.DEBUG, logger="app.services.websocket_manager"):
+        state = await manager.connect(websocket)
+        manager.join_room(websocket, "lobby")
+        manager.leave_room(websocket, "lobby")
+        manager.disconnect(websocket)
+
+    assert capsys.readouterr().out == ""
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(f"connected: {state.id}" in message for message in messages)
+    assert any(f"{state.id} left room 'lobby'" in message for message in messages)
@@ -0,0 +1,57 @@
+import zlib
+
+import msgpack
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from websockets import frames
+
+from app.routers.websocket import router
+from app.services import ws_protocol
+from app.services.websocket_manager import WebSocketManager
+from app.services.ws_compression import ThresholdPerMessageDeflate
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(router, prefix="/ws")
+    app.state.websocket_manager = WebSocketManager()
+    return app
+
+
+def test_the_first_offered_subprotocol_we_speak_is_chosen():
+    assert ws_protocol.negotiate(["graphql-ws", "msgpack", "json"]) == "msgpack"
+    assert ws_protocol.negotiate(["json", "msgpack"]) == "json"
+    assert ws_protocol.negotiate(["graphql-ws"]) is None
+    assert ws_protocol.negotiate([]) is None
+
+
+def test_msgpack_clients_get_binary_frames_and_others_get_json_text():
+    with TestClient(make_app()) as client:
+        with client.websocket_connect("/ws/websocket", subprotocols=["msgpack", "json"]) as websocket:
+            assert websocket.accepted_subprotocol == "msgpack"
+            welcome = msgpack.unpackb(websocket.receive_bytes())
+            assert welcome["type"] == "welcome" and welcome["protocol"] == "msgpack"
+            websocket.send_bytes(msgpack.packb({"type": "unknown"}))
+            assert msgpack.unpackb(websocket.receive_bytes())["type"] == "error"
+
+        with client.websocket_connect("/ws/websocket") as websocket:
+            assert websocket.accepted_subprotocol is None
+            assert websocket.receive_json()["protocol"] == "json"
+
+
+def test_messages_below_the_threshold_are_sent_uncompressed():
+    extension = ThresholdPerMessageDeflate(256, False, False, 15, 15, {"level": 6})
+    small = extension.encode(frames.Frame(frames.OP_TEXT, b'{"type":"pong"}'))
+    assert not small.rsv1 and small.data == b'{"type":"pong"}'
+
+    payload = b'{"type":"stats","values":[' + b"0," * 500 + b"0]}"
+    large = extension.encode(frames.Frame(frames.OP_TEXT, payload))
+    assert large.rsv1 and len(large.data) < len(payload) // 10
+    assert zlib.decompressobj(-15).decompress(large.data + b"\x00\x00\xff\xff") == payload
+
+    # Continuation frames follow the decision made for the message's first frame
+    first = extension.encode(frames.Frame(frames.OP_TEXT, b"x" * 10, fin=False))
+    rest = extension.encode(frames.Frame(frames.OP_CONT, b"x" * 1000))
+    assert not first.rsv1 and rest.data == b"x" * 1000
+    ping = extension.encode(frames.Frame(frames.OP_PING, b"x" * 1000))
+    assert ping.data == b"x" * 1000